@@ -1,21 +1,346 @@
-from flask import Flask, request, jsonify
-from authentication.authentication import authenticate
+from quart import Quart, Response, g, request, jsonify
+from quart.json.provider import DefaultJSONProvider
+from authentication.authentication import authenticate, authenticate_admin
+from metrics import (RequestTimings, WorkerMetrics, current_timings, registry,
+                     render_prometheus, timed_stage)
+from profiling import RequestProfiler
+from request_exceptions import DeadlineExceededException
+from scraping.browser_pool import browser_pool
 from scraping.connection_page import LinkedinConnectionsData
+from scraping.crawl_jobs import crawl_manager
+from scraping.data_parser import parse_fields
+from scraping.deadline import use_deadline
+from scraping.job_queue import job_queue
 from scraping.profile_page import LinkedinProfileData
+from scraping.profile_store import profile_store
+from scraping.rate_limit import rate_limiter
+from scraping.requests.session_pool import session_pool
+from contextlib import aclosing
 from traceback import format_exc
+import asyncio
+import contextlib
+import functools
+import serialization
+import settings
 import time
 
-app = Flask(__name__)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Quart JSON provider backed by `serialization` (orjson when installed).
+
+    Keys keep their insertion order instead of being sorted. Values orjson
+    cannot serialize, and calls with extra `json.dumps` arguments, fall back to
+    the default provider.
+    """
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._dump_bytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return serialization.loads(s)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dump_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+    def _dump_bytes(self, obj):
+        with timed_stage("serialize"):
+            try:
+                return serialization.dumps(obj)
+            except TypeError:
+                return super().dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "Time to answer API calls until the response headers are sent, "
+    "labelled by method, route and status code",
+)
+worker_metrics = WorkerMetrics(settings.METRICS_DIR, registry)
+
+app = Quart(__name__)
+app.json = FastJSONProvider(app)
+# Streamed responses can take as long as a full connections page
+app.config["RESPONSE_TIMEOUT"] = settings.RESPONSE_TIMEOUT
+
+
+@app.before_serving
+async def start_worker():
+    """
+    Set up the shared resources of a worker before it accepts requests.
+
+    Every worker serves all of its requests from one long-lived event loop, so
+    pooled upstream sessions, caches and concurrency limiters live for as long
+    as the worker does.
+    """
+    loop = asyncio.get_running_loop()
+    if rate_limiter.enabled:
+        # Fails fast on a misconfigured rate limit backend
+        await loop.run_in_executor(None, lambda: rate_limiter.backend)
+    if settings.JOB_QUEUE_ENABLED:
+        # Fails fast without the `cryptography` package
+        await loop.run_in_executor(None, job_queue.check)
+    if settings.BROWSER_POOL_WARM:
+        await loop.run_in_executor(None, browser_pool.warm)
+    app.metrics_flusher = asyncio.ensure_future(flush_metrics())
+
+
+@app.after_serving
+async def stop_worker():
+    """
+    Close the pooled upstream sessions and browsers when a worker shuts down,
+    after writing the profiles still buffered for the profile store.
+    """
+    app.metrics_flusher.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await app.metrics_flusher
+    await asyncio.get_running_loop().run_in_executor(None, worker_metrics.write)
+    await asyncio.get_running_loop().run_in_executor(None, profile_store.flush)
+    await session_pool.close()
+    await asyncio.get_running_loop().run_in_executor(None, browser_pool.shutdown)
+
+
+async def flush_metrics():
+    """
+    Publish this worker's metrics for the other workers' `/metrics` answers.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, worker_metrics.write)
+        except OSError:
+            print(format_exc())
+        await asyncio.sleep(settings.METRICS_FLUSH_INTERVAL)
+
+
+@app.before_request
+async def start_timer():
+    g.timings = RequestTimings()
+    current_timings.set(g.timings)
+
+
+@app.after_request
+async def observe_request(response):
+    timings = g.get("timings") or RequestTimings()
+    # Route templates, not URLs, keep the label set bounded
+    rule = request.url_rule.rule if request.url_rule else "unmatched"
+    http_request_duration.observe(
+        timings.elapsed(),
+        method=request.method,
+        route=rule,
+        status=str(response.status_code),
+    )
+    # Streamed responses only carry the stages finished before the first record
+    response.headers["Server-Timing"] = timings.server_timing()
+    if timings.elapsed() > settings.SLOW_REQUEST_THRESHOLD:
+        print(f"Slow request {request.method} {rule}: {timings.summary()}")
+    return response
+
+
+def profiling_hook(view):
+    """
+    Let administrators profile a single API call of a route end to end.
+
+    Opt in with `"profiling": "store"` (or `true`) in the request body to save
+    the profile under `PROFILING_DIR` and get its path in the `X-Profile`
+    header, or with `"profiling": "return"` to get the profile report instead
+    of the regular response. Requires an admin `api_key`. Streamed responses
+    cannot be profiled, as their work happens after the view returns.
+    """
+    @functools.wraps(view)
+    async def wrapper(*args, **kwargs):
+        data = await request.get_json(silent=True) or {}
+        mode = data.get("profiling")
+        if not mode:
+            return await view(*args, **kwargs)
+        if mode is True:
+            mode = "store"
+        if mode not in ("store", "return"):
+            return jsonify({"error": "profiling must be \"store\" or \"return\""}), 400
+        if not authenticate_admin(AuthObject(data.get("api_key"))):
+            return jsonify({"error": "Profiling requires an admin API key", "status_code": 403}), 403
+        if get_stream_format(data):
+            return jsonify({"error": "Streamed responses cannot be profiled"}), 400
+
+        with RequestProfiler(request.path) as profiler:
+            response = await app.make_response(await view(*args, **kwargs))
+        if mode == "return":
+            report, mimetype = profiler.render()
+            return Response(report, mimetype=mimetype)
+        path = await asyncio.get_running_loop().run_in_executor(None, profiler.save, settings.PROFILING_DIR)
+        response.headers["X-Profile"] = path
+        return response
+
+    return wrapper
+
+
+STREAM_MIMETYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def get_stream_format(data):
+    """
+    Determine the requested streaming format, if any.
+
+    The `stream` field of the request body wins ("ndjson", "sse", or `true` for
+    NDJSON); otherwise an `Accept` header naming one of the streaming media
+    types selects it.
+
+    Args:
+        data (dict): Parsed request body
+
+    Returns:
+        str: "ndjson", "sse" or None for a regular JSON response
+    """
+    stream = data.get("stream")
+    if stream is True:
+        return "ndjson"
+    if stream in STREAM_MIMETYPES:
+        return stream
+    accept = request.headers.get("Accept", "")
+    for stream_format, mimetype in STREAM_MIMETYPES.items():
+        if mimetype in accept:
+            return stream_format
+    return None
+
+
+def format_stream_record(record, stream_format):
+    """
+    Serialize a single streamed record.
+
+    Args:
+        record (dict): Record with a `type` key
+        stream_format (str): "ndjson" or "sse"
+
+    Returns:
+        bytes: The serialized record including its terminator
+    """
+    if stream_format == "sse":
+        return b"event: " + record["type"].encode("utf-8") + b"\ndata: " + serialization.dumps(record) + b"\n\n"
+    return serialization.dumps(record) + b"\n"
+
+
+async def stream_records(records, stream_format, deadline=None):
+    """
+    Serialize an async generator of records into a streamed response body.
+
+    The generator is closed as soon as the client goes away.
+
+    Args:
+        records: Async generator of records
+        stream_format (str): "ndjson" or "sse"
+        deadline (float, optional): Deadline of the API call, as returned by
+                                    `parse_deadline`. The records are produced after
+                                    the view returned, so it is applied here.
+
+    Yields:
+        bytes: Serialized records
+    """
+    with use_deadline(deadline):
+        async with aclosing(records):
+            async for record in records:
+                yield format_stream_record(record, stream_format)
+
+
+def parse_deadline(data):
+    """
+    Compute the deadline of an API call.
+
+    The `deadline` field of the request body is the number of seconds the call
+    may take, capped at `REQUEST_DEADLINE_MAX`. Without it the server default
+    `REQUEST_DEADLINE` applies. The time counts from the arrival of the request.
+
+    Args:
+        data (dict): Parsed request body
+
+    Returns:
+        float: `time.monotonic()` value, or None for no deadline
+
+    Raises:
+        ValueError: If `deadline` is not a positive number
+    """
+    seconds = data.get("deadline")
+    if seconds is None:
+        seconds = settings.REQUEST_DEADLINE
+        if not seconds:
+            return None
+    elif isinstance(seconds, bool) or not isinstance(seconds, (int, float)) or seconds <= 0:
+        raise ValueError("deadline must be a positive number of seconds")
+    seconds = min(seconds, settings.REQUEST_DEADLINE_MAX)
+    timings = g.get("timings")
+    return time.monotonic() - (timings.elapsed() if timings else 0) + seconds
+
+
+async def enqueue_job(kind, email, password, options, deadline=None):
+    """
+    Queue a scrape for the scraper workers instead of running it in the API.
+
+    Args:
+        kind (str): "profile" or "connections"
+        email (str): LinkedIn account email
+        password (str): LinkedIn account password
+        options (dict): Validated scrape arguments of the request
+        deadline (float, optional): Deadline of the API call, as returned by
+                                    `parse_deadline`
+
+    Returns:
+        tuple: `202` response with the queued job, to poll at `/jobs/status`
+    """
+    # Workers run in other processes: the deadline is handed over as wall clock time
+    deadline_at = time.time() + deadline - time.monotonic() if deadline is not None else None
+    job = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: job_queue.enqueue(kind, email, password, options, deadline_at)
+    )
+    return jsonify({"message": "Job queued", "job": job}), 202
+
+
+# Model-like object for authentication
+class AuthObject:
+    def __init__(self, key):
+        self.api_key = key
+
+
+def is_authorized(data):
+    """
+    Check the API key in a request body.
+
+    Args:
+        data (dict): Parsed request body
+
+    Returns:
+        bool: `True` if the body carries a valid `api_key`
+    """
+    return bool(data.get("api_key")) and authenticate(AuthObject(data.get("api_key")))
 
 
 @app.route("/")
 def home():
     return "LinkedIn API is running!"
 
+@app.route("/metrics")
+async def metrics():
+    """
+    Expose the metrics of every worker in the Prometheus text format.
+    """
+    exported = await asyncio.get_running_loop().run_in_executor(None, worker_metrics.collect)
+    return Response(render_prometheus(exported), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.route('/profile', methods=['POST'])
+@profiling_hook
 async def profile_data():
     try:
-        data = request.json
+        data = await request.get_json()
         print(data)
         if not data:
             return jsonify({"error": "Invalid JSON"}), 400
@@ -27,31 +352,41 @@ async def profile_data():
         if not api_key or not user_email or not user_password:
             return jsonify({"error": "api_key, username and password are required"}), 400
         
-        # Create model-like object for authentication
-        class AuthObject:
-            def __init__(self, key):
-                self.api_key = key
-                
         # Authenticate API key
         valid_call = authenticate(AuthObject(api_key))
         if not valid_call:
             return jsonify({"error": "Invalid API Key", "status_code": 401}), 401
 
+        try:
+            fields = parse_fields(data.get("fields"))
+            deadline = parse_deadline(data)
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
+
+        if settings.JOB_QUEUE_ENABLED:
+            return await enqueue_job(
+                "profile", user_email, user_password,
+                {"fields": data.get("fields")}, deadline,
+            )
+
         # Call your parser function
-        scraping = LinkedinProfileData(user_email, user_password)
-        profile_data = await scraping.get_profile_data()
+        with use_deadline(deadline):
+            scraping = await LinkedinProfileData.create(user_email, user_password)
+            profile_data = await scraping.get_profile_data(fields=fields)
         return jsonify({"message": "Data processed", "data": profile_data}), 200
-    
+
+    except DeadlineExceededException as error:
+        return jsonify({"error": str(error), "status_code": 504}), 504
     except Exception as error:
         error = format_exc()
         print(error)
         return jsonify({"error": str(error)}), 500
 
 @app.route('/connections', methods=['POST'])
+@profiling_hook
 async def get_connections():
-    start = time.time()
     try:
-        data = request.json
+        data = await request.get_json()
         api_key = data.get("api_key")
         user_email = data.get("username")
         user_password = data.get("password")
@@ -61,29 +396,203 @@ async def get_connections():
         if not api_key or not user_email or not user_password:
             return jsonify({"error": "api_key, username and password are required"}), 400
         
-        # Create model-like object for authentication
-        class AuthObject:
-            def __init__(self, key):
-                self.api_key = key
-                
         # Authenticate API key
         valid_call = authenticate(AuthObject(api_key))
         if not valid_call:
             return jsonify({"error": "Invalid API Key", "status_code": 401}), 401
 
-        scraping = LinkedinConnectionsData(
-            email=user_email,
-            password=user_password,
-            pagination_id=pagination_id
-        )
-        connections_data = await scraping.get_connections_data()
-        end = time.time()
-        print(f"Processing time: {end - start} seconds")
+        try:
+            fields = parse_fields(data.get("fields"))
+            deadline = parse_deadline(data)
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
+
+        stream_format = get_stream_format(data)
+        if settings.JOB_QUEUE_ENABLED:
+            if stream_format:
+                return jsonify({"error": "Streamed responses are not available in queue mode"}), 400
+            return await enqueue_job(
+                "connections", user_email, user_password,
+                {"fields": data.get("fields"), "pagination_id": pagination_id}, deadline,
+            )
+
+        try:
+            with use_deadline(deadline):
+                scraping = await LinkedinConnectionsData.create(
+                    email=user_email,
+                    password=user_password,
+                    pagination_id=pagination_id,
+                    fields=fields
+                )
+        except ValueError as error:
+            # Malformed pagination_id, or a resume cursor of another account
+            return jsonify({"error": str(error)}), 400
+
+        if stream_format:
+            return Response(
+                stream_records(scraping.iter_connections_data(), stream_format, deadline),
+                mimetype=STREAM_MIMETYPES[stream_format],
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        with use_deadline(deadline):
+            connections_data = await scraping.get_connections_data()
         return jsonify({"message": "Data processed", "connections_data": connections_data}), 200
-        
+
+    except DeadlineExceededException as error:
+        return jsonify({"error": str(error), "status_code": 504}), 504
+    except Exception:
+        print(format_exc())
+        return jsonify({"error": "Failed to fetch connections data"}), 500
+
+@app.route('/profiles/batch', methods=['POST'])
+@profiling_hook
+async def profiles_batch():
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({"error": "Invalid JSON"}), 400
+        user_email = data.get("username")
+        user_password = data.get("password")
+        public_ids = data.get("public_ids")
+
+        # Validate required fields
+        if not data.get("api_key") or not user_email or not user_password:
+            return jsonify({"error": "api_key, username and password are required"}), 400
+        if not isinstance(public_ids, list) or not all(isinstance(public_id, str) for public_id in public_ids):
+            return jsonify({"error": "public_ids must be a list of profile IDs"}), 400
+        if not is_authorized(data):
+            return jsonify({"error": "Invalid API Key", "status_code": 401}), 401
+
+        # Deduplicated, in request order
+        public_ids = list(dict.fromkeys(public_id.strip() for public_id in public_ids if public_id.strip()))
+        if not public_ids:
+            return jsonify({"error": "public_ids must not be empty"}), 400
+        if len(public_ids) > settings.PROFILE_BATCH_MAX_SIZE:
+            return jsonify({"error": f"At most {settings.PROFILE_BATCH_MAX_SIZE} public_ids per batch"}), 400
+        try:
+            fields = parse_fields(data.get("fields"))
+            deadline = parse_deadline(data)
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
+
+        # One login session for the whole batch
+        with use_deadline(deadline):
+            scraping = await LinkedinProfileData.create(user_email, user_password)
+
+        stream_format = get_stream_format(data)
+        if stream_format:
+            return Response(
+                stream_records(scraping.iter_profile_records(public_ids, fields), stream_format, deadline),
+                mimetype=STREAM_MIMETYPES[stream_format],
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        with use_deadline(deadline):
+            profiles_data = await scraping.get_profiles_data(public_ids, fields)
+        return jsonify({"message": "Data processed", **profiles_data}), 200
+
+    except DeadlineExceededException as error:
+        return jsonify({"error": str(error), "status_code": 504}), 504
+    except Exception:
+        print(format_exc())
+        return jsonify({"error": "Failed to fetch profiles data"}), 500
+
+@app.route('/crawl', methods=['POST'])
+async def start_crawl():
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({"error": "Invalid JSON"}), 400
+        user_email = data.get("username")
+        user_password = data.get("password")
+
+        # Validate required fields
+        if not data.get("api_key") or not user_email or not user_password:
+            return jsonify({"error": "api_key, username and password are required"}), 400
+        if not is_authorized(data):
+            return jsonify({"error": "Invalid API Key", "status_code": 401}), 401
+
+        job = await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: crawl_manager.start(
+                email=user_email,
+                password=user_password,
+                restart=bool(data.get("restart"))
+            )
+        )
+        return jsonify({"message": "Crawl started", "job": job}), 202
+
+    except Exception as error:
+        print(format_exc())
+        return jsonify({"error": str(error)}), 500
+
+@app.route('/crawl/status', methods=['POST'])
+async def crawl_status():
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({"error": "Invalid JSON"}), 400
+        if not data.get("api_key") or not data.get("job_id"):
+            return jsonify({"error": "api_key and job_id are required"}), 400
+        if not is_authorized(data):
+            return jsonify({"error": "Invalid API Key", "status_code": 401}), 401
+
+        loop = asyncio.get_running_loop()
+        job = await loop.run_in_executor(None, crawl_manager.store.get, data["job_id"])
+        if job is None:
+            return jsonify({"error": "Unknown job_id"}), 404
+        return jsonify({"job": job}), 200
+
+    except Exception as error:
+        print(format_exc())
+        return jsonify({"error": str(error)}), 500
+
+@app.route('/crawl/results', methods=['POST'])
+async def crawl_results():
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({"error": "Invalid JSON"}), 400
+        if not data.get("api_key") or not data.get("job_id"):
+            return jsonify({"error": "api_key and job_id are required"}), 400
+        if not is_authorized(data):
+            return jsonify({"error": "Invalid API Key", "status_code": 401}), 401
+
+        loop = asyncio.get_running_loop()
+        job = await loop.run_in_executor(None, crawl_manager.store.get, data["job_id"])
+        if job is None:
+            return jsonify({"error": "Unknown job_id"}), 404
+        offset = int(data.get("offset", 0))
+        limit = min(int(data.get("limit", 100)), 1000)
+        profiles = await loop.run_in_executor(
+            None, lambda: crawl_manager.store.results(job["id"], offset=offset, limit=limit)
+        )
+        return jsonify({"job": job, "profiles": profiles, "next_offset": offset + len(profiles)}), 200
+
+    except Exception as error:
+        print(format_exc())
+        return jsonify({"error": str(error)}), 500
+
+@app.route('/jobs/status', methods=['POST'])
+async def job_status():
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({"error": "Invalid JSON"}), 400
+        if not data.get("api_key") or not data.get("job_id"):
+            return jsonify({"error": "api_key and job_id are required"}), 400
+        if not is_authorized(data):
+            return jsonify({"error": "Invalid API Key", "status_code": 401}), 401
+
+        job = await asyncio.get_running_loop().run_in_executor(None, job_queue.get, data["job_id"])
+        if job is None:
+            return jsonify({"error": "Unknown job_id"}), 404
+        return jsonify({"job": job}), 200
+
     except Exception as error:
+        print(format_exc())
         return jsonify({"error": str(error)}), 500
 
 if __name__ == "__main__":
-    # app.run(host="0.0.0.0", port=5000, threaded=True)
     app.run(debug=True)
\ No newline at end of file
@@ -1,5 +1,8 @@
 auth_data = {
     "auth_key": [
     "fgcv8Y9iZZ"
+],
+    # Keys allowed to use admin-only features, e.g. request profiling
+    "admin_key": [
 ]
 }
\ No newline at end of file
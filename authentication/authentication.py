@@ -13,7 +13,22 @@ def authenticate(item: object) -> bool:
     """
 
     api_key = item.api_key
-    valid_api_keys = auth_data["auth_key"]
+    # Admin keys are valid API keys too
+    valid_api_keys = auth_data["auth_key"] + auth_data.get("admin_key", [])
     if api_key in valid_api_keys:
         return True
-    return False
\ No newline at end of file
+    return False
+
+def authenticate_admin(item: object) -> bool:
+    """
+    Authenticates an administrator by validating their API key against the list
+    of admin keys.
+    Args:
+        item (object): An object containing the attribute `api_key`,
+                       which represents the user's API key.
+    Returns:
+        bool: Returns `True` if the provided API key is an admin key, otherwise `False`.
+    """
+
+    api_key = item.api_key
+    return bool(api_key) and api_key in auth_data.get("admin_key", [])
@@ -0,0 +1,105 @@
+"""
+Benchmark of connection ID extraction from connections listing responses.
+
+Compares the two modes of `data_parser.iter_connections_profile_ids`, the full
+parse and the ijson stream, on synthetic `ConnectionListWithProfile` pages of
+growing size. Use it to pick `LISTING_STREAM_MIN_BYTES`.
+
+Run from the repository root:
+
+    python -m benchmarks.listing_parsing [--sizes 40,400,4000] [--repeat N]
+"""
+import argparse
+import json
+import timeit
+import tracemalloc
+
+import serialization
+from scraping import data_parser
+from scraping.data_parser import iter_connections_profile_ids
+
+
+def build_element(index):
+    """
+    Build one listing element with a profile decoration of realistic size.
+    """
+    return {
+        "entityUrn": f"urn:li:fsd_connection:ACoAA{index}",
+        "createdAt": 1700000000000 + index,
+        "connectedMember": f"urn:li:fsd_profile:ACoAA{index}",
+        "connectedMemberResolutionResult": {
+            "firstName": f"First{index}",
+            "lastName": f"Last{index}",
+            "headline": "Senior Software Engineer at Example Corp | Distributed systems " * 2,
+            "publicIdentifier": f"connection-{index}",
+            "entityUrn": f"urn:li:fsd_profile:ACoAA{index}",
+            "memorialized": False,
+            "profilePicture": {
+                "displayImageReference": {
+                    "vectorImage": {
+                        "rootUrl": "https://media.licdn.com/dms/image/v2/" + "A" * 40 + "/",
+                        "artifacts": [
+                            {
+                                "width": width,
+                                "height": width,
+                                "expiresAt": 1800000000000,
+                                "fileIdentifyingUrlPathSegment": f"{width}_{width}/" + "B" * 140,
+                            }
+                            for width in (100, 200, 400, 800)
+                        ],
+                    }
+                }
+            },
+            "$type": "com.linkedin.voyager.dash.identity.profile.Profile",
+        },
+        "$type": "com.linkedin.voyager.dash.relationships.Connection",
+    }
+
+
+def build_page(size):
+    return json.dumps({
+        "elements": [build_element(index) for index in range(size)],
+        "paging": {"count": size, "start": 0, "links": []},
+    }).encode("utf-8")
+
+
+def full_parse(content):
+    return list(iter_connections_profile_ids(content, stream=False))
+
+
+def streaming_parse(content):
+    return list(iter_connections_profile_ids(content, stream=data_parser.ijson is not None))
+
+
+def measure(parse, content, repeat):
+    seconds = min(timeit.repeat(lambda: parse(content), number=repeat, repeat=5)) / repeat
+    tracemalloc.start()
+    parse(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="40,400,4000", help="comma separated elements per page")
+    parser.add_argument("--repeat", type=int, default=10, help="pages parsed per timing run")
+    args = parser.parse_args()
+
+    streaming = "ijson" if data_parser.ijson is not None else "full parse (ijson not installed)"
+    full = "orjson" if serialization.orjson is not None else "json"
+    print(f"full parse: {full}, streaming: {streaming}")
+    print(f"{'elements':>8} {'body KiB':>9} {'full ms':>9} {'stream ms':>10} {'full peak KiB':>14} {'stream peak KiB':>16}")
+    for size in (int(size) for size in args.sizes.split(",")):
+        content = build_page(size)
+        assert full_parse(content) == streaming_parse(content)
+        full_seconds, full_peak = measure(full_parse, content, args.repeat)
+        stream_seconds, stream_peak = measure(streaming_parse, content, args.repeat)
+        print(
+            f"{size:>8} {len(content) / 1024:>9.1f} {full_seconds * 1000:>9.2f} {stream_seconds * 1000:>10.2f}"
+            f" {full_peak / 1024:>14.1f} {stream_peak / 1024:>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
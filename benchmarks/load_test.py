@@ -0,0 +1,295 @@
+"""
+Load test of the API against a local mock of the LinkedIn endpoints.
+
+Starts the mock (`benchmarks.mock_voyager`) and the API under Gunicorn with
+`LINKEDIN_BASE_URL` pointed at the mock and a cookie cache seeded with the
+mock's session, so no browser login happens. `/profile` and `/connections`
+are then driven at each concurrency level. Every level reports p50/p95/p99
+latency, requests/sec and upstream calls per API call, and the results are
+written as JSON so runs of different commits can be compared.
+
+Run from the repository root:
+
+    python -m benchmarks.load_test [--concurrency 1,8,32] [--requests 200]
+                                   [--latency-ms 50] [--throttle-rate 0.05]
+                                   [--output FILE] [--compare BASELINE.json]
+
+The profile and listing caches are disabled (`--profile-cache-ttl` re-enables
+the profile cache) and the per-account rate limit is turned off, so every API
+call reaches the mock.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from curl_cffi.requests import AsyncSession
+
+from authentication.auth_key import auth_data
+from benchmarks.mock_voyager import MOCK_COOKIES, add_arguments, create_server
+from scraping.session_cache import CookieCache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_EMAIL = "load-test@example.com"
+BENCH_PASSWORD = "load-test"
+BENCH_SALT = "load-test"
+
+SCENARIOS = {
+    "profile": ("/profile", {}),
+    "connections": ("/connections", {}),
+}
+
+
+def percentile(sorted_values, fraction):
+    """
+    Linearly interpolated percentile of sorted values.
+    """
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_commit():
+    """
+    Return the checked out commit, marked `-dirty` with uncommitted changes.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def start_api(port, mock_url, workdir, args):
+    """
+    Start the API under Gunicorn, talking to the mock instead of LinkedIn.
+
+    Returns:
+        tuple: The Gunicorn process and the path of its log file
+    """
+    cookie_dir = os.path.join(workdir, "cookies")
+    CookieCache(cache_dir=cookie_dir, salt=BENCH_SALT).set(BENCH_EMAIL, BENCH_PASSWORD, MOCK_COOKIES)
+
+    env = dict(os.environ)
+    for name in ("REQUEST_PROXY", "PROFILE_CACHE_DIR"):
+        env.pop(name, None)
+    env.update({
+        "LINKEDIN_BASE_URL": mock_url,
+        "COOKIE_CACHE_DIR": cookie_dir,
+        "COOKIE_CACHE_SALT": BENCH_SALT,
+        "PROFILE_CACHE_TTL": str(args.profile_cache_ttl),
+        "LISTING_CACHE_TTL": "0",
+        "RATE_LIMIT_BACKEND": "none",
+        "CRAWL_DB_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "PROFILE_STORE_DB_PATH": os.path.join(workdir, "profiles.sqlite3"),
+        "BROWSER_POOL_WARM": "false",
+        "GUNICORN_WORKERS": str(args.workers),
+    })
+    log_path = os.path.join(workdir, "api.log")
+    with open(log_path, "wb") as log:
+        process = subprocess.Popen(
+            [
+                sys.executable, "-m", "gunicorn",
+                "-c", "gunicorn_config.py",
+                "--bind", f"127.0.0.1:{port}",
+                "app:app",
+            ],
+            cwd=ROOT,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+    return process, log_path
+
+
+async def wait_until_ready(client, api_url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API exited with status {process.returncode}")
+        try:
+            response = await client.get(f"{api_url}/", timeout=2)
+            if response.status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"API not ready after {timeout} seconds")
+
+
+async def run_level(client, url, body, concurrency, total):
+    """
+    Send `total` requests, `concurrency` at a time.
+
+    Returns:
+        tuple: Latency in seconds and status code (0 for a failed request) of
+               every request, and the wall time of the level
+    """
+    samples = []
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, json=body)
+                status_code = response.status_code
+            except Exception:
+                status_code = 0
+            samples.append((time.perf_counter() - started, status_code))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+def summarize(scenario, concurrency, samples, elapsed, upstream):
+    latencies = sorted(latency for latency, _ in samples)
+    statuses = {}
+    for _, status_code in samples:
+        statuses[str(status_code)] = statuses.get(str(status_code), 0) + 1
+    upstream_calls = sum(upstream["endpoints"].values())
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": len(samples) - statuses.get("200", 0),
+        "statuses": statuses,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "mean": sum(latencies) / len(latencies) * 1000,
+            "max": latencies[-1] * 1000,
+        },
+        "requests_per_second": len(samples) / elapsed,
+        "upstream_calls_per_request": upstream_calls / len(samples),
+        "upstream": upstream,
+    }
+
+
+def print_result(result):
+    latency = result["latency_ms"]
+    print(
+        f"{result['scenario']:<12} {result['concurrency']:>5} "
+        f"{latency['p50']:9.1f} {latency['p95']:9.1f} {latency['p99']:9.1f} "
+        f"{result['requests_per_second']:9.1f} {result['upstream_calls_per_request']:9.2f} {result['errors']:7}"
+    )
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    previous = {(result["scenario"], result["concurrency"]): result for result in baseline["results"]}
+    print(f"\ncompared to {baseline.get('commit', baseline_path)}:")
+    print(f"{'scenario':<12} {'conc':>5} {'p95':>9} {'req/s':>9} {'up/call':>9}")
+    for result in results:
+        old = previous.get((result["scenario"], result["concurrency"]))
+        if old is None:
+            continue
+        print(
+            f"{result['scenario']:<12} {result['concurrency']:>5} "
+            f"{result['latency_ms']['p95'] / old['latency_ms']['p95'] - 1:+9.1%} "
+            f"{result['requests_per_second'] / old['requests_per_second'] - 1:+9.1%} "
+            f"{result['upstream_calls_per_request'] - old['upstream_calls_per_request']:+9.2f}"
+        )
+
+
+async def run(args, api_url, mock, process):
+    results = []
+    async with AsyncSession(max_clients=max(args.concurrency) + 1, timeout=args.timeout) as client:
+        await wait_until_ready(client, api_url, process)
+        print(f"{'scenario':<12} {'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+              f"{'req/s':>9} {'up/call':>9} {'errors':>7}")
+        for scenario in args.scenarios:
+            path, extra = SCENARIOS[scenario]
+            body = {"api_key": args.api_key, "username": BENCH_EMAIL, "password": BENCH_PASSWORD, **extra}
+            for concurrency in args.concurrency:
+                # Warm up connections and worker state outside of the measurement
+                await run_level(client, api_url + path, body, concurrency, concurrency)
+                mock.snapshot(reset=True)
+                samples, elapsed = await run_level(client, api_url + path, body, concurrency, args.requests)
+                result = summarize(scenario, concurrency, samples, elapsed, mock.snapshot(reset=True))
+                print_result(result)
+                results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", default="profile,connections",
+                        help=f"comma separated, out of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="API calls per concurrency level")
+    parser.add_argument("--workers", type=int, default=1, help="Gunicorn workers of the API")
+    parser.add_argument("--profile-cache-ttl", type=int, default=0, help="PROFILE_CACHE_TTL of the API")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds before an API call is failed")
+    parser.add_argument("--api-key", default=auth_data["auth_key"][0], help="API key sent with every call")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/load_test-<commit>.json)")
+    parser.add_argument("--compare", help="results file of an earlier run to compare with")
+    add_arguments(parser)
+    args = parser.parse_args()
+    args.scenarios = [scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip()]
+    unknown = set(args.scenarios).difference(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    args.concurrency = [int(level) for level in args.concurrency.split(",")]
+
+    commit = git_commit()
+    mock = create_server(args)
+    mock.start()
+    port = free_port()
+    api_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory(prefix="load-test-") as workdir:
+        process, log_path = start_api(port, mock.base_url, workdir, args)
+        try:
+            results = asyncio.run(run(args, api_url, mock, process))
+        except Exception:
+            with open(log_path, errors="replace") as log:
+                print(log.read()[-4000:], file=sys.stderr)
+            raise
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+            mock.shutdown()
+            mock.server_close()
+
+    report = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {name: value for name, value in vars(args).items() if name != "api_key"},
+        "results": results,
+    }
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"load_test-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nresults written to {output}")
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Local mock of the LinkedIn endpoints the scrapers call, for offline load tests.
+
+Serves the homepage, `profileView`, `profileContactInfo` and the connections
+listing with generated data. Responses can be delayed, and a share of them
+replaced by server errors or 429 throttling. Requests without the fake session
+cookies (`MOCK_COOKIES`) get a 401, like an expired session.
+
+Run standalone from the repository root:
+
+    python -m benchmarks.mock_voyager [--port N] [--latency-ms N] [--throttle-rate R]
+
+and point the API at it with `LINKEDIN_BASE_URL=http://127.0.0.1:N`. The counts
+of served requests are available at `GET /__mock/stats` and reset with
+`POST /__mock/reset`.
+"""
+import argparse
+import html
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Session cookies a logged-in account would hold
+MOCK_COOKIES = {
+    "li_at": "mock-li-at",
+    "JSESSIONID": '"ajax:0000000000000000000"',
+}
+# Public identifier of the logged-in member
+MOCK_MEMBER_ID = "mock-member"
+
+PROFILE_VIEW_PATH = re.compile(r"^/voyager/api/identity/profiles/([^/]+)/profileView$")
+CONTACT_INFO_PATH = re.compile(r"^/voyager/api/identity/profiles/([^/]+)/profileContactInfo$")
+CONNECTIONS_PATH = "/voyager/api/relationships/dash/connections"
+
+
+def build_profile_view(public_id, positions):
+    """
+    Build a profileView document for a member.
+    """
+    return {
+        "profile": {
+            "firstName": "Mock",
+            "lastName": public_id,
+            "headline": f"Engineer at Company {len(public_id)}",
+            "summary": "Builds  scalable\nsystems. " * 20,
+            "industryName": "Computer Software",
+            "geoLocationName": "Berlin, Germany",
+            "miniProfile": {"publicIdentifier": public_id, "entityUrn": f"urn:li:fs_miniProfile:{public_id}"},
+        },
+        "positionView": {"elements": [
+            {
+                "title": f"Engineer {index}",
+                "companyName": f"Company {index}",
+                "locationName": "Berlin, Germany",
+                "timePeriod": {"startDate": {"month": 1, "year": 2010 + index}},
+                "description": "Led the migration of the billing platform. " * 4,
+            }
+            for index in range(positions)
+        ]},
+        "educationView": {"elements": [
+            {"schoolName": "Mock University", "degreeName": "MSc", "timePeriod": {}},
+        ]},
+        "skillView": {"elements": [{"name": f"Skill {index}"} for index in range(positions * 2)]},
+    }
+
+
+def build_contact_info(public_id):
+    """
+    Build a profileContactInfo document for a member.
+    """
+    return {
+        "emailAddress": f"{public_id}@example.com",
+        "phoneNumbers": [{"number": "+49 30 0000000", "type": "WORK"}],
+    }
+
+
+def build_connections_page(start, count, total):
+    """
+    Build a connections listing page of `total` generated connections.
+    """
+    return {
+        "elements": [
+            {
+                "connectedMember": f"urn:li:fsd_profile:{index}",
+                "createdAt": 1700000000000 - index,
+                "connectedMemberResolutionResult": {
+                    "publicIdentifier": f"connection-{index}",
+                    "firstName": "Mock",
+                    "lastName": f"Connection {index}",
+                    "headline": "Engineer",
+                },
+            }
+            for index in range(start, min(start + count, total))
+        ],
+        "paging": {"start": start, "count": count, "total": total},
+    }
+
+
+def build_homepage(public_id):
+    """
+    Build a feed page embedding the logged-in member the way LinkedIn does, as
+    HTML-escaped JSON in a hidden `<code>` element.
+    """
+    me = json.dumps({"data": {"plainId": 1}, "included": [
+        {"$type": "com.linkedin.voyager.identity.shared.MiniProfile", "publicIdentifier": public_id},
+    ]})
+    return (
+        "<!DOCTYPE html><html><head><title>Feed | LinkedIn</title></head><body>"
+        f'<code style="display: none" id="bpr-guid-1">{html.escape(me)}</code>'
+        "</body></html>"
+    )
+
+
+class MockVoyagerServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server answering like the LinkedIn endpoints.
+
+    Attributes:
+        latency (float): Seconds every response is delayed
+        jitter (float): Up to this many extra seconds, uniformly drawn
+        error_rate (float): Share of requests answered with a 503
+        throttle_rate (float): Share of requests answered with a 429
+        retry_after (int): `Retry-After` of throttled responses, None to omit it
+        positions (int): Experience entries of every profile
+        total_connections (int): Size of the connections listing
+        stats (Counter): Served requests by endpoint and by status code
+    """
+
+    daemon_threads = True
+    # Queue bursts of connections instead of refusing them
+    request_queue_size = 1024
+
+    def __init__(
+            self,
+            address=("127.0.0.1", 0),
+            latency=0.05,
+            jitter=0.0,
+            error_rate=0.0,
+            throttle_rate=0.0,
+            retry_after=None,
+            positions=5,
+            total_connections=400,
+            seed=None,
+    ):
+        super().__init__(address, MockVoyagerHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.positions = positions
+        self.total_connections = total_connections
+        self.stats = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, endpoint, status_code):
+        with self._lock:
+            self.stats[f"endpoint:{endpoint}"] += 1
+            self.stats[f"status:{status_code}"] += 1
+
+    def snapshot(self, reset=False):
+        """
+        Return the request counts.
+
+        Args:
+            reset (bool, optional): Start counting from zero again. Defaults to False.
+
+        Returns:
+            dict: `endpoints` and `statuses` request counts
+        """
+        with self._lock:
+            stats = self.stats
+            if reset:
+                self.stats = Counter()
+            else:
+                stats = stats.copy()
+        snapshot = {"endpoints": {}, "statuses": {}}
+        for key, count in stats.items():
+            kind, name = key.split(":", 1)
+            snapshot["endpoints" if kind == "endpoint" else "statuses"][name] = count
+        return snapshot
+
+    def draw(self):
+        """
+        Draw the injected delay and failure of one request.
+
+        Returns:
+            tuple: Delay in seconds and the injected status code, or None
+        """
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            roll = self._random.random()
+        if roll < self.throttle_rate:
+            return delay, 429
+        if roll < self.throttle_rate + self.error_rate:
+            return delay, 503
+        return delay, None
+
+    def start(self):
+        """
+        Serve requests from a daemon thread.
+        """
+        thread = threading.Thread(target=self.serve_forever, name="mock-voyager", daemon=True)
+        thread.start()
+        return thread
+
+
+class MockVoyagerHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real API
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/__mock/stats":
+            return self.send_body(200, json.dumps(self.server.snapshot()).encode("utf-8"))
+
+        endpoint, build = self.route(url)
+        if build is None:
+            self.server.record("unknown", 404)
+            return self.send_body(404, b'{"status":404}')
+
+        delay, injected_status = self.server.draw()
+        time.sleep(delay)
+        if not self.is_logged_in():
+            status_code, body = 401, b'{"status":401}'
+        elif injected_status is not None:
+            status_code, body = injected_status, json.dumps({"status": injected_status}).encode("utf-8")
+        else:
+            status_code, body = 200, build()
+        self.server.record(endpoint, status_code)
+
+        headers = {}
+        if status_code == 429 and self.server.retry_after is not None:
+            headers["Retry-After"] = str(self.server.retry_after)
+        content_type = "text/html; charset=utf-8" if endpoint == "homepage" and status_code == 200 else None
+        self.send_body(status_code, body, headers, content_type)
+
+    def do_POST(self):
+        if urlsplit(self.path).path == "/__mock/reset":
+            self.server.snapshot(reset=True)
+            return self.send_body(200, b"{}")
+        self.send_body(404, b'{"status":404}')
+
+    def route(self, url):
+        """
+        Match a request path to its endpoint name and body builder.
+        """
+        server = self.server
+        if url.path in ("", "/", "/feed/"):
+            return "homepage", lambda: build_homepage(MOCK_MEMBER_ID).encode("utf-8")
+        match = PROFILE_VIEW_PATH.match(url.path)
+        if match:
+            public_id = match.group(1)
+            return "profileView", lambda: json.dumps(build_profile_view(public_id, server.positions)).encode("utf-8")
+        match = CONTACT_INFO_PATH.match(url.path)
+        if match:
+            public_id = match.group(1)
+            return "profileContactInfo", lambda: json.dumps(build_contact_info(public_id)).encode("utf-8")
+        if url.path == CONNECTIONS_PATH:
+            query = parse_qs(url.query)
+            start = int(query.get("start", ["0"])[0])
+            count = int(query.get("count", ["40"])[0])
+            return "connections", lambda: json.dumps(
+                build_connections_page(start, count, server.total_connections)
+            ).encode("utf-8")
+        return None, None
+
+    def is_logged_in(self):
+        cookies = SimpleCookie(self.headers.get("Cookie", ""))
+        return all(name in cookies for name in MOCK_COOKIES)
+
+    def send_body(self, status_code, body, headers=None, content_type=None):
+        self.send_response(status_code)
+        self.send_header("Content-Type", content_type or "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def add_arguments(parser):
+    """
+    Add the fault injection options of the mock to an argument parser.
+    """
+    parser.add_argument("--latency-ms", type=float, default=50, help="delay of every upstream response")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="extra random delay, up to this much")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of upstream 503 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="share of upstream 429 responses")
+    parser.add_argument("--retry-after", type=int, default=None, help="Retry-After seconds of 429 responses")
+    parser.add_argument("--positions", type=int, default=5, help="experience entries per profile")
+    parser.add_argument("--total-connections", type=int, default=400, help="size of the connections listing")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the injected failures")
+
+
+def create_server(args, address=("127.0.0.1", 0)):
+    """
+    Create a mock server from parsed `add_arguments` options.
+    """
+    return MockVoyagerServer(
+        address,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        positions=args.positions,
+        total_connections=args.total_connections,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900, help="port to listen on")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = create_server(args, ("127.0.0.1", args.port))
+    print(f"mock Voyager API on {server.base_url}, session cookies: {json.dumps(MOCK_COOKIES)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
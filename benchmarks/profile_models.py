@@ -0,0 +1,182 @@
+"""
+Benchmark of profile extraction into `scraping.models.Profile` records.
+
+Compares the previous dict-building `DataParser.get_profile_data` with the
+extraction into `Profile` records: parse throughput (profileView plus contact
+info), memory retained by 10k parsed profiles and serialization time.
+
+Run from the repository root:
+
+    python -m benchmarks.profile_models [--profiles N] [--positions N] [--repeat N]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+import serialization
+from scraping.data_parser import DataParser
+
+
+class FakeResponse:
+    """
+    Stand-in for `scraping.requests.response.Response` with a parsed body.
+    """
+
+    def __init__(self, json_data):
+        self.json_data = json_data
+
+    def json(self):
+        return self.json_data
+
+
+class LegacyDataParser:
+    """
+    Reproduces the profile extraction `DataParser` used before.
+    """
+
+    def __init__(self, response):
+        self.json_data = response.json()
+
+    def get_profile_data(self):
+        first_name = self.json_data.get("profile", {}).get("firstName")
+        last_name = self.json_data.get("profile", {}).get("lastName")
+        public_id = self.json_data.get("profile", {}).get("miniProfile", {}).get("publicIdentifier")
+        summary = self.json_data.get("profile", {}).get("summary")
+        headline = self.json_data.get("profile", {}).get("headline")
+        industry_name = self.json_data.get("profile", {}).get("industryName")
+        location = self.json_data.get("profile", {}).get("geoLocationName")
+        raw_skills = self.json_data.get("skillView", {}).get("elements") or []
+        raw_experience = self.json_data.get("positionView", {}).get("elements") or []
+        raw_education = self.json_data.get("educationView", {}).get("elements") or []
+        return {
+            "public_id": public_id,
+            "full_name": f"{first_name} {last_name}",
+            "headline": headline,
+            "summary": " ".join(summary.split()).strip() if summary else None,
+            "industry_name": industry_name,
+            "location": location,
+            "skills": [skill.get("name") for skill in raw_skills if skill.get("name")],
+            "experience": [
+                {
+                    "job_title": item.get("title"),
+                    "company_name": item.get("companyName"),
+                    "location": item.get("locationName"),
+                    "period": item.get("timePeriod"),
+                    "description": item.get("description"),
+                }
+                for item in raw_experience
+            ],
+            "education": [
+                {
+                    "school_name": item.get("schoolName"),
+                    "degree": item.get("degreeName"),
+                    "period": item.get("timePeriod"),
+                }
+                for item in raw_education
+            ],
+        }
+
+
+def build_profile_view(index, positions):
+    """
+    Build a profileView-like document.
+    """
+    return {
+        "profile": {
+            "firstName": f"First{index}",
+            "lastName": f"Last{index}",
+            "headline": "Staff Engineer at Example Corp",
+            "summary": "Builds   distributed systems.\n" * 3,
+            "industryName": "Software Development",
+            "geoLocationName": "Berlin, Germany",
+            "miniProfile": {"publicIdentifier": f"member-{index}"},
+        },
+        "positionView": {"elements": [
+            {
+                "title": "Engineer",
+                "companyName": f"Company {position}",
+                "locationName": "Berlin",
+                "timePeriod": {"startDate": {"year": 2010 + position}},
+                "description": "Owned the billing platform.",
+            }
+            for position in range(positions)
+        ]},
+        "educationView": {"elements": [
+            {"schoolName": "Technical University", "degreeName": "MSc", "timePeriod": {}},
+        ]},
+        "skillView": {"elements": [{"name": "Python"}, {"name": "Go"}, {"name": "SQL"}]},
+    }
+
+
+CONTACT_INFO = {"emailAddress": "member@example.com", "phoneNumbers": [{"number": "+49 30 1234567"}]}
+
+
+def parse_legacy(document):
+    profile_data = LegacyDataParser(FakeResponse(document)).get_profile_data()
+    profile_data.update({
+        "email": CONTACT_INFO.get("emailAddress"),
+        "phone": CONTACT_INFO.get("phoneNumbers", [{}])[0].get("number"),
+    })
+    return profile_data
+
+
+def parse_model(document):
+    profile = DataParser(FakeResponse(document)).parse_profile()
+    return DataParser(FakeResponse(CONTACT_INFO)).parse_contact_details(profile=profile)
+
+
+def best_of(repeat, function):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure(label, parse, documents, serialize, repeat):
+    def parse_all():
+        for document in documents:
+            parse(document)
+
+    parse_seconds = best_of(repeat, parse_all)
+
+    gc.collect()
+    tracemalloc.start()
+    parsed = [parse(document) for document in documents]
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    def serialize_all():
+        for profile in parsed:
+            serialization.dumps(serialize(profile))
+
+    serialize_seconds = best_of(repeat, serialize_all)
+
+    print(
+        f"{label:<8} {len(documents) / parse_seconds:>12,.0f} {retained / 1024 / 1024:>14.2f}"
+        f" {serialize_seconds * 1000:>14.1f}"
+    )
+    return parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profiles", type=int, default=10000, help="profiles parsed per run")
+    parser.add_argument("--positions", type=int, default=5, help="experience entries per profile")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs, the fastest is reported")
+    args = parser.parse_args()
+
+    documents = [build_profile_view(index, args.positions) for index in range(args.profiles)]
+    assert parse_legacy(documents[0]) == parse_model(documents[0]).to_dict()
+
+    print(f"{args.profiles} profiles, {args.positions} positions each")
+    print(f"{'':<8} {'profiles/s':>12} {'retained MiB':>14} {'serialize ms':>14}")
+    measure("dicts", parse_legacy, documents, lambda profile: profile, args.repeat)
+    measure("models", parse_model, documents, lambda profile: profile.to_dict(), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
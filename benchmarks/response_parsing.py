@@ -0,0 +1,118 @@
+"""
+Micro-benchmark of upstream response handling on large profileView payloads.
+
+Compares the previous per-call `ResponseWrapper` (eager text copy, stdlib json
+parsing of the decoded text) with `scraping.requests.response.Response` (bytes
+only, lazy text, orjson parsing from bytes when installed).
+
+Run from the repository root:
+
+    python -m benchmarks.response_parsing [--positions N] [--repeat N]
+"""
+import argparse
+import json
+import timeit
+import tracemalloc
+
+import serialization
+from scraping.requests.response import Response
+
+
+class FakeHTTPResponse:
+    """
+    Stand-in for a curl_cffi response holding an already received body.
+    """
+
+    def __init__(self, content):
+        self.status_code = 200
+        self.headers = {"content-type": "application/json"}
+        self.content = content
+        self.url = "https://www.linkedin.com/voyager/api/identity/profiles/bench/profileView"
+        self.cookies = {}
+        self.charset_encoding = None
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+
+def legacy_response(http_response):
+    """
+    Reproduces the response handling `Request.fetch` used before.
+    """
+    class ResponseWrapper:
+        def __init__(self, http_response):
+            self.status_code = http_response.status_code
+            self.headers = http_response.headers
+            self.text = http_response.text
+            self._content = http_response.content
+            self.url = http_response.url
+            self.cookies = http_response.cookies
+
+        def json(self):
+            import json
+            return json.loads(self.text)
+
+    return ResponseWrapper(http_response)
+
+
+def build_payload(positions):
+    """
+    Build a profileView-like document with `positions` experience entries.
+    """
+    description = "Led the migration of the billing platform to event sourcing. " * 8
+    return {
+        "profile": {
+            "firstName": "Bench",
+            "lastName": "Mark",
+            "headline": "Staff Engineer",
+            "summary": "Summary " * 200,
+            "miniProfile": {"publicIdentifier": "bench-mark", "entityUrn": "urn:li:fs_miniProfile:1"},
+        },
+        "positionView": {"elements": [
+            {
+                "title": f"Engineer {index}",
+                "companyName": f"Company {index}",
+                "locationName": "Zürich, Switzerland",
+                "timePeriod": {"startDate": {"month": 1, "year": 2010 + index % 10}},
+                "description": description,
+            }
+            for index in range(positions)
+        ]},
+        "educationView": {"elements": [
+            {"schoolName": f"School {index}", "degreeName": "MSc", "timePeriod": {}}
+            for index in range(positions // 10 + 1)
+        ]},
+        "skillView": {"elements": [{"name": f"Skill {index}"} for index in range(positions)]},
+    }
+
+
+def measure(label, parse, http_response, repeat):
+    seconds = min(timeit.repeat(lambda: parse(http_response).json(), number=repeat, repeat=5)) / repeat
+    tracemalloc.start()
+    parse(http_response).json()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} {seconds * 1000:8.3f} ms/response {peak / 1024:10.1f} KiB peak")
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--positions", type=int, default=500, help="experience entries per payload")
+    parser.add_argument("--repeat", type=int, default=50, help="responses parsed per timing run")
+    args = parser.parse_args()
+
+    content = json.dumps(build_payload(args.positions)).encode("utf-8")
+    http_response = FakeHTTPResponse(content)
+    assert legacy_response(http_response).json() == Response(http_response).json()
+
+    backend = "orjson" if serialization.orjson is not None else "json"
+    print(f"payload: {len(content) / 1024:.1f} KiB, parser: {backend}")
+    legacy_seconds, legacy_peak = measure("legacy", legacy_response, http_response, args.repeat)
+    new_seconds, new_peak = measure("response", Response, http_response, args.repeat)
+    print(f"speedup: {legacy_seconds / new_seconds:.2f}x, peak memory: {new_peak / legacy_peak:.0%} of legacy")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,24 @@
+import contextlib
+import glob
 import os
 
+import settings
+
 bind = "0.0.0.0:5000"
 workers = int(os.environ.get("GUNICORN_WORKERS", 4))
-threads = int(os.environ.get("GUNICORN_THREADS", 2))
 timeout = int(os.environ.get("GUNICORN_TIMEOUT", 600))
-worker_class = "gthread"  # Use threaded workers for better concurrency
-log_level = "info"
\ No newline at end of file
+# ASGI workers: each one serves every request from a single long-lived event
+# loop. Shared resources are set up and torn down by the app's
+# before_serving/after_serving hooks.
+worker_class = "uvicorn_worker.UvicornWorker"
+log_level = "info"
+
+# Workers, and the scrape workers of scrape_worker.py, publish their metrics to
+# METRICS_DIR so any of them can answer /metrics for the whole host. The exports
+# of the previous server start are removed, so no stale workers are reported.
+def on_starting(server):
+    if not settings.METRICS_DIR:
+        return
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, "*.json")):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
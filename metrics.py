@@ -0,0 +1,565 @@
+import contextvars
+import glob
+import heapq
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Counter:
+    """
+    A thread-safe, monotonically increasing counter with optional labels.
+
+    Attributes:
+        name (str): Metric name
+        description (str): Human readable description of the metric
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, description=""):
+        """
+        Initialize the counter.
+
+        Args:
+            name (str): Metric name
+            description (str, optional): Human readable description of the metric
+        """
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """
+        Increment the counter.
+
+        Args:
+            amount (int, optional): Amount to add. Defaults to 1.
+            **labels: Label name-value pairs identifying the series
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """
+        Return the current value of a single series.
+
+        Args:
+            **labels: Label name-value pairs identifying the series
+
+        Returns:
+            int: The current value, or 0 if the series was never incremented
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def snapshot(self):
+        """
+        Return a copy of every series of the counter.
+
+        Returns:
+            dict: Mapping of label tuples to values
+        """
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(Counter):
+    """
+    A thread-safe value that can go up and down, with optional labels.
+    """
+
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        """
+        Decrement the gauge.
+
+        Args:
+            amount (int, optional): Amount to subtract. Defaults to 1.
+            **labels: Label name-value pairs identifying the series
+        """
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        """
+        Set the gauge to a value.
+
+        Args:
+            value (float): New value
+            **labels: Label name-value pairs identifying the series
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = value
+
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Histogram:
+    """
+    A thread-safe histogram of observed values (usually durations in seconds).
+
+    Attributes:
+        name (str): Metric name
+        description (str): Human readable description of the metric
+        buckets (tuple): Upper bounds of the cumulative buckets
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, description="", buckets=DEFAULT_BUCKETS):
+        """
+        Initialize the histogram.
+
+        Args:
+            name (str): Metric name
+            description (str, optional): Human readable description of the metric
+            buckets (tuple, optional): Upper bounds of the buckets
+        """
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """
+        Record a single observation.
+
+        Args:
+            value (float): The observed value
+            **labels: Label name-value pairs identifying the series
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {
+                    "buckets": [0] * len(self.buckets),
+                    "count": 0,
+                    "sum": 0.0,
+                }
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    series["buckets"][index] += 1
+            series["count"] += 1
+            series["sum"] += value
+
+    def snapshot(self):
+        """
+        Return a copy of every series of the histogram.
+
+        Returns:
+            dict: Mapping of label tuples to `buckets`, `count` and `sum`
+        """
+        with self._lock:
+            return {
+                key: {
+                    "buckets": list(series["buckets"]),
+                    "count": series["count"],
+                    "sum": series["sum"],
+                }
+                for key, series in self._values.items()
+            }
+
+
+class Registry:
+    """
+    Process-wide collection of metrics, keyed by metric name.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, description=""):
+        """
+        Return the counter registered under `name`, creating it if needed.
+
+        Args:
+            name (str): Metric name
+            description (str, optional): Human readable description of the metric
+
+        Returns:
+            Counter: The registered counter
+        """
+        return self._register(Counter, name, description)
+
+    def gauge(self, name, description=""):
+        """
+        Return the gauge registered under `name`, creating it if needed.
+
+        Args:
+            name (str): Metric name
+            description (str, optional): Human readable description of the metric
+
+        Returns:
+            Gauge: The registered gauge
+        """
+        return self._register(Gauge, name, description)
+
+    def histogram(self, name, description="", buckets=DEFAULT_BUCKETS):
+        """
+        Return the histogram registered under `name`, creating it if needed.
+
+        Args:
+            name (str): Metric name
+            description (str, optional): Human readable description of the metric
+            buckets (tuple, optional): Upper bounds of the buckets
+
+        Returns:
+            Histogram: The registered histogram
+        """
+        return self._register(Histogram, name, description, buckets=buckets)
+
+    def _register(self, metric_class, name, description, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = metric_class(name, description, **kwargs)
+            return self._metrics[name]
+
+    def snapshot(self):
+        """
+        Return the current values of every registered metric.
+
+        Returns:
+            dict: Mapping of metric names to their series
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def export(self):
+        """
+        Return every registered metric in a JSON serializable form.
+
+        Returns:
+            dict: Metric names mapped to their `kind`, `description`, `buckets`
+                  (histograms only) and `series`, a list of label dicts and values
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        exported = {}
+        for metric in metrics:
+            exported[metric.name] = {
+                "kind": metric.kind,
+                "description": metric.description,
+                "buckets": list(getattr(metric, "buckets", ())),
+                "series": [[dict(key), value] for key, value in metric.snapshot().items()],
+            }
+        return exported
+
+
+def merge_exports(exports):
+    """
+    Add up the exported metrics of several worker processes.
+
+    Counters and histograms are summed over every export, including the ones of
+    workers that have exited, so they never go down. Gauges describe the current
+    state and are only summed over live workers.
+
+    Args:
+        exports (list): Pairs of a `Registry.export` result and whether the
+                        worker that wrote it is still alive
+
+    Returns:
+        dict: Merged metrics, in the `Registry.export` format
+    """
+    merged = {}
+    for exported, alive in exports:
+        for name, metric in exported.items():
+            if metric["kind"] == "gauge" and not alive:
+                continue
+            target = merged.setdefault(name, dict(metric, series={}))
+            for labels, value in metric["series"]:
+                key = tuple(sorted(labels.items()))
+                current = target["series"].get(key)
+                if current is None:
+                    target["series"][key] = value
+                elif metric["kind"] == "histogram":
+                    target["series"][key] = {
+                        "buckets": [a + b for a, b in zip(current["buckets"], value["buckets"])],
+                        "count": current["count"] + value["count"],
+                        "sum": current["sum"] + value["sum"],
+                    }
+                else:
+                    target["series"][key] = current + value
+    for metric in merged.values():
+        metric["series"] = [[dict(key), value] for key, value in metric["series"].items()]
+    return merged
+
+
+def _format_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ""
+    pairs = (
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in sorted(labels.items())
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(exported):
+    """
+    Render exported metrics in the Prometheus text exposition format (0.0.4).
+
+    Args:
+        exported (dict): Metrics in the `Registry.export` format
+
+    Returns:
+        str: The exposition document
+    """
+    lines = []
+    for name in sorted(exported):
+        metric = exported[name]
+        lines.append(f"# HELP {name} {metric['description']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for labels, value in metric["series"]:
+            if metric["kind"] != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            for upper_bound, count in zip(metric["buckets"], value["buckets"]):
+                lines.append(f"{name}_bucket{_format_labels(labels, le=_format_value(upper_bound))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, le='+Inf')} {value['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+class WorkerMetrics:
+    """
+    Shares the registry of every worker process of a server through a directory.
+
+    Each worker writes its own export to `<directory>/<pid>.json`, periodically
+    and whenever it answers a scrape, and a scrape merges the files of every
+    worker with `merge_exports`. Any worker can then answer `/metrics` for the
+    whole server. Without a directory only the current process is reported.
+
+    Attributes:
+        directory (str): Directory shared by the workers, or None
+    """
+
+    def __init__(self, directory, registry):
+        """
+        Args:
+            directory (str): Directory shared by the workers, or None
+            registry (Registry): Registry of the current process
+        """
+        self.directory = directory
+        self.registry = registry
+
+    def write(self):
+        """
+        Publish the current process's metrics to the shared directory.
+        """
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"written_at": time.time(), "metrics": self.registry.export()}, file)
+        os.replace(temp_path, path)
+
+    def collect(self):
+        """
+        Return the metrics of every worker, merged.
+
+        Returns:
+            dict: Merged metrics, in the `Registry.export` format
+        """
+        if not self.directory:
+            return self.registry.export()
+        self.write()
+        exports = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path) as file:
+                    data = json.load(file)
+                pid = int(os.path.basename(path)[:-len(".json")])
+            except (OSError, ValueError):
+                continue
+            exports.append((data["metrics"], _is_alive(pid)))
+        return merge_exports(exports)
+
+
+def _is_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class RequestTimings:
+    """
+    Stage durations of a single API call, reported in its `Server-Timing` header.
+
+    Durations of a stage that ran several times (e.g. one `profile_view` per
+    scraped profile, concurrently) are summed, so stages can add up to more
+    than the wall time of the call.
+
+    Attributes:
+        started_at (float): `time.perf_counter()` when the call started
+        stages (dict): Stage names mapped to `[total seconds, count]`
+        slowest_profiles (list): Min-heap of the `(seconds, public_id)` of the
+                                 slowest scraped profiles
+    """
+
+    __slots__ = ("started_at", "stages", "slowest_profiles", "max_profiles", "_lock")
+
+    def __init__(self, max_profiles=5):
+        self.started_at = time.perf_counter()
+        self.stages = {}
+        self.slowest_profiles = []
+        self.max_profiles = max_profiles
+        # Cookie loads and logins report from the login executor's threads
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            total = self.stages.setdefault(stage, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+
+    def add_profile(self, public_id, seconds):
+        with self._lock:
+            if len(self.slowest_profiles) < self.max_profiles:
+                heapq.heappush(self.slowest_profiles, (seconds, public_id))
+            else:
+                heapq.heappushpop(self.slowest_profiles, (seconds, public_id))
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    def slowest(self):
+        """
+        Returns:
+            list: `(seconds, public_id)` of the slowest profiles, slowest first
+        """
+        with self._lock:
+            return sorted(self.slowest_profiles, reverse=True)
+
+    def server_timing(self):
+        """
+        Render the timings as a `Server-Timing` header value.
+
+        Returns:
+            str: One `<stage>;dur=<ms>` metric per stage, then the slowest profiles
+                 and the total
+        """
+        with self._lock:
+            stages = {stage: tuple(total) for stage, total in self.stages.items()}
+        metrics = []
+        for stage, (seconds, count) in stages.items():
+            metric = f"{stage};dur={seconds * 1000:.1f}"
+            if count > 1:
+                metric += f';desc="{count} calls"'
+            metrics.append(metric)
+        slowest = self.slowest()
+        if slowest:
+            description = ", ".join(f"{public_id} {seconds:.2f}s" for seconds, public_id in slowest)
+            metrics.append(f'slowest_profile;dur={slowest[0][0] * 1000:.1f};desc="{_quote(description)}"')
+        metrics.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def summary(self):
+        """
+        Render the timings as a single log line.
+        """
+        with self._lock:
+            stages = {stage: tuple(total) for stage, total in self.stages.items()}
+        parts = [f"{stage}={seconds:.2f}s/{count}" for stage, (seconds, count) in stages.items()]
+        parts.extend(f"{public_id}={seconds:.2f}s" for seconds, public_id in self.slowest())
+        return f"total={self.elapsed():.2f}s " + " ".join(parts)
+
+
+def _quote(value):
+    # Header values are ASCII
+    value = value.replace("\\", "\\\\").replace('"', '\\"')
+    return value.encode("ascii", "backslashreplace").decode("ascii")
+
+
+# Timings of the API call being served; tasks spawned by the call share them
+current_timings = contextvars.ContextVar("current_timings", default=None)
+
+
+def observe_stage(stage, seconds):
+    """
+    Record the duration of a scraping stage in `stage_duration` and in the
+    timings of the current API call.
+
+    Args:
+        stage (str): Stage name
+        seconds (float): Duration of the stage
+    """
+    stage_duration.observe(seconds, stage=stage)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def timed_stage(stage):
+    """
+    Record the duration of a block as a scraping stage, even when it raises.
+
+    Args:
+        stage (str): Stage name
+    """
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started_at)
+
+
+@contextmanager
+def timed_profile(public_id):
+    """
+    Record how long a profile took in the timings of the current API call.
+
+    Profile IDs are only kept per call, never as metric labels.
+
+    Args:
+        public_id (str): LinkedIn public identifier
+    """
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = current_timings.get()
+        if timings is not None:
+            timings.add_profile(public_id, time.perf_counter() - started_at)
+
+
+registry = Registry()
+
+# Stages of a scrape, from the cookie lookup to parsing the responses
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+stage_duration = registry.histogram(
+    "scrape_stage_duration_seconds",
+    "Duration of scraping stages, labelled by stage (cookie_cache/login/listing/"
+    "profiles/profile_view/contact_info/parse/serialize/rate_limit_wait/retry_wait)",
+    buckets=STAGE_BUCKETS,
+)
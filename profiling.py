@@ -0,0 +1,90 @@
+import cProfile
+import io
+import os
+import pstats
+import time
+import uuid
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+
+class RequestProfiler:
+    """
+    Profiles a single API call end to end.
+
+    With the optional `pyinstrument` package installed the profiler runs in its
+    async mode: time a scraper coroutine spends awaiting is attributed to that
+    coroutine, and coroutines of other API calls served by the same event loop
+    are left out. Without it, `cProfile` records everything that runs on the
+    event loop's thread while the call is served.
+
+    Attributes:
+        name (str): Unique name of the profile, also used for its file name
+    """
+
+    def __init__(self, label):
+        """
+        Args:
+            label (str): Short description of the profiled call, e.g. its route
+        """
+        slug = "".join(char if char.isalnum() else "-" for char in label).strip("-")
+        self.name = f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{uuid.uuid4().hex[:8]}"
+        if pyinstrument is not None:
+            self._profiler = pyinstrument.Profiler(async_mode="enabled")
+        else:
+            self._profiler = cProfile.Profile()
+
+    def __enter__(self):
+        if pyinstrument is not None:
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if pyinstrument is not None:
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def render(self):
+        """
+        Render the profile for reading.
+
+        Returns:
+            tuple: The report and its media type (HTML with `pyinstrument`, the
+                   `pstats` listing sorted by cumulative time otherwise)
+        """
+        if pyinstrument is not None:
+            return self._profiler.output_html(), "text/html"
+        stream = io.StringIO()
+        pstats.Stats(self._profiler, stream=stream).sort_stats("cumulative").print_stats(80)
+        return stream.getvalue(), "text/plain"
+
+    def save(self, directory):
+        """
+        Store the profile for offline analysis.
+
+        `pyinstrument` profiles are saved as a `.pyisession` (open with
+        `pyinstrument --load`) next to the HTML report; `cProfile` ones as a
+        `.prof` file (open with `pstats` or snakeviz).
+
+        Args:
+            directory (str): Directory to write the profile to
+
+        Returns:
+            str: Path of the saved profile
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.name)
+        if pyinstrument is not None:
+            self._profiler.last_session.save(f"{path}.pyisession")
+            report, _ = self.render()
+            with open(f"{path}.html", "w") as file:
+                file.write(report)
+            return f"{path}.pyisession"
+        self._profiler.dump_stats(f"{path}.prof")
+        return f"{path}.prof"
@@ -9,4 +9,23 @@ class RequestFailedException(APIBaseException):
 
 
 class InvalidResponseException(APIBaseException):
-    pass
\ No newline at end of file
+    pass
+
+class SessionExpiredException(RequestFailedException):
+    pass
+
+
+class BrowserPoolTimeoutException(APIBaseException):
+    pass
+
+
+class LoginFailedException(APIBaseException):
+    pass
+
+
+class RateLimitedException(RequestFailedException):
+    pass
+
+
+class DeadlineExceededException(RequestFailedException):
+    pass
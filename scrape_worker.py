@@ -0,0 +1,101 @@
+"""
+Scraper worker processes draining the scrape job queue.
+
+With `JOB_QUEUE_ENABLED=true` the API only enqueues `/profile` and
+`/connections` calls (`scraping.job_queue`); these processes run them. Start
+them next to the API, on the same host (they share its queue database, cookie
+cache, rate limit state and `METRICS_DIR`, through which `/metrics` reports
+their counters):
+
+    python scrape_worker.py [--processes N] [--concurrency N]
+
+Each process runs up to `--concurrency` jobs at a time on one event loop,
+sharing pooled upstream sessions, caches and concurrency limiters between
+them. SIGTERM or Ctrl+C stops claiming jobs and lets running ones finish.
+"""
+import argparse
+import asyncio
+import contextlib
+import multiprocessing
+import signal
+from traceback import format_exc
+
+import settings
+from metrics import WorkerMetrics, registry
+from scraping.browser_pool import browser_pool
+from scraping.job_queue import JobWorker, job_queue
+from scraping.profile_store import profile_store
+from scraping.rate_limit import rate_limiter
+from scraping.requests.session_pool import session_pool
+
+
+async def flush_metrics(worker_metrics):
+    """
+    Publish this process's metrics next to the API workers', for `/metrics`.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, worker_metrics.write)
+        except OSError:
+            print(format_exc())
+        await asyncio.sleep(settings.METRICS_FLUSH_INTERVAL)
+
+
+async def serve(concurrency):
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    if rate_limiter.enabled:
+        # Fails fast on a misconfigured rate limit backend
+        await loop.run_in_executor(None, lambda: rate_limiter.backend)
+    # Fails fast without the `cryptography` package
+    await loop.run_in_executor(None, job_queue.check)
+    worker_metrics = WorkerMetrics(settings.METRICS_DIR, registry)
+    flusher = asyncio.ensure_future(flush_metrics(worker_metrics))
+    try:
+        await JobWorker(concurrency=concurrency).run(stop)
+    finally:
+        flusher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await flusher
+        await loop.run_in_executor(None, profile_store.flush)
+        await session_pool.close()
+        await loop.run_in_executor(None, browser_pool.shutdown)
+
+
+def run_process(concurrency):
+    asyncio.run(serve(concurrency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--processes", type=int, default=settings.JOB_WORKER_PROCESSES,
+                        help="worker processes (default: JOB_WORKER_PROCESSES)")
+    parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY,
+                        help="jobs run at a time per process (default: JOB_WORKER_CONCURRENCY)")
+    args = parser.parse_args()
+
+    processes = [
+        multiprocessing.Process(target=run_process, args=(args.concurrency,), name=f"scrape-worker-{index}")
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    print(f"{len(processes)} scrape workers running {args.concurrency} jobs each")
+
+    def stop(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from traceback import format_exc
+
+from selenium import webdriver
+from selenium_stealth import stealth
+
+import settings
+from metrics import registry
+from request_exceptions import BrowserPoolTimeoutException
+
+login_queue_wait = registry.histogram(
+    "login_queue_wait_seconds",
+    "Time login jobs waited for a free browser",
+)
+login_latency = registry.histogram(
+    "login_duration_seconds",
+    "Time spent logging in with a pooled browser",
+)
+browsers_gauge = registry.gauge(
+    "browsers",
+    "Pooled browsers, labelled by state (idle/in_use)",
+)
+login_queue_depth = registry.gauge(
+    "login_queue_depth",
+    "Login jobs waiting for a free browser",
+)
+browsers_recycled = registry.counter(
+    "browsers_recycled_total",
+    "Browsers quit by the pool, labelled by reason",
+)
+
+
+def launch_browser():
+    """
+    Launch a headless Chrome browser with stealth settings.
+
+    This function configures and launches a Chrome WebDriver instance with settings
+    to avoid detection as an automated browser. It uses selenium-stealth to bypass
+    common anti-bot measures.
+
+    Returns:
+        webdriver.Chrome: Configured Chrome WebDriver instance
+    """
+    options = webdriver.ChromeOptions()
+    options.binary_location = settings.CHROME_BINARY
+    options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1366,768")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option("useAutomationExtension", False)
+    driver = webdriver.Chrome(options=options)
+    stealth(driver, languages=["en-US", "en"], platform="Linux")
+    return driver
+
+
+def _process_tree_rss_mb(root_pid):
+    """
+    Return the resident memory of a process and all of its descendants.
+
+    Reads /proc directly, so it only works on Linux. Returns 0 elsewhere.
+
+    Args:
+        root_pid (int): PID of the root process (the chromedriver service)
+
+    Returns:
+        float: Resident set size in megabytes
+    """
+    children = {}
+    rss_pages = {}
+    try:
+        pids = [int(entry) for entry in os.listdir("/proc") if entry.isdigit()]
+    except OSError:
+        return 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", "r") as file:
+                # The command name may contain spaces; fields start after ")"
+                fields = file.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        children.setdefault(int(fields[1]), []).append(pid)
+        rss_pages[pid] = int(fields[21])
+
+    total_pages = 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        total_pages += rss_pages.get(pid, 0)
+        pending.extend(children.get(pid, []))
+    return total_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class _PooledBrowser:
+    """
+    A launched browser and the number of logins it has served.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.logins = 0
+
+    def memory_mb(self):
+        process = getattr(self.driver.service, "process", None)
+        if process is None:
+            return 0
+        return _process_tree_rss_mb(process.pid)
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            print(format_exc())
+
+
+class BrowserPool:
+    """
+    Bounded pool of warm headless browsers used for LinkedIn logins.
+
+    At most `size` browsers exist per process. Login jobs that find every browser
+    busy wait in line for up to `acquire_timeout` seconds instead of launching
+    another Chrome. A browser is quit and replaced after `max_logins` logins, once
+    its process tree uses more than `max_memory_mb`, or when a login fails on it.
+
+    Attributes:
+        size (int): Maximum number of browsers in this process
+        max_logins (int): Logins served before a browser is recycled
+        max_memory_mb (int): Memory threshold in megabytes before a browser is recycled
+        acquire_timeout (int): Seconds a login job waits for a free browser
+    """
+
+    def __init__(
+            self,
+            size=settings.BROWSER_POOL_SIZE,
+            max_logins=settings.BROWSER_MAX_LOGINS,
+            max_memory_mb=settings.BROWSER_MAX_MEMORY_MB,
+            acquire_timeout=settings.BROWSER_ACQUIRE_TIMEOUT,
+            launcher=launch_browser,
+    ):
+        self.size = size
+        self.max_logins = max_logins
+        self.max_memory_mb = max_memory_mb
+        self.acquire_timeout = acquire_timeout
+        self._launcher = launcher
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def warm(self):
+        """
+        Launch browsers in the background until the pool is full.
+        """
+        def _warm():
+            with self._lock:
+                missing = self.size - len(self._idle)
+            for _ in range(missing):
+                if not self._slots.acquire(blocking=False):
+                    break
+                try:
+                    pooled = _PooledBrowser(self._launcher())
+                    with self._lock:
+                        self._idle.append(pooled)
+                    browsers_gauge.inc(state="idle")
+                except Exception:
+                    print(format_exc())
+                finally:
+                    self._slots.release()
+
+        threading.Thread(target=_warm, name="browser-pool-warm", daemon=True).start()
+
+    @contextmanager
+    def browser(self):
+        """
+        Borrow a browser for a single login.
+
+        Yields:
+            webdriver.Chrome: A browser with no LinkedIn cookies set
+
+        Raises:
+            BrowserPoolTimeoutException: If no browser frees up within `acquire_timeout`
+        """
+        queued_at = time.monotonic()
+        login_queue_depth.inc()
+        try:
+            acquired = self._slots.acquire(timeout=self.acquire_timeout)
+        finally:
+            login_queue_depth.dec()
+        login_queue_wait.observe(time.monotonic() - queued_at)
+        if not acquired:
+            raise BrowserPoolTimeoutException("Timed out waiting for a free browser")
+
+        try:
+            pooled = self._checkout()
+            started_at = time.monotonic()
+            try:
+                yield pooled.driver
+            except BaseException:
+                self._discard(pooled, reason="error")
+                raise
+            finally:
+                login_latency.observe(time.monotonic() - started_at)
+            self._checkin(pooled)
+        finally:
+            self._slots.release()
+
+    def _checkout(self):
+        with self._lock:
+            pooled = self._idle.pop() if self._idle else None
+        if pooled is None:
+            pooled = _PooledBrowser(self._launcher())
+        else:
+            browsers_gauge.dec(state="idle")
+        browsers_gauge.inc(state="in_use")
+        return pooled
+
+    def _checkin(self, pooled):
+        browsers_gauge.dec(state="in_use")
+        pooled.logins += 1
+        if pooled.logins >= self.max_logins:
+            self._recycle(pooled, reason="max_logins")
+        elif self.max_memory_mb and pooled.memory_mb() > self.max_memory_mb:
+            self._recycle(pooled, reason="memory")
+        elif not self._reset(pooled):
+            self._recycle(pooled, reason="error")
+        else:
+            with self._lock:
+                self._idle.append(pooled)
+            browsers_gauge.inc(state="idle")
+
+    def _discard(self, pooled, reason):
+        browsers_gauge.dec(state="in_use")
+        self._recycle(pooled, reason)
+
+    def _recycle(self, pooled, reason):
+        browsers_recycled.inc(reason=reason)
+        pooled.quit()
+
+    def _reset(self, pooled):
+        """
+        Clear all session state so the next login starts logged out.
+        """
+        try:
+            pooled.driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            pooled.driver.execute_cdp_cmd("Storage.clearDataForOrigin", {
+                "origin": settings.LINKEDIN_BASE_URL,
+                "storageTypes": "all",
+            })
+            pooled.driver.get("about:blank")
+            return True
+        except Exception:
+            print(format_exc())
+            return False
+
+    def shutdown(self):
+        """
+        Quit every idle browser. Intended for worker shutdown hooks.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            browsers_gauge.dec(state="idle")
+            pooled.quit()
+
+
+browser_pool = BrowserPool()
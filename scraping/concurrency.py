@@ -0,0 +1,275 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import settings
+from metrics import registry
+from request_exceptions import RateLimitedException
+
+concurrency_limit = registry.gauge(
+    "concurrency_limit",
+    "Current adaptive concurrency limit of the process-wide limiter",
+)
+# One series per account would grow with the number of accounts
+concurrency_account_limit = registry.gauge(
+    "concurrency_account_limit",
+    "Lowest and highest adaptive concurrency limit of the account limiters, labelled by stat (min/max)",
+)
+# Account limiters share the "account" series, so the label set stays bounded
+concurrency_in_flight = registry.gauge(
+    "concurrency_in_flight",
+    "Profile scrapes holding a concurrency slot, labelled by scope (process/account)",
+)
+concurrency_waiting = registry.gauge(
+    "concurrency_waiting",
+    "Profile scrapes waiting for a concurrency slot, labelled by scope (process/account)",
+)
+
+# Limiters governing the upstream requests of the current task. Request.fetch
+# reports rate-limited responses to them as soon as they happen, before any
+# retry layer swallows the error.
+current_limiters = contextvars.ContextVar("current_limiters", default=())
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter shared by every event loop of the process.
+
+    The limit grows by one slot per window of successful calls (additive
+    increase) and is multiplied by `backoff_factor` when LinkedIn answers with
+    429/999 or when the p95 latency of recent calls rises above
+    `latency_tolerance` times the baseline latency (multiplicative decrease).
+    At most one decrease happens per window of calls, so a burst of throttled
+    responses does not collapse the limit to the minimum at once.
+
+    Attributes:
+        name (str): "process" or "account:<key>"; the part before the colon labels metrics
+        limit (float): Current concurrency limit
+        min_limit (int): Lower bound of the limit
+        max_limit (int): Upper bound of the limit
+    """
+
+    def __init__(
+            self,
+            name,
+            initial_limit=settings.CONCURRENCY_INITIAL,
+            min_limit=settings.CONCURRENCY_MIN,
+            max_limit=settings.CONCURRENCY_MAX,
+            backoff_factor=settings.CONCURRENCY_BACKOFF_FACTOR,
+            latency_tolerance=settings.CONCURRENCY_LATENCY_TOLERANCE,
+            window=20,
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.backoff_factor = backoff_factor
+        self.latency_tolerance = latency_tolerance
+        self._latencies = deque(maxlen=window)
+        self._baseline = None
+        self._calls_since_decrease = window
+        self._in_flight = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self._labels = {"scope": name.split(":", 1)[0]}
+        self._report_limit()
+
+    async def acquire(self):
+        """
+        Wait for a free slot.
+        """
+        with self._lock:
+            if self._in_flight < int(self.limit) and not self._waiters:
+                self._take_slot()
+                return
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+            concurrency_waiting.inc(**self._labels)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+                    concurrency_waiting.dec(**self._labels)
+                    raise
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before the cancellation
+                self.release()
+            raise
+
+    def release(self):
+        """
+        Return a slot and hand it to the next waiter, if any.
+        """
+        with self._lock:
+            self._in_flight -= 1
+            concurrency_in_flight.dec(**self._labels)
+            self._wake_waiters()
+
+    def _take_slot(self):
+        self._in_flight += 1
+        concurrency_in_flight.inc(**self._labels)
+
+    def _wake_waiters(self):
+        while self._waiters and self._in_flight < int(self.limit):
+            loop, future = self._waiters.popleft()
+            concurrency_waiting.dec(**self._labels)
+            self._take_slot()
+            try:
+                loop.call_soon_threadsafe(self._grant, future)
+            except RuntimeError:
+                # The waiter's loop is closed
+                self._in_flight -= 1
+                concurrency_in_flight.dec(**self._labels)
+
+    def _grant(self, future):
+        if future.done():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def on_success(self, latency):
+        """
+        Record a successful call and adapt the limit.
+
+        Args:
+            latency (float): Duration of the call in seconds
+        """
+        with self._lock:
+            self._latencies.append(latency)
+            self._calls_since_decrease += 1
+            if len(self._latencies) < self._latencies.maxlen:
+                self._baseline = min(self._baseline or latency, latency)
+                self._increase()
+                return
+            latencies = sorted(self._latencies)
+            p50 = latencies[len(latencies) // 2]
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            if self._baseline is None or p50 < self._baseline:
+                self._baseline = p50
+            else:
+                # Let the baseline drift slowly so it follows genuine changes
+                self._baseline = 0.95 * self._baseline + 0.05 * p50
+            if p95 > self._baseline * self.latency_tolerance:
+                self._decrease()
+            else:
+                self._increase()
+
+    def on_rate_limited(self):
+        """
+        Record a throttled response (HTTP 429/999) and back off.
+        """
+        with self._lock:
+            self._decrease()
+
+    def on_error(self):
+        """
+        Record a failed call. Errors do not grow the limit.
+        """
+        with self._lock:
+            self._calls_since_decrease += 1
+
+    def _increase(self):
+        if self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._report_limit()
+            self._wake_waiters()
+
+    def _decrease(self):
+        if self._calls_since_decrease < self._latencies.maxlen:
+            return
+        self._calls_since_decrease = 0
+        self._latencies.clear()
+        self.limit = max(self.min_limit, self.limit * self.backoff_factor)
+        self._report_limit()
+
+    def _report_limit(self):
+        if self.name == self._labels["scope"]:
+            concurrency_limit.set(self.limit, **self._labels)
+        else:
+            _report_account_limits(self)
+
+
+process_limiter = AdaptiveLimiter(
+    "process",
+    initial_limit=settings.CONCURRENCY_PROCESS_MAX,
+    max_limit=settings.CONCURRENCY_PROCESS_MAX,
+)
+_account_limiters = {}
+_account_limiters_lock = threading.Lock()
+
+
+def get_account_limiter(account):
+    """
+    Return the limiter of an account, creating it on first use.
+
+    Args:
+        account (str): Opaque account key
+
+    Returns:
+        AdaptiveLimiter: The account's limiter
+    """
+    with _account_limiters_lock:
+        if account not in _account_limiters:
+            _account_limiters[account] = AdaptiveLimiter(f"account:{account[:12]}")
+        return _account_limiters[account]
+
+
+def _report_account_limits(limiter):
+    # `limiter` may not be registered yet while it is being created
+    limits = [account_limiter.limit for account_limiter in list(_account_limiters.values())]
+    limits.append(limiter.limit)
+    concurrency_account_limit.set(min(limits), stat="min")
+    concurrency_account_limit.set(max(limits), stat="max")
+
+
+def report_rate_limited():
+    """
+    Tell the limiters of the current task that LinkedIn throttled a request.
+    """
+    for limiter in current_limiters.get():
+        limiter.on_rate_limited()
+
+
+@asynccontextmanager
+async def limited(account):
+    """
+    Hold a slot of both the account's and the process-wide limiter.
+
+    The time spent inside the block and its outcome feed back into both limiters,
+    so the block should only hold upstream work: a call answered from a cache
+    would be taken for a fast response from LinkedIn.
+
+    Args:
+        account (str): Opaque account key
+    """
+    limiters = (get_account_limiter(account), process_limiter)
+    acquired = []
+    try:
+        for limiter in limiters:
+            await limiter.acquire()
+            acquired.append(limiter)
+        token = current_limiters.set(limiters)
+        started_at = time.monotonic()
+        try:
+            yield
+        except RateLimitedException:
+            raise
+        except Exception:
+            for limiter in limiters:
+                limiter.on_error()
+            raise
+        else:
+            latency = time.monotonic() - started_at
+            for limiter in limiters:
+                limiter.on_success(latency)
+        finally:
+            current_limiters.reset(token)
+    finally:
+        for limiter in acquired:
+            limiter.release()
@@ -1,37 +1,186 @@
 import asyncio
+import base64
+import hashlib
+import hmac
+import json
+from contextlib import aclosing, suppress
 from copy import deepcopy
 
-from tenacity import retry, stop_after_attempt, wait_fixed
-from traceback import format_exc
+from traceback import format_exc, format_exception
+
+import settings
+from metrics import timed_stage
+from request_exceptions import (DeadlineExceededException, InvalidResponseException,
+                                SessionExpiredException)
 from scraping.login_page import LoginPage
-from scraping.data_parser import DataParser
+from scraping.data_parser import iter_connections_profile_ids
+from scraping.listing_cache import listing_cache
 from scraping.profile_page import LinkedinProfileData
 from scraping.requests import Request
 from scraping.utils import (decode_pagination_id,
                                         encode_pagination_id, get_headers)
 
+# Connections returned by a listing request
+LISTING_PAGE_SIZE = 40
+
+# Upper bound of `prefetch_depth`: every prefetched page is a parallel listing
+# request of the same account
+MAX_PREFETCH_DEPTH = 4
+
+# Marks a pagination_id that resumes a partially scraped page
+RESUME_CURSOR_PREFIX = "r."
+
+
+def _sign_resume_cursor(payload, key):
+    digest = hmac.new(key.encode("utf-8"), payload.encode("ascii"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:16]).decode("ascii").rstrip("=")
+
+
+def encode_resume_cursor(page_number, profile_ids, key, attempt=0):
+    """
+    Encode a cursor that resumes a partially scraped listing page.
+    
+    The cursor is signed with `key`, so a client can only resume the profile
+    IDs the API listed for that page.
+    
+    Args:
+        page_number (int): Listing page the profiles belong to.
+        profile_ids (list): Profile IDs of the page still to scrape.
+        key (str): Secret of the account, its `account_key()`.
+        attempt (int, optional): Retries of the page's failed profiles so far. Defaults to 0.
+
+    Returns:
+        str: pagination_id scraping only `profile_ids`, then continuing with the next page.
+    """
+    payload = json.dumps({"page": page_number, "ids": profile_ids, "attempt": attempt}, separators=(",", ":"))
+    payload = base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+    return f"{RESUME_CURSOR_PREFIX}{payload}.{_sign_resume_cursor(payload, key)}"
+
+
+def decode_resume_cursor(pagination_id, key):
+    """
+    Decode a cursor made by `encode_resume_cursor`.
+    
+    Args:
+        pagination_id (str): pagination_id sent by the client.
+        key (str): Secret of the account the cursor was encoded for.
+
+    Returns:
+        tuple: (page_number, profile IDs, attempt), or None for a regular pagination_id.
+
+    Raises:
+        ValueError: If the cursor is malformed, was not issued for this account or
+                    holds more than a listing page of profile IDs.
+    """
+    if not pagination_id.startswith(RESUME_CURSOR_PREFIX):
+        return None
+    payload, _, signature = pagination_id[len(RESUME_CURSOR_PREFIX):].partition(".")
+    if not hmac.compare_digest(signature, _sign_resume_cursor(payload, key)):
+        raise ValueError("Invalid pagination_id: bad signature")
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(payload))
+        page_number, profile_ids = int(payload["page"]), list(payload["ids"])
+        attempt = int(payload.get("attempt", 0))
+    except (ValueError, TypeError, KeyError, AttributeError) as error:
+        raise ValueError(f"Invalid pagination_id: {error}") from None
+    if not all(isinstance(profile_id, str) for profile_id in profile_ids):
+        raise ValueError("Invalid pagination_id: profile IDs must be strings")
+    if not 0 < len(profile_ids) <= LISTING_PAGE_SIZE:
+        raise ValueError(f"Invalid pagination_id: expected 1 to {LISTING_PAGE_SIZE} profile IDs")
+    return page_number, profile_ids, attempt
+
+
+# Prefetch tasks still running after their call returned, referenced until they finish
+_background_prefetches = set()
+
+
+def _prefetch_done(task, timer=None):
+    _background_prefetches.discard(task)
+    if timer is not None:
+        timer.cancel()
+    if not task.cancelled() and task.exception() is not None:
+        print("".join(format_exception(task.exception())))
+
 
 class LinkedinConnectionsData:
-    def __init__(self, email, password, pagination_id=None):
+    def __init__(
+            self,
+            email,
+            password,
+            pagination_id=None,
+            prefetch_depth=settings.LISTING_PIPELINE_DEPTH,
+            fields=None,
+            user_session=None
+    ):
         """
         Initializes the LinkedinConnectionsData class.
         
         Args:
             email (str): LinkedIn account email.
             password (str): LinkedIn account password.
-            pagination_id (str, optional): Encoded pagination ID for fetching paginated results. Defaults to None.
+            pagination_id (str, optional): Encoded pagination ID for fetching paginated results, or a
+                                           resume cursor of a partially scraped page.
+                                           Defaults to None.
+            prefetch_depth (int, optional): Number of listing pages fetched ahead of the page being
+                                            scraped, clamped to 0..`MAX_PREFETCH_DEPTH`. 0 disables
+                                            prefetching. Defaults to the `LISTING_PIPELINE_DEPTH`
+                                            setting.
+            fields (frozenset, optional): Keys of the scraped profiles, as returned by
+                                          `data_parser.parse_fields`. Defaults to None
+                                          (every key).
+            user_session (LoginPage, optional): Resolved session of the same account. Without it
+                                                the cookies are loaded here, which blocks; async
+                                                code should use `create`.
+
+        Raises:
+            ValueError: If `pagination_id` is malformed or is a resume cursor of another account.
         """
         self.user_email = email
         self.user_password = password
         self.user_pagination_id = pagination_id
-        self.user_session = LoginPage(email=self.user_email, password=self.user_password)
-        self.cookies = self.user_session.get_cookie()
-        self.request = Request()
+        self.prefetch_depth = min(max(prefetch_depth, 0), MAX_PREFETCH_DEPTH)
+        self.fields = fields
+        self.user_session = user_session or LoginPage(email=self.user_email, password=self.user_password)
+        if self.user_session.cookies is None:
+            self.user_session.cookies = self.user_session.get_cookie()
+        self.request = Request(account=self.user_session.account_key())
+        self.page_number, self.resume_ids, self.attempt = self._read_pagination_id()
+
+    @classmethod
+    async def create(cls, email, password, **kwargs):
+        """
+        Creates the scraper without blocking the event loop.
+        
+        The cookies are loaded (logging in if needed) in the login executor. The
+        profile scrapers it creates share the resolved session.
+        
+        Args:
+            email (str): LinkedIn account email.
+            password (str): LinkedIn account password.
+            **kwargs: Other arguments of the constructor.
+
+        Returns:
+            LinkedinConnectionsData: Scraper with a resolved session.
+        """
+        user_session = kwargs.pop("user_session", None) or LoginPage(email=email, password=password)
+        await user_session.resolve()
+        return cls(email, password, user_session=user_session, **kwargs)
+
+    @property
+    def cookies(self):
+        return self.user_session.cookies
+
+    @cookies.setter
+    def cookies(self, cookies):
+        self.user_session.cookies = cookies
 
-    @retry(stop=stop_after_attempt(5), wait=wait_fixed(10))
     async def fetch(self, url, params=None, headers=None, cookies=None, method="GET", data=None):
         """
-        Sends an HTTP request using the provided parameters with retry mechanism.
+        Sends an HTTP request, renewing the session if LinkedIn rejects it.
+        
+        Transient failures are retried inside request.fetch within its retry budget.
+        A rejected session (401/403) is renewed (logging in again if needed) and the
+        request is sent once more with the new cookies.
         
         Args:
             url (str): The target URL.
@@ -42,10 +191,14 @@ class LinkedinConnectionsData:
             data (dict, optional): Data payload for POST requests. Defaults to None.
 
         Returns:
-            Response object or None if an error occurs.
+            Response object.
+
+        Raises:
+            SessionExpiredException: If LinkedIn also rejects the renewed session.
+            RequestFailedException: If the request fails after its retry budget is spent.
         """
         try:
-            response = await self.request.fetch(
+            return await self.request.fetch(
                 url=url, 
                 params=params, 
                 headers=headers, 
@@ -53,97 +206,353 @@ class LinkedinConnectionsData:
                 method=method,
                 data=data
             )
-            return response
-        except Exception as error:
-            error = format_exc()
-            print(error)
+        except SessionExpiredException:
+            await self.user_session.refresh_cookie(cookies)
+
+        if headers and "csrf-token" in headers:
+            headers = dict(headers)
+            headers["csrf-token"] = self.cookies.get("JSESSIONID", "").replace('"', "").strip()
+        return await self.request.fetch(
+            url=url,
+            params=params,
+            headers=headers,
+            cookies=self.cookies,
+            method=method,
+            data=data
+        )
 
-    @retry(stop=stop_after_attempt(5), wait=wait_fixed(10))
     async def _get_listing_data(self, page_number):
         """
         Fetches LinkedIn connections data for a given page number.
         
+        Pages prefetched by an earlier call for the same account are served from
+        the listing cache.
+        
         Args:
             page_number (int): The page number to fetch connections from.
 
         Returns:
-            list: List of LinkedIn profile IDs of the connections.
+            list: List of LinkedIn profile IDs of the connections, or None if the
+                  listing cannot be parsed.
+
+        Raises:
+            RequestFailedException: If the listing request fails
+        """
+        account = self.user_session.account_key()
+        connections_profile_ids = listing_cache.get(account, page_number)
+        if connections_profile_ids is None:
+            connections_profile_ids = await self._fetch_listing_data(page_number)
+            if connections_profile_ids is not None:
+                listing_cache.set(account, page_number, connections_profile_ids)
+        return connections_profile_ids
+
+    async def _get_page_profile_ids(self, page_number):
+        """
+        Fetches the profile IDs of the listing page a call scrapes.
+        
+        Args:
+            page_number (int): The page number to fetch connections from.
+
+        Returns:
+            list: List of LinkedIn profile IDs of the connections, empty past the last
+                  page, or None if the deadline of the call passed first.
+
+        Raises:
+            InvalidResponseException: If the listing cannot be parsed
+            RequestFailedException: If the listing request fails
         """
         try:
-            api_url = "https://www.linkedin.com/voyager/api/relationships/dash/connections"
-            headers = deepcopy(get_headers(header_type="profile_page"))
-            headers["csrf-token"] = self.cookies["JSESSIONID"].replace('"', "").strip()
-            start = 40 * page_number
-            params = {
-                "decorationId": "com.linkedin.voyager.dash.deco.web.mynetwork.ConnectionListWithProfile-16",
-                "count": "40",
-                "q": "search",
-                "sortType": "RECENTLY_ADDED",
-                "start": str(start),
-            }
+            connections_profile_ids = await self._get_listing_data(page_number=page_number)
+        except DeadlineExceededException:
+            return None
+        if connections_profile_ids is None:
+            raise InvalidResponseException(f"Connections listing page {page_number} could not be parsed")
+        return connections_profile_ids
+
+    async def _fetch_listing_data(self, page_number):
+        """
+        Requests the connections listing page from the Voyager API.
+        
+        Args:
+            page_number (int): The page number to fetch connections from.
+
+        Returns:
+            list: List of LinkedIn profile IDs of the connections, or None if the
+                  response cannot be parsed.
+
+        Raises:
+            RequestFailedException: If the request fails after its retry budget is spent,
+                                    the session cannot be refreshed or the deadline passes
+        """
+        api_url = f"{settings.LINKEDIN_BASE_URL}/voyager/api/relationships/dash/connections"
+        headers = deepcopy(get_headers(header_type="profile_page"))
+        headers["csrf-token"] = self.cookies["JSESSIONID"].replace('"', "").strip()
+        start = LISTING_PAGE_SIZE * page_number
+        params = {
+            "decorationId": "com.linkedin.voyager.dash.deco.web.mynetwork.ConnectionListWithProfile-16",
+            "count": str(LISTING_PAGE_SIZE),
+            "q": "search",
+            "sortType": "RECENTLY_ADDED",
+            "start": str(start),
+        }
+        with timed_stage("listing"):
             response = await self.fetch(
                 url=api_url, params=params, headers=headers, cookies=self.cookies
             )
 
-            parser = DataParser(response)
-            connections_profile_ids = parser.get_connections_profile_ids()
-            return connections_profile_ids
-        except Exception as error:
-            error = format_exc()
-            print(error)
+        # Only the profile IDs are read; the profile decoration is skipped
+        try:
+            with timed_stage("parse"):
+                return list(iter_connections_profile_ids(response.content))
+        except (ValueError, AttributeError):
+            print(format_exc())
+            return None
+
+    def _read_pagination_id(self):
+        """
+        Decodes the pagination ID the scraper was created with.
+        
+        Returns:
+            tuple: (page_number, profile IDs to resume, attempt), where the profile IDs
+                   are None unless the pagination ID is a resume cursor.
+
+        Raises:
+            ValueError: If the pagination ID is malformed or is a resume cursor of
+                        another account.
+        """
+        if not self.user_pagination_id:
+            return 0, None, 0
+        resume = decode_resume_cursor(self.user_pagination_id, self.user_session.account_key())
+        if resume is not None:
+            return resume
+        return decode_pagination_id(self.user_pagination_id), None, 0
+
+    def _next_pagination_id(self, page_number, results, attempt=0):
+        """
+        Builds the pagination ID of the call after a page.
+        
+        Profiles cut off by the deadline are always resumed. Failed profiles are
+        retried until they have failed `PROFILE_RETRY_ATTEMPTS` times, after which
+        the page is left behind without them.
+        
+        Args:
+            page_number (int): The page just scraped.
+            results (list): `ProfileResult` of every profile scraped by the call.
+            attempt (int, optional): Retries of the page's failed profiles so far. Defaults to 0.
+
+        Returns:
+            str: A resume cursor of the page if profiles are left to scrape, else the next page.
+        """
+        if any(result.status == "failed" for result in results):
+            attempt += 1
+        retry_failed = attempt < settings.PROFILE_RETRY_ATTEMPTS
+        remaining_ids = [
+            result.public_id
+            for result in results
+            if result.status == "unfinished" or (result.status == "failed" and retry_failed)
+        ]
+        if remaining_ids:
+            return encode_resume_cursor(page_number, remaining_ids, self.user_session.account_key(), attempt)
+        return encode_pagination_id(page_number + 1)
 
     async def get_connections_data(self):
         """
         Fetches LinkedIn connections data including profile details.
         
+        A profile that fails does not fail the page. If the deadline of the call
+        (`scraping.deadline`) passes first, the profile scrapes still running are
+        cancelled. Either way the profiles scraped so far are returned, with
+        `complete` set to False and a `pagination_id` that resumes the page with
+        only the failed and unfinished profiles.
+        
         Returns:
-            dict: Dictionary containing profile data and next pagination ID.
+            dict: Dictionary containing profile data, the errors of failed and unfinished
+                  profiles and the next pagination ID.
+
+        Raises:
+            InvalidResponseException: If the listing page cannot be parsed
+            RequestFailedException: If the listing request fails
         """
+        page_number, attempt = self.page_number, self.attempt
+        if self.resume_ids is None:
+            connections_profile_ids = await self._get_page_profile_ids(page_number)
+            if connections_profile_ids is None:
+                # Cut off before the listing arrived: the same page is tried again
+                return {
+                    "profiles": [],
+                    "errors": [],
+                    "pagination_id": encode_pagination_id(page_number),
+                    "complete": False,
+                }
+        else:
+            connections_profile_ids = self.resume_ids
+
+        # The next listing pages are fetched while this page is scraped,
+        # so the call for the next pagination_id finds them in the cache
+        prefetch_tasks = [
+            asyncio.ensure_future(self._get_listing_data(page_number=page_number + offset))
+            for offset in range(1, self.prefetch_depth + 1)
+        ] if connections_profile_ids else []
+
         try:
-            page_number = (
-                decode_pagination_id(self.user_pagination_id)
-                if self.user_pagination_id
-                else 0
-            )
-            
-            connections_profile_ids = await self._get_listing_data(page_number=page_number)
-            profile_data = await self.scrape_profile_data(connections_profile_ids)
-            
-            next_page_number = page_number + 1
-            next_pagination_id = encode_pagination_id(next_page_number)
-            
-            connections_data = {
-                "profiles": profile_data,
-                "pagination_id": next_pagination_id,
-            }
-            return connections_data
-        except Exception as error:
-            error = format_exc()
-            print(error)
+            results = await self.scrape_profile_data(connections_profile_ids)
+        except BaseException:
+            # No call follows up on a failed one, so its pages are not needed
+            for task in prefetch_tasks:
+                task.cancel()
+            raise
+        finally:
+            self._detach_prefetch(prefetch_tasks)
+
+        connections_data = {
+            "profiles": [result.data for result in results if result.error is None],
+            "errors": [result.error_dict() for result in results if result.error is not None],
+            "pagination_id": self._next_pagination_id(page_number, results, attempt),
+        }
+        if connections_data["errors"]:
+            connections_data["complete"] = False
+        return connections_data
+
+    def _detach_prefetch(self, tasks):
+        """
+        Lets outstanding prefetch requests finish after the call has returned.
+        
+        The reply never waits on them. A prefetch still running after
+        `LISTING_PREFETCH_TIMEOUT` seconds is cancelled, and one that fails is
+        logged; either way the call that needs the page fetches it again.
+        
+        Args:
+            tasks (list): Prefetch tasks started by `get_connections_data`
+        """
+        loop = asyncio.get_running_loop()
+        for task in tasks:
+            if task.done():
+                _prefetch_done(task)
+                continue
+            _background_prefetches.add(task)
+            timer = loop.call_later(settings.LISTING_PREFETCH_TIMEOUT, task.cancel)
+            task.add_done_callback(lambda task, timer=timer: _prefetch_done(task, timer))
+
+    async def iter_listing_pages(self, page_number):
+        """
+        Pipelines listing requests ahead of the consumer.
+        
+        A background producer fetches listing pages in order and queues their
+        profile IDs in a queue bounded by `prefetch_depth`, so while the caller
+        scrapes the profiles of page N, page N+1 is already being fetched. The
+        iteration stops after the first empty page (end of connections) or
+        unparsable page; a failed listing request is raised when its page is reached.
+        
+        Args:
+            page_number (int): First page to fetch.
+
+        Yields:
+            tuple: (page_number, profile IDs), where profile IDs is an empty list
+                   past the last page and None if the listing could not be parsed.
+
+        Raises:
+            RequestFailedException: If the listing request of the next page failed
+        """
+        queue = asyncio.Queue(maxsize=max(self.prefetch_depth, 1))
+
+        async def producer():
+            next_page = page_number
+            while True:
+                try:
+                    connections_profile_ids = await self._get_listing_data(page_number=next_page)
+                except Exception as error:
+                    # Raised to the consumer once it reaches this page
+                    await queue.put((next_page, error))
+                    return
+                await queue.put((next_page, connections_profile_ids))
+                if not connections_profile_ids:
+                    return
+                next_page += 1
+
+        producer_task = asyncio.ensure_future(producer())
+        try:
+            while True:
+                page, connections_profile_ids = await queue.get()
+                if isinstance(connections_profile_ids, Exception):
+                    raise connections_profile_ids
+                yield page, connections_profile_ids
+                if not connections_profile_ids:
+                    return
+        finally:
+            producer_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await producer_task
+
+    async def iter_connections_data(self):
+        """
+        Streams LinkedIn connections data one profile at a time.
+        
+        Profiles are yielded in the order their scrapes finish, so the first one is
+        available as soon as the fastest profile is done. A profile that fails does
+        not stop the stream; its error is reported in the trailer. Failed profiles and
+        profiles cut off by the deadline of the call are left to the trailer's
+        `pagination_id`, which then resumes the page and comes with `"complete": false`.
+        
+        Yields:
+            dict: `{"type": "profile", "data": {...}}` for every scraped profile, then
+                  a single `{"type": "trailer", "pagination_id": str, "errors": list}`
+                  record, where every error is `{"public_id": str, "status": str, "error": str}`.
+        """
+        page_number, attempt = self.page_number, self.attempt
+        if self.resume_ids is None:
+            connections_profile_ids = await self._get_page_profile_ids(page_number)
+            if connections_profile_ids is None:
+                # Cut off before the listing arrived: the same page is tried again
+                yield {
+                    "type": "trailer",
+                    "pagination_id": encode_pagination_id(page_number),
+                    "errors": [],
+                    "complete": False,
+                }
+                return
+        else:
+            connections_profile_ids = self.resume_ids
+
+        scraper = LinkedinProfileData(
+            email=self.user_email, password=self.user_password, user_session=self.user_session
+        )
+        results = []
+        async with aclosing(scraper.iter_profiles_data(connections_profile_ids, fields=self.fields)) as profiles:
+            async for result in profiles:
+                results.append(result)
+                if result.error is None:
+                    yield {"type": "profile", "data": result.data}
+
+        errors = [result.error_dict() for result in results if result.error is not None]
+        trailer = {
+            "type": "trailer",
+            "pagination_id": self._next_pagination_id(page_number, results, attempt),
+            "errors": errors,
+        }
+        if errors:
+            trailer["complete"] = False
+        yield trailer
 
     async def scrape_profile_data(self, connections_profile_ids):
         """
         Scrapes profile data for a given list of LinkedIn profile IDs.
         
+        Profiles are scraped concurrently within the account's adaptive concurrency
+        limit. A profile that fails, or is cut off by the deadline, is reported in
+        its result without affecting the others.
+        
         Args:
             connections_profile_ids (list): List of LinkedIn profile IDs to scrape.
 
         Returns:
-            list: List of dictionaries containing profile data.
+            list: `ProfileResult` of every profile, in the order of `connections_profile_ids`.
         """
-        scraper = LinkedinProfileData(email=self.user_email, password=self.user_password)
-        try:
-            semaphore = asyncio.Semaphore(6)
-            
-            async def worker(profile_id):
-                async with semaphore:
-                    profile_data = await scraper.get_profile_data(public_identifier=profile_id)
-                    return profile_data
-
-            tasks = [worker(profile_id) for profile_id in connections_profile_ids]
-            all_profile_data = await asyncio.gather(*tasks)
-            return all_profile_data
-        except Exception as error:
-            error = format_exc()
-            print(error)
-            return []
\ No newline at end of file
+        scraper = LinkedinProfileData(
+            email=self.user_email, password=self.user_password, user_session=self.user_session
+        )
+        results = {}
+        with timed_stage("profiles"):
+            async with aclosing(scraper.iter_profiles_data(connections_profile_ids, fields=self.fields)) as profiles:
+                async for result in profiles:
+                    results[result.public_id] = result
+        return [results[profile_id] for profile_id in connections_profile_ids if profile_id in results]
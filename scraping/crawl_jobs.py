@@ -0,0 +1,376 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import aclosing
+from traceback import format_exc
+
+import settings
+from request_exceptions import RequestFailedException
+from scraping.connection_page import LinkedinConnectionsData
+from scraping.profile_store import profile_store
+from scraping.requests.session_pool import session_pool
+from scraping.session_cache import cookie_cache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawl_jobs (
+    id TEXT PRIMARY KEY,
+    account TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    next_page INTEGER NOT NULL DEFAULT 0,
+    profiles INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    heartbeat REAL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS crawl_profiles (
+    job_id TEXT NOT NULL,
+    public_id TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, public_id)
+);
+CREATE INDEX IF NOT EXISTS crawl_profiles_page ON crawl_profiles (job_id, page);
+"""
+
+JOB_COLUMNS = (
+    "id", "status", "next_page", "profiles", "error", "heartbeat", "created_at", "updated_at"
+)
+
+
+class CrawlJobStore:
+    """
+    SQLite-backed state of full-network crawl jobs.
+
+    There is at most one crawl job per account. A job records the next page to
+    fetch and the profiles scraped so far; both are updated in the same
+    transaction after every page, so a crawl interrupted at any point resumes
+    from the last completed page.
+
+    Attributes:
+        db_path (str): Path of the SQLite database file
+        stale_after (int): Seconds without a heartbeat after which a running job
+                           is considered abandoned
+    """
+
+    def __init__(self, db_path=settings.CRAWL_DB_PATH, stale_after=settings.CRAWL_STALE_AFTER):
+        self.db_path = db_path
+        self.stale_after = stale_after
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        with self._init_lock:
+            if not self._initialized:
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+                connection = sqlite3.connect(self.db_path, timeout=30)
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(SCHEMA)
+                connection.close()
+                self._initialized = True
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def claim(self, account, restart=False):
+        """
+        Get or create the crawl job of an account and try to take ownership of it.
+
+        A job can be claimed when it is new, interrupted (its heartbeat is stale),
+        failed, or completed and `restart` is set. Running jobs with a fresh
+        heartbeat are returned without being claimed.
+
+        Args:
+            account (str): Opaque account key
+            restart (bool, optional): Discard previous progress and crawl from the
+                                      first page. Defaults to False.
+
+        Returns:
+            tuple: (job dict, bool telling whether the caller now owns the job)
+        """
+        now = time.time()
+        worker = f"{os.getpid()}:{threading.get_ident()}"
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT * FROM crawl_jobs WHERE account = ?", (account,)
+            ).fetchone()
+
+            if row is None:
+                job_id = uuid.uuid4().hex
+                connection.execute(
+                    "INSERT INTO crawl_jobs (id, account, status, worker, heartbeat, created_at, updated_at)"
+                    " VALUES (?, ?, 'running', ?, ?, ?, ?)",
+                    (job_id, account, worker, now, now, now),
+                )
+                connection.execute("COMMIT")
+                return self.get(job_id), True
+
+            job_id = row["id"]
+            is_alive = row["status"] == "running" and now - (row["heartbeat"] or 0) < self.stale_after
+            if is_alive or (row["status"] == "completed" and not restart):
+                connection.execute("COMMIT")
+                return self._to_dict(row), False
+
+            if restart:
+                connection.execute("DELETE FROM crawl_profiles WHERE job_id = ?", (job_id,))
+                connection.execute(
+                    "UPDATE crawl_jobs SET next_page = 0, profiles = 0 WHERE id = ?", (job_id,)
+                )
+            connection.execute(
+                "UPDATE crawl_jobs SET status = 'running', worker = ?, heartbeat = ?,"
+                " error = NULL, updated_at = ? WHERE id = ?",
+                (worker, now, now, job_id),
+            )
+            connection.execute("COMMIT")
+            return self.get(job_id), True
+        except Exception:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def checkpoint(self, job_id, page_number, profiles):
+        """
+        Store the profiles of a page and advance the job past it, atomically.
+
+        Args:
+            job_id (str): Crawl job ID
+            page_number (int): Page the profiles were scraped from
+            profiles (list): List of (public_id, profile_data) tuples
+        """
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT OR REPLACE INTO crawl_profiles (job_id, public_id, page, data)"
+                " VALUES (?, ?, ?, ?)",
+                [
+                    (job_id, public_id, page_number, json.dumps(profile_data))
+                    for public_id, profile_data in profiles
+                ],
+            )
+            connection.execute(
+                "UPDATE crawl_jobs SET next_page = ?, heartbeat = ?, updated_at = ?,"
+                " profiles = (SELECT COUNT(*) FROM crawl_profiles WHERE job_id = ?)"
+                " WHERE id = ?",
+                (page_number + 1, now, now, job_id, job_id),
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def heartbeat(self, job_id):
+        """
+        Mark a running job as alive.
+
+        Args:
+            job_id (str): Crawl job ID
+        """
+        self._update(job_id, heartbeat=time.time())
+
+    def finish(self, job_id, status, error=None):
+        """
+        Record the final status of a crawl run.
+
+        Args:
+            job_id (str): Crawl job ID
+            status (str): "completed" or "failed"
+            error (str, optional): Error message of a failed run
+        """
+        self._update(job_id, status=status, error=error)
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        connection = self._connect()
+        try:
+            connection.execute(
+                f"UPDATE crawl_jobs SET {assignments} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+        finally:
+            connection.close()
+
+    def get(self, job_id):
+        """
+        Return the state of a crawl job.
+
+        Args:
+            job_id (str): Crawl job ID
+
+        Returns:
+            dict: Job state, or None if the job does not exist
+        """
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT * FROM crawl_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        finally:
+            connection.close()
+        return self._to_dict(row) if row else None
+
+    def results(self, job_id, offset=0, limit=100):
+        """
+        Return scraped profiles of a crawl job in page order.
+
+        Args:
+            job_id (str): Crawl job ID
+            offset (int, optional): Number of profiles to skip. Defaults to 0.
+            limit (int, optional): Maximum number of profiles. Defaults to 100.
+
+        Returns:
+            list: List of profile data dictionaries
+        """
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                "SELECT data FROM crawl_profiles WHERE job_id = ?"
+                " ORDER BY page, rowid LIMIT ? OFFSET ?",
+                (job_id, limit, offset),
+            ).fetchall()
+        finally:
+            connection.close()
+        return [json.loads(row["data"]) for row in rows]
+
+    def _to_dict(self, row):
+        job = {column: row[column] for column in JOB_COLUMNS}
+        if job["status"] == "running" and time.time() - (job["heartbeat"] or 0) >= self.stale_after:
+            job["status"] = "interrupted"
+        return job
+
+
+class CrawlManager:
+    """
+    Runs crawl jobs in background threads of the current worker.
+
+    Each claimed job walks every page of the account's connections on its own
+    event loop, checkpointing after each page. Credentials are only held in
+    memory; a job interrupted by a worker restart resumes from its checkpoint
+    when the crawl is started again for the same account.
+
+    Attributes:
+        store (CrawlJobStore): Job state storage
+        page_attempts (int): Attempts per page before the run is marked failed
+    """
+
+    def __init__(
+            self,
+            store=None,
+            page_attempts=settings.CRAWL_PAGE_ATTEMPTS,
+            heartbeat_interval=settings.CRAWL_HEARTBEAT_INTERVAL,
+    ):
+        self.store = store or CrawlJobStore()
+        self.page_attempts = page_attempts
+        self.heartbeat_interval = heartbeat_interval
+
+    def start(self, email, password, restart=False):
+        """
+        Start or resume the crawl of an account's connections.
+
+        Args:
+            email (str): LinkedIn account email
+            password (str): LinkedIn account password
+            restart (bool, optional): Discard previous progress. Defaults to False.
+
+        Returns:
+            dict: Job state
+        """
+        account = cookie_cache.key(email, password)
+        job, claimed = self.store.claim(account, restart=restart)
+        if claimed:
+            thread = threading.Thread(
+                target=self._run,
+                args=(job["id"], email, password, job["next_page"]),
+                name=f"crawl-{job['id']}",
+                daemon=True,
+            )
+            thread.start()
+        return job
+
+    def _run(self, job_id, email, password, page_number):
+        try:
+            asyncio.run(self._crawl(job_id, email, password, page_number))
+        except Exception as error:
+            print(format_exc())
+            self.store.finish(job_id, "failed", error=str(error))
+
+    async def _crawl(self, job_id, email, password, page_number):
+        heartbeat = asyncio.ensure_future(self._heartbeat(job_id))
+        try:
+            scraping = await LinkedinConnectionsData.create(email=email, password=password)
+            failed_attempts = 0
+            while failed_attempts < self.page_attempts:
+                # Listing pages are fetched ahead while the current page is
+                # scraped; after a failure the pipeline restarts at that page
+                try:
+                    async with aclosing(scraping.iter_listing_pages(page_number)) as pages:
+                        async for page, connections_profile_ids in pages:
+                            if connections_profile_ids is None:
+                                failed_attempts += 1
+                                break
+                            if not connections_profile_ids:
+                                self.store.finish(job_id, "completed")
+                                return
+                            profiles = await self._scrape_page(scraping, page, connections_profile_ids)
+                            if not profiles:
+                                failed_attempts += 1
+                                break
+                            self.store.checkpoint(job_id, page, profiles)
+                            page_number = page + 1
+                            failed_attempts = 0
+                except RequestFailedException:
+                    print(format_exc())
+                    failed_attempts += 1
+            self.store.finish(
+                job_id, "failed", error=f"Page {page_number} failed after {self.page_attempts} attempts"
+            )
+        finally:
+            heartbeat.cancel()
+            # This event loop ends with the run: write its buffered profiles now
+            await asyncio.get_running_loop().run_in_executor(None, profile_store.flush)
+            await session_pool.close()
+
+    async def _scrape_page(self, scraping, page_number, profile_ids):
+        """
+        Scrape the profiles of a page, retrying only the ones that failed.
+
+        A profile is tried up to `PROFILE_RETRY_ATTEMPTS` times; profiles that
+        keep failing are left out of the page.
+
+        Returns:
+            list: (public_id, profile_data) tuples of the scraped profiles, in
+                  listing order
+        """
+        scraped = {}
+        pending = profile_ids
+        for _ in range(settings.PROFILE_RETRY_ATTEMPTS):
+            results = await scraping.scrape_profile_data(pending)
+            scraped.update((result.public_id, result.data) for result in results if result.error is None)
+            pending = [result.public_id for result in results if result.error is not None]
+            if not pending:
+                break
+        if pending and scraped:
+            print(f"Skipping {len(pending)} profiles of page {page_number}: {', '.join(pending)}")
+        return [(public_id, scraped[public_id]) for public_id in profile_ids if public_id in scraped]
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await asyncio.get_running_loop().run_in_executor(None, self.store.heartbeat, job_id)
+
+
+crawl_manager = CrawlManager()
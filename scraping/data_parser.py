@@ -1,3 +1,91 @@
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+import serialization
+import settings
+from scraping.models import CONTACT_FIELDS, PROFILE_FIELDS, Education, Experience, Profile
+
+# Source key of every field of a section record, in the record's field order.
+# `_new_record(Experience, map(item.get, EXPERIENCE_SPEC))` builds a record in
+# one C-level pass over the keys, without the NamedTuple constructor.
+EXPERIENCE_SPEC = ("title", "companyName", "locationName", "timePeriod", "description")
+EDUCATION_SPEC = ("schoolName", "degreeName", "timePeriod")
+_new_record = tuple.__new__
+
+# ijson prefix of the profile IDs in a connections listing
+CONNECTIONS_PROFILE_ID_PATH = "elements.item.connectedMemberResolutionResult.publicIdentifier"
+
+
+def parse_fields(fields):
+    """
+    Normalize a requested field projection.
+    
+    Args:
+        fields (list or str): Field names, as a list or a comma separated string.
+                              None or empty selects every field.
+    
+    Returns:
+        frozenset: The requested field names, or None for every field
+    
+    Raises:
+        ValueError: If `fields` is not a string or a list of strings, or a field
+                    name is unknown
+    """
+    if not fields:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    elif not isinstance(fields, list) or not all(isinstance(field, str) for field in fields):
+        raise ValueError("fields must be a comma separated string or a list of field names")
+    fields = frozenset(field.strip() for field in fields if field and field.strip())
+    unknown = fields.difference(PROFILE_FIELDS, CONTACT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return fields or None
+
+
+def iter_connections_profile_ids(content, stream=None):
+    """
+    Extract connection public identifiers from a raw connections listing body.
+    
+    Bodies are parsed whole with `serialization.loads`, which is the fastest for
+    the usual 40 connection page. From `LISTING_STREAM_MIN_BYTES` on, and if the
+    optional `ijson` is installed, the body is scanned as a stream of JSON events
+    instead and only `elements[*].connectedMemberResolutionResult.publicIdentifier`
+    values are materialized. That costs more CPU time but keeps memory flat, as
+    the (mostly unused) profile decoration never becomes Python objects.
+    
+    Args:
+        content (bytes): JSON body of a `relationships/dash/connections` response
+        stream (bool, optional): Whether to scan the body with ijson. Defaults to
+                                 None (decided by the body size).
+    
+    Yields:
+        str: Public identifiers of the connections, in listing order
+    
+    Raises:
+        ValueError: If the body is not valid JSON
+    """
+    if stream is None:
+        stream = ijson is not None and len(content) >= settings.LISTING_STREAM_MIN_BYTES
+    if not stream:
+        json_data = serialization.loads(content)
+        for item in json_data.get("elements") or []:
+            public_id = (item.get("connectedMemberResolutionResult") or {}).get("publicIdentifier")
+            if public_id:
+                yield public_id
+        return
+
+    try:
+        for public_id in ijson.items(content, CONNECTIONS_PROFILE_ID_PATH):
+            if public_id:
+                yield public_id
+    except ijson.JSONError as error:
+        raise ValueError(f"Invalid connections listing: {error}") from error
+
+
 class DataParser:
     """
     A class to parse LinkedIn API responses and extract structured profile data.
@@ -22,13 +110,18 @@ class DataParser:
         self.json_data = response.json()
         self.page_response = response
 
-    def get_profile_data(self) -> dict:
+    def get_profile_data(self, fields=None) -> dict:
         """
         Extract and structure the main profile data from LinkedIn response.
         
         This method extracts personal information, professional details, skills,
         experience, and education from the LinkedIn profile data. It combines
-        these elements into a structured dictionary format.
+        these elements into a structured dictionary format. Sections that are not
+        requested are not built.
+        
+        Args:
+            fields (frozenset, optional): Keys to include, as returned by `parse_fields`.
+                                          Defaults to None (every key).
         
         Returns:
             dict: A dictionary containing structured profile information with the following keys:
@@ -42,132 +135,93 @@ class DataParser:
                 - experience (list): List of work experiences
                 - education (list): List of educational backgrounds
         """
-        first_name = self.json_data.get("profile", {}).get("firstName")
-        last_name = self.json_data.get("profile", {}).get("lastName")
-        public_id = self.json_data.get("profile", {}).get("miniProfile", {}).get("publicIdentifier")
-        summary = self.json_data.get("profile", {}).get("summary")
-        headline = self.json_data.get("profile", {}).get("headline")
-        industry_name = self.json_data.get("profile", {}).get("industryName")
-        location = self.json_data.get("profile", {}).get("geoLocationName")
-        skills = self._get_skills_data()
-        experience = self._get_experience_data()
-        education = self._get_education_data()
-        full_name = f"{first_name} {last_name}"
-        summary = " ".join(summary.split()).strip() if summary else None
-        return {
-            "public_id": public_id,
-            "full_name": full_name,
-            "headline": headline,
-            "summary": summary,
-            "industry_name": industry_name,
-            "location": location,
-            "skills": skills,
-            "experience": experience,
-            "education": education,
-        }
-
-    def _get_education_data(self) -> list:
-        """
-        Extract education information from LinkedIn profile data.
-        
-        This method processes the education section of a LinkedIn profile and
-        extracts relevant details into a structured format.
-        
-        Returns:
-            list: A list of dictionaries, each containing:
-                - school_name (str): Name of the educational institution
-                - degree (str): Degree or qualification obtained
-                - period (dict): Time period information for the education
-        """
-        raw_education_data = self.json_data.get("educationView", {}).get("elements")
-        if not raw_education_data:
-            return []
-
-        return [
-            {
-                "school_name": item.get("schoolName"),
-                "degree": item.get("degreeName"),
-                "period": item.get("timePeriod"),
-            }
-            for item in raw_education_data
-        ]
-
-    def _get_experience_data(self) -> list:
-        """
-        Extract work experience information from LinkedIn profile data.
-        
-        This method processes the work experience section of a LinkedIn profile
-        and extracts relevant details into a structured format.
-        
-        Returns:
-            list: A list of dictionaries, each containing:
-                - job_title (str): Title or position held
-                - company_name (str): Name of the employer
-                - location (str): Work location
-                - period (dict): Time period information for the position
-                - description (str): Job description
-        """
-        raw_experience = self.json_data.get("positionView", {}).get("elements")
-        if not raw_experience:
-            return []
-        return [
-            {
-                "job_title": item.get("title"),
-                "company_name": item.get("companyName"),
-                "location": item.get("locationName"),
-                "period": item.get("timePeriod"),
-                "description": item.get("description"),
-            }
-            for item in raw_experience
-        ]
+        return self.parse_profile(fields).to_dict()
 
-    def _get_skills_data(self) -> list:
+    def parse_profile(self, fields=None, profile=None) -> Profile:
         """
-        Extract skills information from LinkedIn profile data.
+        Extract the main profile data from LinkedIn response into a `Profile`.
         
-        This method processes the skills section of a LinkedIn profile and
-        returns a list of skill names.
+        Args:
+            fields (frozenset, optional): Keys to include, as returned by `parse_fields`.
+                                          Defaults to None (every key).
+            profile (Profile, optional): Profile to fill in, e.g. one that already holds
+                                         the contact details. Defaults to a new one.
         
         Returns:
-            list: A list of skill names (str) listed on the profile
+            Profile: Profile with the requested profile fields assigned
         """
-        raw_skills = self.json_data.get("skillView", {}).get("elements")
-        if not raw_skills:
-            return []
-        return [skill.get("name") for skill in raw_skills if skill.get("name")]
+        data = self.json_data
+        source = data.get("profile") or {}
+        if profile is None:
+            profile = Profile()
+        if fields is None or "public_id" in fields:
+            profile.public_id = (source.get("miniProfile") or {}).get("publicIdentifier")
+        if fields is None or "full_name" in fields:
+            profile.full_name = f"{source.get('firstName')} {source.get('lastName')}"
+        if fields is None or "headline" in fields:
+            profile.headline = source.get("headline")
+        if fields is None or "summary" in fields:
+            summary = source.get("summary")
+            profile.summary = " ".join(summary.split()).strip() if summary else None
+        if fields is None or "industry_name" in fields:
+            profile.industry_name = source.get("industryName")
+        if fields is None or "location" in fields:
+            profile.location = source.get("geoLocationName")
+        # Sections are only built when requested
+        if fields is None or "skills" in fields:
+            profile.skills = [
+                skill.get("name")
+                for skill in (data.get("skillView") or {}).get("elements") or ()
+                if skill.get("name")
+            ]
+        if fields is None or "experience" in fields:
+            profile.experience = [
+                _new_record(Experience, map(item.get, EXPERIENCE_SPEC))
+                for item in (data.get("positionView") or {}).get("elements") or ()
+            ]
+        if fields is None or "education" in fields:
+            profile.education = [
+                _new_record(Education, map(item.get, EDUCATION_SPEC))
+                for item in (data.get("educationView") or {}).get("elements") or ()
+            ]
+        return profile
 
-    def get_contact_details(self) -> dict:
+    def get_contact_details(self, fields=None) -> dict:
         """
         Extract contact information from LinkedIn profile data.
         
         This method retrieves email address and phone number from the profile data
         if available.
         
+        Args:
+            fields (frozenset, optional): Keys to include, as returned by `parse_fields`.
+                                          Defaults to None (every key).
+        
         Returns:
             dict: A dictionary containing:
                 - email (str): Email address from the profile
                 - phone (str): Phone number from the profile
         """
-        email = self.json_data.get("emailAddress")
-        phone = self.json_data.get("phoneNumbers", [{}])[0].get("number")
-        return {"email": email, "phone": phone}
+        return self.parse_contact_details(fields).to_dict()
 
-    def get_connections_profile_ids(self) -> list:
+    def parse_contact_details(self, fields=None, profile=None) -> Profile:
         """
-        Extract the public identifiers of a user's LinkedIn connections.
+        Extract contact information from LinkedIn profile data into a `Profile`.
         
-        This method processes the connections section of a LinkedIn response and
-        extracts the public identifiers for each connection.
+        Args:
+            fields (frozenset, optional): Keys to include, as returned by `parse_fields`.
+                                          Defaults to None (every key).
+            profile (Profile, optional): Profile to fill in, e.g. one that already holds
+                                         the profile details. Defaults to a new one.
         
         Returns:
-            list: A list of public identifiers (str) for the user's connections
+            Profile: Profile with the requested contact fields assigned
         """
-        connections_elements = self.json_data.get("elements", [])
-        if not connections_elements:
-            return []
-        profile_ids = [
-            item.get("connectedMemberResolutionResult", {}).get("publicIdentifier")
-            for item in connections_elements
-            if item.get("connectedMemberResolutionResult", {}).get("publicIdentifier")
-        ]
-        return profile_ids
\ No newline at end of file
+        if profile is None:
+            profile = Profile()
+        if fields is None or "email" in fields:
+            profile.email = self.json_data.get("emailAddress")
+        if fields is None or "phone" in fields:
+            phone_numbers = self.json_data.get("phoneNumbers") or [{}]
+            profile.phone = phone_numbers[0].get("number")
+        return profile
@@ -0,0 +1,48 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+# `time.monotonic()` by which the API call being served must answer. Tasks
+# spawned by the call inherit it, down to every upstream request.
+current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+
+@contextmanager
+def use_deadline(deadline):
+    """
+    Run the enclosed work under a deadline.
+
+    A deadline set further up the call chain is never extended, only shortened.
+
+    Args:
+        deadline (float): `time.monotonic()` value, or None for no deadline
+    """
+    outer = current_deadline.get()
+    if deadline is None or (outer is not None and outer < deadline):
+        deadline = outer
+    token = current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        current_deadline.reset(token)
+
+
+def time_left():
+    """
+    Return the seconds left before the current deadline.
+
+    Returns:
+        float: Seconds left (negative once it has passed), or None without a deadline
+    """
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def deadline_passed():
+    """
+    Return whether the current deadline has passed (False without a deadline).
+    """
+    left = time_left()
+    return left is not None and left <= 0
@@ -0,0 +1,460 @@
+import asyncio
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import suppress
+from traceback import format_exc
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    # The queue then fails on first use (see `JobQueue.check`)
+    Fernet = None
+
+    class InvalidToken(Exception):
+        pass
+
+import settings
+from metrics import registry
+from scraping.connection_page import LinkedinConnectionsData
+from scraping.data_parser import parse_fields
+from scraping.deadline import use_deadline
+from scraping.profile_page import LinkedinProfileData
+from scraping.session_cache import cookie_cache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scrape_jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    account TEXT NOT NULL,
+    status TEXT NOT NULL,
+    credentials TEXT,
+    options TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    heartbeat REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scrape_jobs_queue ON scrape_jobs (status, created_at);
+"""
+
+JOB_COLUMNS = (
+    "id", "kind", "status", "attempts", "error", "created_at", "updated_at"
+)
+JOB_KINDS = ("profile", "connections")
+
+queued_jobs = registry.counter(
+    "scrape_jobs_total",
+    "Scrape jobs, labelled by kind and by outcome (queued/completed/failed/requeued)",
+)
+job_duration = registry.histogram(
+    "scrape_job_duration_seconds",
+    "Time scraper workers spend running a job, labelled by kind",
+)
+
+
+class JobQueue:
+    """
+    SQLite-backed durable queue of scrape jobs.
+
+    The API enqueues `/profile` and `/connections` calls as jobs and scraper
+    worker processes (`scrape_worker.py`) claim them oldest first. A claimed
+    job holds a heartbeat; a job whose worker died is handed to another worker
+    until it has been attempted `max_attempts` times.
+
+    A queued job has to carry the account's credentials, as the worker may
+    have to log in. They are stored encrypted with a key derived from the
+    cookie cache salt (which requires the `cryptography` package), dropped as
+    soon as the job finishes, and the database files are only readable by
+    their owner.
+
+    The deadline of the API call is stored as an absolute time when the job
+    is queued, so the time a job waits in the queue counts against it.
+
+    Attributes:
+        db_path (str): Path of the SQLite database file
+        stale_after (int): Seconds without a heartbeat after which a running job
+                           is considered abandoned
+        max_attempts (int): Claims of a job before it is marked failed
+        result_ttl (int): Seconds finished jobs are kept
+    """
+
+    def __init__(
+            self,
+            db_path=settings.JOB_QUEUE_DB_PATH,
+            stale_after=settings.JOB_STALE_AFTER,
+            max_attempts=settings.JOB_MAX_ATTEMPTS,
+            result_ttl=settings.JOB_RESULT_TTL,
+    ):
+        self.db_path = db_path
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self._fernet = None
+
+    def _connect(self):
+        with self._init_lock:
+            if not self._initialized:
+                # The database, its directory and the -wal and -shm files are
+                # created owner-only; SQLite gives journal files created later
+                # the permissions of the database file
+                umask = os.umask(0o077)
+                try:
+                    os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+                    os.close(os.open(self.db_path, os.O_CREAT | os.O_RDWR, 0o600))
+                    os.chmod(self.db_path, 0o600)
+                    connection = sqlite3.connect(self.db_path, timeout=30)
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    connection.executescript(SCHEMA)
+                    connection.close()
+                finally:
+                    os.umask(umask)
+                self._initialized = True
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def enqueue(self, kind, email, password, options=None, deadline_at=None):
+        """
+        Add a scrape job to the queue.
+
+        Args:
+            kind (str): "profile" or "connections"
+            email (str): LinkedIn account email
+            password (str): LinkedIn account password
+            options (dict, optional): JSON serializable arguments of the scrape,
+                                      e.g. `fields` and `pagination_id`
+            deadline_at (float, optional): `time.time()` value by which the scrape
+                                           must be done. Defaults to None (no deadline).
+
+        Returns:
+            dict: Job state
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        credentials = json.dumps({"email": email, "password": password}).encode("utf-8")
+        credentials = self._get_fernet().encrypt(credentials).decode("ascii")
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        connection = self._connect()
+        try:
+            connection.execute(
+                "INSERT INTO scrape_jobs (id, kind, account, status, credentials, options, created_at, updated_at)"
+                " VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (
+                    job_id, kind, cookie_cache.key(email, password), credentials,
+                    json.dumps({**(options or {}), "deadline_at": deadline_at}), now, now,
+                ),
+            )
+        finally:
+            connection.close()
+        queued_jobs.inc(kind=kind, outcome="queued")
+        return self.get(job_id)
+
+    def claim(self, worker):
+        """
+        Take ownership of the oldest job waiting to run.
+
+        Running jobs whose heartbeat is stale are claimed again, or failed once
+        they have used up their attempts.
+
+        Args:
+            worker (str): Identifier of the claiming worker
+
+        Returns:
+            dict: The job with its `credentials` and `options`, or None if the
+                  queue is empty
+        """
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            abandoned = connection.execute(
+                "SELECT id, kind, attempts FROM scrape_jobs WHERE status = 'running' AND heartbeat < ?",
+                (now - self.stale_after,),
+            ).fetchall()
+            for row in abandoned:
+                if row["attempts"] >= self.max_attempts:
+                    connection.execute(
+                        "UPDATE scrape_jobs SET status = 'failed', credentials = NULL, updated_at = ?,"
+                        " error = ? WHERE id = ?",
+                        (now, f"Worker lost after {row['attempts']} attempts", row["id"]),
+                    )
+                    queued_jobs.inc(kind=row["kind"], outcome="failed")
+                else:
+                    connection.execute(
+                        "UPDATE scrape_jobs SET status = 'queued', updated_at = ? WHERE id = ?",
+                        (now, row["id"]),
+                    )
+                    queued_jobs.inc(kind=row["kind"], outcome="requeued")
+
+            row = connection.execute(
+                "SELECT * FROM scrape_jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            connection.execute(
+                "UPDATE scrape_jobs SET status = 'running', worker = ?, heartbeat = ?,"
+                " attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker, now, now, row["id"]),
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+        job = self._to_dict(row)
+        job["status"] = "running"
+        job["attempts"] += 1
+        job["options"] = json.loads(row["options"])
+        try:
+            job["credentials"] = json.loads(self._get_fernet().decrypt(row["credentials"].encode("ascii")))
+        except InvalidToken:
+            # Encrypted with another key, e.g. before the cookie cache salt changed
+            self.finish(job["id"], "failed", error="The credentials of the job cannot be decrypted")
+            queued_jobs.inc(kind=job["kind"], outcome="failed")
+            return None
+        return job
+
+    def heartbeat(self, job_ids):
+        """
+        Mark running jobs as alive.
+
+        Args:
+            job_ids (list): IDs of the jobs the calling worker is running
+        """
+        if not job_ids:
+            return
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.executemany(
+                "UPDATE scrape_jobs SET heartbeat = ? WHERE id = ? AND status = 'running'",
+                [(now, job_id) for job_id in job_ids],
+            )
+        finally:
+            connection.close()
+
+    def finish(self, job_id, status, result=None, error=None):
+        """
+        Record the outcome of a job and drop its credentials.
+
+        Args:
+            job_id (str): Job ID
+            status (str): "completed" or "failed"
+            result (optional): JSON serializable result of a completed job
+            error (str, optional): Error message of a failed job
+        """
+        connection = self._connect()
+        try:
+            connection.execute(
+                "UPDATE scrape_jobs SET status = ?, result = ?, error = ?, credentials = NULL,"
+                " updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+        finally:
+            connection.close()
+
+    def purge(self):
+        """
+        Delete finished jobs older than `result_ttl`.
+
+        Returns:
+            int: Number of deleted jobs
+        """
+        connection = self._connect()
+        try:
+            cursor = connection.execute(
+                "DELETE FROM scrape_jobs WHERE status IN ('completed', 'failed') AND updated_at < ?",
+                (time.time() - self.result_ttl,),
+            )
+            return cursor.rowcount
+        finally:
+            connection.close()
+
+    def get(self, job_id):
+        """
+        Return the state of a job, with its result once it is completed.
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            dict: Job state, or None if the job does not exist
+        """
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT * FROM scrape_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        job = self._to_dict(row)
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        return job
+
+    def _to_dict(self, row):
+        return {column: row[column] for column in JOB_COLUMNS}
+
+    def check(self):
+        """
+        Fail fast if the queue cannot store credentials, e.g. at startup.
+
+        Raises:
+            ImportError: If the `cryptography` package is not installed
+        """
+        self._get_fernet()
+
+    def _get_fernet(self):
+        if self._fernet is None:
+            if Fernet is None:
+                raise ImportError("The job queue requires the `cryptography` package")
+            key = cookie_cache.derive_key("job_queue_credentials")
+            self._fernet = Fernet(base64.urlsafe_b64encode(key))
+        return self._fernet
+
+
+class JobWorker:
+    """
+    Runs queued scrape jobs on the event loop of a scraper worker process.
+
+    Up to `concurrency` jobs run at a time. They share the process's pooled
+    upstream sessions, caches and concurrency limiters, like the requests of an
+    API worker do.
+
+    Attributes:
+        queue (JobQueue): Queue the jobs are claimed from
+        concurrency (int): Jobs run at the same time
+        poll_interval (float): Seconds between polls of an empty queue
+        heartbeat_interval (float): Seconds between heartbeats of running jobs
+    """
+
+    def __init__(
+            self,
+            queue=None,
+            concurrency=settings.JOB_WORKER_CONCURRENCY,
+            poll_interval=settings.JOB_POLL_INTERVAL,
+            heartbeat_interval=settings.JOB_HEARTBEAT_INTERVAL,
+    ):
+        self.queue = queue or job_queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.name = f"{os.uname().nodename}:{os.getpid()}"
+        self._running = {}
+
+    async def run(self, stop):
+        """
+        Claim and run jobs until `stop` is set, then wait for the running jobs.
+
+        Args:
+            stop (asyncio.Event): Set to stop claiming jobs
+        """
+        loop = asyncio.get_running_loop()
+        heartbeat = asyncio.ensure_future(self._heartbeat())
+        slot = asyncio.Semaphore(self.concurrency)
+        try:
+            while not stop.is_set():
+                await slot.acquire()
+                try:
+                    job = await loop.run_in_executor(None, self.queue.claim, self.name)
+                except Exception:
+                    print(format_exc())
+                    job = None
+                if job is None:
+                    slot.release()
+                    # Sleep until the next poll, or until asked to stop
+                    with suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(stop.wait(), self.poll_interval)
+                    continue
+                task = asyncio.ensure_future(self._execute(job))
+                self._running[job["id"]] = task
+                task.add_done_callback(lambda _, job_id=job["id"]: self._done(job_id, slot))
+            if self._running:
+                await asyncio.wait(list(self._running.values()))
+        finally:
+            heartbeat.cancel()
+
+    def _done(self, job_id, slot):
+        self._running.pop(job_id, None)
+        slot.release()
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await loop.run_in_executor(None, self.queue.heartbeat, list(self._running))
+                # Old results are dropped by whichever worker gets there first
+                await loop.run_in_executor(None, self.queue.purge)
+            except Exception:
+                print(format_exc())
+
+    async def _execute(self, job):
+        loop = asyncio.get_running_loop()
+        started_at = time.perf_counter()
+        try:
+            result = await self.scrape(job["kind"], job["credentials"], job["options"])
+        except Exception as exception:
+            print(format_exc())
+            status, result, error = "failed", None, str(exception)
+        else:
+            status, error = "completed", None
+            if result is None:
+                status, error = "failed", "Scrape failed"
+        job_duration.observe(time.perf_counter() - started_at, kind=job["kind"])
+        queued_jobs.inc(kind=job["kind"], outcome=status)
+        try:
+            await loop.run_in_executor(
+                None, lambda: self.queue.finish(job["id"], status, result=result, error=error)
+            )
+        except Exception:
+            # The job is claimed again once its heartbeat is stale
+            print(format_exc())
+
+    async def scrape(self, kind, credentials, options):
+        """
+        Run the scrape of a job, as the matching API route would.
+
+        Args:
+            kind (str): "profile" or "connections"
+            credentials (dict): `email` and `password` of the account
+            options (dict): `fields`, `pagination_id` and `deadline_at` of the API call
+
+        Returns:
+            dict: The profile data, or the connections data of the page
+        """
+        deadline_at = options.get("deadline_at")
+        # Counted from the arrival of the API call, not from the claim of the job
+        deadline = time.monotonic() + deadline_at - time.time() if deadline_at else None
+        fields = parse_fields(options.get("fields"))
+        with use_deadline(deadline):
+            if kind == "profile":
+                scraping = await LinkedinProfileData.create(credentials["email"], credentials["password"])
+                return await scraping.get_profile_data(fields=fields)
+            scraping = await LinkedinConnectionsData.create(
+                email=credentials["email"],
+                password=credentials["password"],
+                pagination_id=options.get("pagination_id"),
+                fields=fields,
+            )
+            return await scraping.get_connections_data()
+
+
+job_queue = JobQueue()
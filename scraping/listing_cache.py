@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict
+
+import settings
+from metrics import registry
+
+listing_cache_lookups = registry.counter(
+    "listing_cache_lookups_total",
+    "Connections listing cache lookups, labelled by result (hit/miss)",
+)
+
+
+class ListingCache:
+    """
+    Short-lived cache of connections listing pages.
+
+    Holds the profile IDs of prefetched listing pages, keyed by account and page
+    number, so the call for the next `pagination_id` does not wait for the listing
+    request again. The TTL is kept short because new connections shift every page
+    of the RECENTLY_ADDED ordering.
+
+    Attributes:
+        ttl (int): Seconds a listing page is considered fresh
+        max_entries (int): Maximum number of pages held in memory
+    """
+
+    def __init__(self, ttl=settings.LISTING_CACHE_TTL, max_entries=settings.LISTING_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, account, page_number):
+        """
+        Return the cached profile IDs of a listing page.
+
+        Args:
+            account (str): Opaque account key
+            page_number (int): Listing page number
+
+        Returns:
+            list: Profile IDs, or None on a cache miss
+        """
+        key = (account, page_number)
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None and time.time() - entry[0] < self.ttl:
+                self._pages.move_to_end(key)
+                listing_cache_lookups.inc(result="hit")
+                return entry[1]
+            self._pages.pop(key, None)
+        listing_cache_lookups.inc(result="miss")
+        return None
+
+    def set(self, account, page_number, profile_ids):
+        """
+        Cache the profile IDs of a listing page.
+
+        Args:
+            account (str): Opaque account key
+            page_number (int): Listing page number
+            profile_ids (list): Profile IDs on the page
+        """
+        if not self.ttl:
+            return
+        key = (account, page_number)
+        with self._lock:
+            self._pages[key] = (time.time(), profile_ids)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+
+
+listing_cache = ListingCache()
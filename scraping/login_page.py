@@ -1,11 +1,41 @@
-import os
-import json
-from base64 import b64encode
-from selenium import webdriver
+import asyncio
+import contextvars
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
-from selenium_stealth import stealth
+
+from metrics import registry, timed_stage
+from request_exceptions import BrowserPoolTimeoutException, LoginFailedException
+from scraping.browser_pool import browser_pool
+from scraping.session_cache import cookie_cache
+from scraping.validation import validate_session
+import settings
+
+# Selenium logins block for a long time, so they run in their own bounded pool
+# instead of on the event loop or in the shared default executor
+login_executor = ThreadPoolExecutor(
+    max_workers=settings.LOGIN_EXECUTOR_WORKERS,
+    thread_name_prefix="login"
+)
+login_executor_jobs = registry.gauge(
+    "login_executor_jobs",
+    "Logins submitted to the login executor and not finished yet",
+)
+
+# Cookie lookups and refreshes in flight on each event loop, by (kind, account key).
+# Crawl jobs run their own event loop in a thread, hence one table per loop.
+_pending_cookie_tasks = weakref.WeakKeyDictionary()
+
+
+def _cookie_task_done(pending, key, task):
+    pending.pop(key, None)
+    # Every caller may have been cancelled, leaving nobody to retrieve the error
+    if not task.cancelled():
+        task.exception()
+
 
 class LoginPage:
     """
@@ -14,9 +44,13 @@ class LoginPage:
     This class provides methods to authenticate with LinkedIn using Selenium WebDriver,
     retrieve authentication cookies, and manage cookie caching for subsequent use.
     
+    A resolved instance can be shared by several scrapers of the same account,
+    so they use (and renew) one session instead of each loading the cookies.
+    
     Attributes:
         user_email_id (str): LinkedIn account email address
         user_password (str): LinkedIn account password
+        cookies (dict): Resolved session cookies, None until `resolve` is awaited
     """
     
     def __init__(self, email, password):
@@ -29,66 +63,146 @@ class LoginPage:
         """
         self.user_email_id = email
         self.user_password = password
+        self.cookies = None
         
     def get_cookie(self):
         """
         Retrieve LinkedIn authentication cookies.
         
-        This method first checks for cached cookies associated with the user credentials.
-        If valid cached cookies exist, they are returned. Otherwise, it launches a browser
-        session to authenticate with LinkedIn and obtain fresh cookies.
+        This method first checks the cookie cache (in memory, then on disk) for
+        fresh cookies associated with the user credentials. If valid cached cookies
+        exist, they are returned. Otherwise, it borrows a headless browser from the
+        browser pool to authenticate with LinkedIn and obtain fresh cookies.
+        
+        Logins are single-flight per account: while one thread or worker process
+        logs in, other callers with the same credentials wait and then reuse the
+        cookies it cached, so an account never costs more than one browser launch.
+        A login that fails is reported to the callers that waited on it, and to
+        later ones for `LOGIN_FAILURE_TTL` seconds, without logging in again.
         
         Returns:
             dict: A dictionary of cookie name-value pairs for LinkedIn authentication
+            
+        Raises:
+            LoginFailedException: If the login, or a recent one, did not produce a
+                                  usable session (e.g. it stopped at a checkpoint)
         """
-        # Try to load cached cookies
-        credential_id = self._encrypt_credential()
-        cache_dir = os.path.join(os.path.dirname(__file__), ".user")
+        with timed_stage("cookie_cache"):
+            cookies = cookie_cache.get(self.user_email_id, self.user_password)
+        if cookies is not None:
+            return cookies
         
-        # Create cache directory if it doesn't exist
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
-            
-        cache_file = os.path.join(cache_dir, f"{credential_id}.json")
+        with cookie_cache.login_lock(self.user_email_id, self.user_password):
+            # Another caller may have logged in, or failed to, while we were waiting
+            cookies = cookie_cache.get(self.user_email_id, self.user_password)
+            if cookies is not None:
+                return cookies
+            failure = cookie_cache.get_login_failure(self.user_email_id, self.user_password)
+            if failure is not None:
+                raise LoginFailedException(failure)
+
+            # If no cached cookies or error, get fresh cookies
+            with timed_stage("login"):
+                try:
+                    with browser_pool.browser() as driver:
+                        cookies = self._authenticate(driver)
+                    if not validate_session(cookies):
+                        raise LoginFailedException("Login did not produce a usable session")
+                except BrowserPoolTimeoutException:
+                    # No browser was free; the account itself did not fail
+                    raise
+                except Exception as error:
+                    cookie_cache.set_login_failure(
+                        self.user_email_id, self.user_password, str(error) or type(error).__name__
+                    )
+                    raise
+                return cookies
+
+    async def resolve(self):
+        """
+        Resolve the session cookies without blocking the event loop.
         
-        # Check if cached cookies exist and return them
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file, "r") as file:
-                    cookies = json.load(file)
-                    return cookies
-            except Exception:
-                # If any error occurs with cached cookies, get fresh ones
-                pass
+        Cookies in the memory tier of the cookie cache are returned right away.
+        Otherwise the callers of an account on this event loop share one lookup:
+        the disk tier is read in the default executor and, on a miss, only the
+        Selenium login runs in the bounded login executor. Waiters never hold an
+        executor thread. A session that is already resolved is returned as is.
         
-        # If no cached cookies or error, get fresh cookies
-        driver = self._launch_browser()
-        try:
-            cookies = self._authenticate(driver)
-            return cookies
-        finally:
-            # Always close the browser
-            driver.quit()
+        Returns:
+            dict: A dictionary of cookie name-value pairs for LinkedIn authentication
+            
+        Raises:
+            LoginFailedException: If the login, or a recent one, did not produce a
+                                  usable session
+        """
+        if self.cookies is None:
+            self.cookies = await self._load_cookie()
+        return self.cookies
 
-    def _launch_browser(self):
+    async def refresh_cookie(self, stale_cookies):
         """
-        Launch a Chrome browser with stealth settings.
+        Replace rejected cookies with a fresh session.
         
-        This method configures and launches a Chrome WebDriver instance with settings
-        to avoid detection as an automated browser. It uses selenium-stealth to bypass
-        common anti-bot measures.
+        Concurrent callers of the account on this event loop share a single
+        refresh, and across threads and processes only the first one drops the
+        cache entry; the others pick up the cookies it caches. The new cookies
+        replace the resolved session of every scraper sharing it.
         
+        Args:
+            stale_cookies (dict): The cookies LinkedIn rejected
+            
         Returns:
-            webdriver.Chrome: Configured Chrome WebDriver instance
+            dict: A dictionary of cookie name-value pairs for LinkedIn authentication
+        """
+        async def refresh():
+            await self._run_in_executor(None, self.invalidate_cookie, stale_cookies)
+            return await self._fetch_cookie()
+
+        self.cookies = await self._single_flight("refresh", refresh)
+        return self.cookies
+
+    async def _load_cookie(self):
+        with timed_stage("cookie_cache"):
+            cookies = cookie_cache.get_memory(self.user_email_id, self.user_password)
+        if cookies is not None:
+            return cookies
+        return await self._single_flight("load", self._fetch_cookie)
+
+    async def _fetch_cookie(self):
+        with timed_stage("cookie_cache"):
+            cookies = await self._run_in_executor(None, cookie_cache.get, self.user_email_id, self.user_password)
+        if cookies is not None:
+            return cookies
+        return await self._run_in_executor(login_executor, self.get_cookie)
+
+    async def _single_flight(self, name, factory):
+        """
+        Run `factory()` once for every caller of this account and `name` on the event loop.
+        
+        Cancelling one caller does not cancel the shared task, since others may
+        still wait on it.
         """
-        options = webdriver.ChromeOptions()
-        options.binary_location = "/usr/bin/google-chrome"
-        # options.add_argument("--headless")  # Run headless for server environments
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option("useAutomationExtension", False)
-        driver = webdriver.Chrome(options=options)
-        stealth(driver, languages=["en-US", "en"], platform="Linux")
-        return driver
+        loop = asyncio.get_running_loop()
+        pending = _pending_cookie_tasks.setdefault(loop, {})
+        key = (name, self.account_key())
+        task = pending.get(key)
+        if task is None:
+            task = pending[key] = loop.create_task(factory())
+            task.add_done_callback(lambda task: _cookie_task_done(pending, key, task))
+        return await asyncio.shield(task)
+
+    async def _run_in_executor(self, executor, function, *args):
+        if executor is login_executor:
+            login_executor_jobs.inc()
+        # Executor threads do not inherit the context, e.g. the timings of the API call
+        context = contextvars.copy_context()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, context.run, function, *args
+            )
+        finally:
+            if executor is login_executor:
+                login_executor_jobs.dec()
 
     def _authenticate(self, driver):
         """
@@ -98,12 +212,12 @@ class LoginPage:
         waits for successful authentication, and retrieves the resulting cookies.
         
         Args:
-            driver (webdriver.Chrome): Chrome WebDriver instance
+            driver (webdriver.Chrome): Chrome WebDriver instance from the browser pool
             
         Returns:
             dict: A dictionary of cookie name-value pairs for LinkedIn authentication
         """
-        driver.get("https://www.linkedin.com/login")
+        driver.get(f"{settings.LINKEDIN_BASE_URL}/login")
         WebDriverWait(driver, 10).until(
             EC.presence_of_element_located((By.ID, "username"))
         )
@@ -146,36 +260,36 @@ class LoginPage:
         
     def _cache_cookies(self, cookies):
         """
-        Save cookies to a cache file for future use.
+        Save cookies to the cookie cache for future use.
         
-        The cache file is named using an encoded version of the user credentials
-        and stored in the .user directory relative to the script location.
+        Cookies that do not form a usable session (e.g. after a login that was
+        stopped by a checkpoint) are not cached.
         
         Args:
             cookies (dict): Dictionary of cookie name-value pairs to cache
         """
-        credential_id = self._encrypt_credential()
-        cache_dir = os.path.join(os.path.dirname(__file__), ".user")
-        
-        # Ensure directory exists
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
-            
-        cache_file = os.path.join(cache_dir, f"{credential_id}.json")
+        if validate_session(cookies):
+            cookie_cache.set(self.user_email_id, self.user_password, cookies)
+
+    def account_key(self):
+        """
+        Return an opaque, non-reversible identifier of this account.
         
-        with open(cache_file, "w") as file:
-            json.dump(cookies, file, indent=4)
+        Returns:
+            str: Salted hash of the user credentials
+        """
+        return cookie_cache.key(self.user_email_id, self.user_password)
 
-    def _encrypt_credential(self):
+    def invalidate_cookie(self, stale_cookies=None):
         """
-        Create a unique identifier from user credentials.
+        Drop the cached cookies of this user.
         
-        This method creates a base64-encoded string from the combined email and password
-        to use as a unique identifier for caching purposes.
+        Called when LinkedIn rejects the session, so the next `get_cookie` call
+        logs in again instead of reusing the dead cookies.
         
-        Returns:
-            str: Base64-encoded string of combined credentials
+        Args:
+            stale_cookies (dict, optional): The rejected cookies. If given, the cache
+                                            entry is only dropped while it still holds
+                                            them. Defaults to None.
         """
-        credentials = f"{self.user_email_id}|{self.user_password}"
-        encoded_bytes = b64encode(credentials.encode('utf-8'))
-        return encoded_bytes.decode('utf-8')
\ No newline at end of file
+        cookie_cache.invalidate(self.user_email_id, self.user_password, cookies=stale_cookies)
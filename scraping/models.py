@@ -0,0 +1,219 @@
+from typing import NamedTuple, Optional
+
+from request_exceptions import DeadlineExceededException
+
+# Keys of a scraped profile, in the order they are serialized
+PROFILE_FIELDS = (
+    "public_id", "full_name", "headline", "summary", "industry_name",
+    "location", "skills", "experience", "education",
+)
+CONTACT_FIELDS = ("email", "phone")
+
+
+class Experience(NamedTuple):
+    """
+    A position listed in the experience section of a profile.
+    """
+
+    job_title: Optional[str] = None
+    company_name: Optional[str] = None
+    location: Optional[str] = None
+    period: Optional[dict] = None
+    description: Optional[str] = None
+
+    def to_dict(self):
+        job_title, company_name, location, period, description = self
+        return {
+            "job_title": job_title,
+            "company_name": company_name,
+            "location": location,
+            "period": period,
+            "description": description,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class Education(NamedTuple):
+    """
+    A school listed in the education section of a profile.
+    """
+
+    school_name: Optional[str] = None
+    degree: Optional[str] = None
+    period: Optional[dict] = None
+
+    def to_dict(self):
+        school_name, degree, period = self
+        return {"school_name": school_name, "degree": degree, "period": period}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class Profile:
+    """
+    Profile and contact details of a LinkedIn member.
+
+    Only has `__slots__`, so it carries no per-instance dict. A field that was
+    never assigned was not scraped (it is outside of the requested projection)
+    and is left out of `to_dict`.
+
+    Attributes:
+        public_id (str): LinkedIn public identifier
+        full_name (str): Member's full name
+        headline (str): Professional headline
+        summary (str): Profile summary, whitespace normalized
+        industry_name (str): Industry classification
+        location (str): Geographic location
+        skills (list): Skill names
+        experience (list): `Experience` records
+        education (list): `Education` records
+        email (str): Email address visible to the scraping account
+        phone (str): Phone number visible to the scraping account
+    """
+
+    __slots__ = PROFILE_FIELDS + CONTACT_FIELDS
+
+    _sections = {"experience": Experience, "education": Education}
+
+    def __init__(self, **values):
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def to_dict(self, fields=None):
+        """
+        Serialize the profile to plain JSON-compatible types.
+
+        Args:
+            fields (frozenset, optional): Keys to include. Defaults to None (every
+                                          assigned key).
+
+        Returns:
+            dict: Assigned fields in `PROFILE_FIELDS` then `CONTACT_FIELDS` order
+        """
+        if fields is None:
+            try:
+                return {
+                    "public_id": self.public_id,
+                    "full_name": self.full_name,
+                    "headline": self.headline,
+                    "summary": self.summary,
+                    "industry_name": self.industry_name,
+                    "location": self.location,
+                    "skills": self.skills,
+                    "experience": [
+                        {
+                            "job_title": job_title,
+                            "company_name": company_name,
+                            "location": location,
+                            "period": period,
+                            "description": description,
+                        }
+                        for job_title, company_name, location, period, description in self.experience or ()
+                    ],
+                    "education": [
+                        {"school_name": school_name, "degree": degree, "period": period}
+                        for school_name, degree, period in self.education or ()
+                    ],
+                    "email": self.email,
+                    "phone": self.phone,
+                }
+            except AttributeError:
+                # Partially scraped profile
+                pass
+        data = {}
+        for name in self.__slots__:
+            if fields is not None and name not in fields:
+                continue
+            value = getattr(self, name, self)
+            if value is self:
+                continue
+            if value and name in self._sections:
+                value = [item.to_dict() for item in value]
+            data[name] = value
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a profile from the output of `to_dict`.
+
+        Args:
+            data (dict): Serialized profile
+
+        Returns:
+            Profile: The profile
+        """
+        profile = cls(**{name: data[name] for name in cls.__slots__ if name in data})
+        for section, model in cls._sections.items():
+            if data.get(section):
+                setattr(profile, section, [model.from_dict(item) for item in data[section]])
+        return profile
+
+    def update(self, other):
+        """
+        Copy every assigned field of another profile.
+
+        Args:
+            other (Profile): Profile to merge into this one
+        """
+        for name in self.__slots__:
+            value = getattr(other, name, other)
+            if value is not other:
+                setattr(self, name, value)
+
+    def without_contact(self):
+        """
+        Copy the profile without its contact details.
+
+        Returns:
+            Profile: A profile with every assigned field but `CONTACT_FIELDS`
+        """
+        profile = Profile()
+        for name in PROFILE_FIELDS:
+            value = getattr(self, name, self)
+            if value is not self:
+                setattr(profile, name, value)
+        return profile
+
+    def __eq__(self, other):
+        if not isinstance(other, Profile):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Profile({self.to_dict()!r})"
+
+
+class ProfileResult(NamedTuple):
+    """
+    Outcome of scraping one profile of a batch or a listing page.
+
+    `status` is "ok" for a scraped profile, "unfinished" for one cut off by the
+    deadline of the API call and "failed" for one whose scrape raised.
+    """
+
+    public_id: str
+    data: Optional[dict] = None
+    error: Optional[Exception] = None
+
+    @property
+    def status(self):
+        if self.error is None:
+            return "ok"
+        if isinstance(self.error, DeadlineExceededException):
+            return "unfinished"
+        return "failed"
+
+    def error_dict(self):
+        """
+        Describe a failed or unfinished profile for API responses.
+
+        Returns:
+            dict: `{"public_id": str, "status": str, "error": str}`
+        """
+        return {"public_id": self.public_id, "status": self.status, "error": str(self.error)}
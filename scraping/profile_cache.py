@@ -0,0 +1,255 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import settings
+from metrics import registry
+from request_exceptions import DeadlineExceededException
+from scraping.models import CONTACT_FIELDS, Profile
+from scraping.storage import read_json, write_json_atomic
+
+profile_cache_lookups = registry.counter(
+    "profile_cache_lookups_total",
+    "Profile cache lookups, labelled by result (memory/disk/coalesced/miss)",
+)
+
+
+class ProfileCache:
+    """
+    TTL cache of scraped `Profile` records.
+
+    Profiles live in a size-bounded in-process LRU and, if `cache_dir` is set,
+    in one JSON file per entry on disk. Concurrent requests for a profile that
+    is already being fetched on the same event loop wait for that fetch instead
+    of starting their own. Failed fetches are never cached.
+
+    Contact details are the ones visible to the account that fetched the
+    profile, so entries carrying them are keyed by account. A full profile
+    also stores its part without contact details under the bare public
+    identifier, which answers the projections without contact fields of
+    every account.
+
+    Attributes:
+        ttl (int): Seconds a cached profile is considered fresh
+        max_entries (int): Maximum number of entries held in memory
+        cache_dir (str): Directory of the disk tier, or None to disable it
+    """
+
+    def __init__(
+            self,
+            ttl=settings.PROFILE_CACHE_TTL,
+            max_entries=settings.PROFILE_CACHE_MAX_ENTRIES,
+            cache_dir=settings.PROFILE_CACHE_DIR,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # (id(loop), cache key) -> asyncio.Future
+        self._in_flight = {}
+
+    @staticmethod
+    def key(public_identifier, account, fields=None):
+        """
+        Cache key of a profile fetched by an account.
+
+        Args:
+            public_identifier (str): LinkedIn profile ID
+            account (str): Opaque key of the fetching account
+            fields (frozenset, optional): Projection the profile was fetched with.
+                                          Defaults to None (every field).
+
+        Returns:
+            str: The key, scoped to `account` if the profile carries contact details
+        """
+        key = public_identifier
+        if fields is not None:
+            key = f"{key}#{','.join(sorted(fields))}"
+        if fields is None or not fields.isdisjoint(CONTACT_FIELDS):
+            key = f"{account}/{key}"
+        return key
+
+    async def get(self, public_identifier, account, fields=None):
+        """
+        Return the cached profile, if fresh.
+
+        A projection is also answered by a full profile, of the same account or,
+        without contact fields, of any account.
+
+        Args:
+            public_identifier (str): LinkedIn profile ID
+            account (str): Opaque key of the requesting account
+            fields (frozenset, optional): Keys the profile must carry. Defaults to
+                                          None (every key).
+
+        Returns:
+            Profile: Profile data, or None on a cache miss
+        """
+        if not self.ttl:
+            return None
+        keys = [self.key(public_identifier, account)]
+        if fields is not None:
+            if fields.isdisjoint(CONTACT_FIELDS):
+                keys.append(public_identifier)
+            keys.append(self.key(public_identifier, account, fields))
+
+        now = time.time()
+        for key in keys:
+            profile_data = self._get_memory(key, now)
+            if profile_data is not None:
+                profile_cache_lookups.inc(result="memory")
+                return profile_data
+
+        if self.cache_dir:
+            loop = asyncio.get_running_loop()
+            profile_data = await loop.run_in_executor(None, self._get_disk, keys, now)
+            if profile_data is not None:
+                profile_cache_lookups.inc(result="disk")
+                return profile_data
+        return None
+
+    async def set(self, public_identifier, account, profile_data, fields=None):
+        """
+        Store a profile in the cache.
+
+        Args:
+            public_identifier (str): LinkedIn profile ID
+            account (str): Opaque key of the fetching account
+            profile_data (Profile): Scraped profile data
+            fields (frozenset, optional): Projection the profile was fetched with.
+                                          Defaults to None (every field).
+        """
+        if not self.ttl:
+            return
+        entries = [(self.key(public_identifier, account, fields), profile_data)]
+        if fields is None:
+            entries.append((public_identifier, profile_data.without_contact()))
+
+        stored_at = time.time()
+        for key, profile in entries:
+            self._remember(key, stored_at, profile)
+        if self.cache_dir:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._set_disk, entries, stored_at)
+
+    async def invalidate(self, public_identifier, account):
+        """
+        Drop the full profile of an account, and its part shared by every
+        account, from every tier.
+
+        Args:
+            public_identifier (str): LinkedIn profile ID
+            account (str): Opaque key of the account
+        """
+        keys = (self.key(public_identifier, account), public_identifier)
+        with self._lock:
+            for key in keys:
+                self._memory.pop(key, None)
+        if self.cache_dir:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._remove_disk, keys)
+
+    async def get_or_fetch(self, public_identifier, account, fetch, fields=None):
+        """
+        Return a cached profile, or fetch it once for all concurrent callers.
+
+        Args:
+            public_identifier (str): LinkedIn profile ID
+            account (str): Opaque key of the requesting account
+            fetch (callable): Coroutine function scraping the profile when it is
+                              neither cached nor being fetched
+            fields (frozenset, optional): Projection `fetch` scrapes. Defaults to
+                                          None (every field).
+
+        Returns:
+            Profile: Profile data
+
+        Raises:
+            Exception: Whatever `fetch` raised, for the caller and every waiter; a
+                       waiter fetches the profile itself if the fetching call is
+                       cancelled or runs out of time
+        """
+        profile_data = await self.get(public_identifier, account, fields)
+        if profile_data is not None:
+            return profile_data
+
+        loop = asyncio.get_running_loop()
+        key = (id(loop), self.key(public_identifier, account, fields))
+        future = self._in_flight.get(key)
+        while future is not None:
+            profile_cache_lookups.inc(result="coalesced")
+            await asyncio.wait([future])
+            if not future.cancelled() and not isinstance(future.exception(), DeadlineExceededException):
+                return future.result()
+            # The fetching call went away or ran out of time; its deadline is not
+            # this caller's, so the profile is fetched again
+            future = self._in_flight.get(key)
+
+        profile_cache_lookups.inc(result="miss")
+        future = loop.create_future()
+        self._in_flight[key] = future
+        try:
+            profile_data = await fetch()
+            future.set_result(profile_data)
+        except BaseException as error:
+            if isinstance(error, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(error)
+                # Retrieved here so an exception without waiters is not logged
+                future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+        await self.set(public_identifier, account, profile_data, fields)
+        return profile_data
+
+    def _get_memory(self, key, now):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            stored_at, profile_data = entry
+            if now - stored_at < self.ttl:
+                self._memory.move_to_end(key)
+                return profile_data
+            del self._memory[key]
+        return None
+
+    def _get_disk(self, keys, now):
+        for key in keys:
+            data = read_json(self._path(key))
+            if data and now - data.get("stored_at", 0) < self.ttl:
+                profile = Profile.from_dict(data["profile"])
+                self._remember(key, data["stored_at"], profile)
+                return profile
+        return None
+
+    def _set_disk(self, entries, stored_at):
+        for key, profile_data in entries:
+            write_json_atomic(self._path(key), {"stored_at": stored_at, "profile": profile_data.to_dict()})
+
+    def _remove_disk(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _remember(self, key, stored_at, profile_data):
+        with self._lock:
+            self._memory[key] = (stored_at, profile_data)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _path(self, key):
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.json")
+
+
+profile_cache = ProfileCache()
@@ -1,38 +1,81 @@
+import asyncio
+from contextlib import aclosing
 from copy import deepcopy
 
-from tenacity import retry, stop_after_attempt
-
+import settings
+from metrics import timed_profile, timed_stage
+from request_exceptions import DeadlineExceededException, SessionExpiredException
+from scraping.concurrency import limited
 from scraping.login_page import LoginPage
 from scraping.data_parser import DataParser
+from scraping.deadline import time_left
+from scraping.models import CONTACT_FIELDS, PROFILE_FIELDS, Profile, ProfileResult
+from scraping.profile_cache import profile_cache
+from scraping.profile_store import profile_store
 from scraping.requests import Request
 from scraping.utils import (extract_public_identifier,
                            get_headers)
 from traceback import format_exc
 
 class LinkedinProfileData:
-    def __init__(self, email, password):
+    def __init__(self, email, password, user_session=None):
         """
         Initialize the LinkedIn profile data scraper.
         
+        Without a resolved `user_session` the cookies are loaded here, which
+        blocks (a login can take 30s or more); async code should use `create`.
+        
         Args:
             email (str): LinkedIn account email for authentication
             password (str): LinkedIn account password for authentication
+            user_session (LoginPage, optional): Session of the same account to share,
+                                                e.g. with a connections scraper
         """
         self.user_email = email
         self.user_password = password
-        self.user_session = LoginPage(
+        self.user_session = user_session or LoginPage(
             email=self.user_email,
             password=self.user_password
         )
-        self.cookies = self.user_session.get_cookie()
-        self.request = Request()
+        if self.user_session.cookies is None:
+            self.user_session.cookies = self.user_session.get_cookie()
+        self.request = Request(account=self.user_session.account_key())
+
+    @classmethod
+    async def create(cls, email, password, user_session=None):
+        """
+        Create a scraper without blocking the event loop.
+        
+        The cookies are loaded (logging in if needed) in the login executor.
+        
+        Args:
+            email (str): LinkedIn account email for authentication
+            password (str): LinkedIn account password for authentication
+            user_session (LoginPage, optional): Session of the same account to share
+            
+        Returns:
+            LinkedinProfileData: Scraper with a resolved session
+        """
+        user_session = user_session or LoginPage(email=email, password=password)
+        await user_session.resolve()
+        return cls(email, password, user_session=user_session)
+
+    @property
+    def cookies(self):
+        return self.user_session.cookies
+
+    @cookies.setter
+    def cookies(self, cookies):
+        self.user_session.cookies = cookies
 
-    @retry(stop=stop_after_attempt(10))
     async def fetch(self, url, params=None, headers=None, cookies=None, method="GET", data=None):
         """
-        Make an HTTP request with retry capability.
+        Make an HTTP request, renewing the session if LinkedIn rejects it.
         
-        Wrapper for the request.fetch method with proper error handling.
+        Wrapper for the request.fetch method, which retries transient failures
+        within its retry budget. A rejected session (401/403) is not retried as is:
+        the cookies are renewed (logging in again if needed) and the request is
+        sent once more with the new session.
         
         Args:
             url (str): The URL to request
@@ -46,64 +89,269 @@ class LinkedinProfileData:
             dict: Response data from the request
             
         Raises:
-            Exception: If all retry attempts fail
+            SessionExpiredException: If LinkedIn also rejects the renewed session
+            RequestFailedException: If the request fails after its retry budget is spent
         """
-        response = await self.request.fetch(
-            url=url, 
-            params=params, 
-            headers=headers, 
-            cookies=cookies,
+        try:
+            return await self.request.fetch(
+                url=url, 
+                params=params, 
+                headers=headers, 
+                cookies=cookies,
+                method=method,
+                data=data
+            )
+        except SessionExpiredException:
+            await self.user_session.refresh_cookie(cookies)
+
+        if headers and "csrf-token" in headers:
+            headers = dict(headers)
+            headers["csrf-token"] = self.cookies.get("JSESSIONID", "").replace('"', "").strip()
+        return await self.request.fetch(
+            url=url,
+            params=params,
+            headers=headers,
+            cookies=self.cookies,
             method=method,
             data=data
         )
-        return response
 
-    @retry(stop=stop_after_attempt(10))
-    async def get_profile_data(self, public_identifier=None, uri=None):
+    async def get_profile_data(self, public_identifier=None, uri=None, use_cache=True, fields=None):
         """
         Extract comprehensive profile data for a LinkedIn user.
         
         Main function to extract the profile data:
         - If public_id/uri not given, assumes it should scrape the logged-in user's profile
         - In this case, it will send a homepage request to extract the public-id
-        - Scrapes basic details and contact details and returns them combined in a dictionary
+        - Returns the cached profile if it was scraped recently; concurrent calls for
+          a profile that is already being scraped wait for that scrape
+        - Otherwise scrapes basic details and contact details and returns them combined
+          in a dictionary
         
         Args:
             public_identifier (str, optional): LinkedIn profile ID to scrape
             uri (str, optional): LinkedIn profile URI to scrape
+            use_cache (bool, optional): Whether to use the profile cache (default: True)
+            fields (frozenset, optional): Keys to return, as returned by
+                                          `data_parser.parse_fields` (default: every key)
             
         Returns:
             dict: Combined profile and contact data for the requested profile
             
         Raises:
-            Exception: If all retry attempts fail
+            RequestFailedException: If a request fails after its retry budget is spent
         """
         if not public_identifier and not uri:
             # If public id is not provided, Assume that
             # It should scrape the profile of the logged in user.
             public_identifier = await self._get_public_identifier()
 
-        api_profile_url = f"https://www.linkedin.com/voyager/api/identity/profiles/{public_identifier}/profileView"
+        with timed_profile(public_identifier or uri):
+            if not use_cache or not public_identifier:
+                profile = await self._scrape_profile_data(public_identifier, fields)
+            else:
+                profile = await profile_cache.get_or_fetch(
+                    public_identifier,
+                    self.user_session.account_key(),
+                    lambda: self._load_profile_data(public_identifier, fields),
+                    fields
+                )
+        return profile.to_dict(fields)
+
+    async def iter_profiles_data(self, public_identifiers, fields=None):
+        """
+        Scrape many profiles with this session, yielding each one as soon as it is done.
+        
+        Identifiers are scraped concurrently within the account's adaptive
+        concurrency limit. A profile that fails does not stop the others. Under a
+        deadline (`scraping.deadline`), profiles not scraped when it passes are
+        cancelled and yielded with a `DeadlineExceededException`.
+        
+        Args:
+            public_identifiers (list): LinkedIn profile IDs to scrape
+            fields (frozenset, optional): Keys to return, as returned by
+                                          `data_parser.parse_fields` (default: every key)
+            
+        Yields:
+            ProfileResult: The outcome of every profile, in the order the scrapes finish
+        """
+        async def worker(public_identifier):
+            try:
+                profile_data = await self.get_profile_data(
+                    public_identifier=public_identifier, fields=fields
+                )
+                return ProfileResult(public_identifier, profile_data)
+            except Exception as error:
+                print(format_exc())
+                return ProfileResult(public_identifier, error=error)
+
+        tasks = {asyncio.ensure_future(worker(public_identifier)): public_identifier
+                 for public_identifier in public_identifiers}
+        finished = set()
+        try:
+            try:
+                for next_finished in asyncio.as_completed(tasks, timeout=time_left()):
+                    result = await next_finished
+                    finished.add(result.public_id)
+                    yield result
+            except asyncio.TimeoutError:
+                # The deadline passed: scrapes still running are cancelled and
+                # reported as failed, so the caller can answer with what is done
+                for task, public_identifier in tasks.items():
+                    if public_identifier in finished:
+                        continue
+                    if task.done():
+                        yield task.result()
+                    else:
+                        task.cancel()
+                        yield ProfileResult(public_identifier, error=DeadlineExceededException("Deadline exceeded"))
+        finally:
+            # The consumer may stop early, e.g. when the client disconnects
+            for task in tasks:
+                task.cancel()
+
+    async def get_profiles_data(self, public_identifiers, fields=None):
+        """
+        Scrape many profiles with this session.
+        
+        Args:
+            public_identifiers (list): LinkedIn profile IDs to scrape
+            fields (frozenset, optional): Keys to return, as returned by
+                                          `data_parser.parse_fields` (default: every key)
+            
+        Returns:
+            dict: `profiles`, a list of `{"public_id": str, "data": dict}` in the order
+                  of `public_identifiers`, and `errors`, a list of
+                  `{"public_id": str, "status": str, "error": str}` for the profiles
+                  that failed or were cut off by the deadline
+        """
+        results = {}
+        errors = []
+        with timed_stage("profiles"):
+            async with aclosing(self.iter_profiles_data(public_identifiers, fields)) as profiles:
+                async for result in profiles:
+                    if result.error is not None:
+                        errors.append(result.error_dict())
+                    else:
+                        results[result.public_id] = result.data
+        return {
+            "profiles": [
+                {"public_id": public_identifier, "data": results[public_identifier]}
+                for public_identifier in public_identifiers
+                if public_identifier in results
+            ],
+            "errors": errors,
+        }
+
+    async def iter_profile_records(self, public_identifiers, fields=None):
+        """
+        Stream many profiles as records, for NDJSON / SSE responses.
+        
+        Args:
+            public_identifiers (list): LinkedIn profile IDs to scrape
+            fields (frozenset, optional): Keys to return (default: every key)
+            
+        Yields:
+            dict: `{"type": "profile", "public_id": str, "data": {...}}` for every
+                  scraped profile, then a single `{"type": "trailer", "errors": list}`
+                  record, where every error is `{"public_id": str, "status": str, "error": str}`.
+        """
+        errors = []
+        async with aclosing(self.iter_profiles_data(public_identifiers, fields)) as profiles:
+            async for result in profiles:
+                if result.error is not None:
+                    errors.append(result.error_dict())
+                    continue
+                yield {"type": "profile", "public_id": result.public_id, "data": result.data}
+        yield {"type": "trailer", "errors": errors}
+
+    async def _load_profile_data(self, public_identifier, fields=None):
+        """
+        Load a profile from the profile store if it was stored recently, else scrape it.
+        
+        Args:
+            public_identifier (str): LinkedIn profile ID
+            fields (frozenset, optional): Keys to return (default: every key)
+            
+        Returns:
+            Profile: The profile
+        """
+        profile = await profile_store.load(self.user_session.account_key(), public_identifier, fields)
+        if profile is None:
+            profile = await self._scrape_profile_data(public_identifier, fields)
+        return profile
+
+    async def _scrape_profile_data(self, public_identifier, fields=None):
+        """
+        Scrape profile and contact details of a LinkedIn profile, bypassing the cache.
+        
+        The profile and contact info requests are sent concurrently, and either one
+        is skipped when none of its fields are requested. They hold a slot of
+        the account's adaptive concurrency limiter, which cache and profile store
+        hits never take. The profile is also written to the profile store.
+        
+        Args:
+            public_identifier (str): LinkedIn profile ID to scrape
+            fields (frozenset, optional): Keys to return (default: every key)
+            
+        Returns:
+            Profile: Combined profile and contact data for the requested profile
+            
+        Raises:
+            RequestFailedException: If a request fails after its retry budget is spent
+        """
+        # Both responses are parsed into the same profile; their fields are disjoint
+        profile = Profile()
+        requests = []
+        if fields is None or not fields.isdisjoint(PROFILE_FIELDS):
+            requests.append(self._get_profile_details(public_identifier, fields, profile))
+        if fields is None or not fields.isdisjoint(CONTACT_FIELDS):
+            requests.append(self._get_contact_details(public_identifier, fields, profile))
+
+        account = self.user_session.account_key()
+        async with limited(account):
+            await asyncio.gather(*requests)
+
+        # Written through to the profile store in the next batch
+        public_id = getattr(profile, "public_id", None) or public_identifier
+        if public_id:
+            profile_store.add(account, public_id, profile)
+        return profile
+
+    async def _get_profile_details(self, public_identifier, fields=None, profile=None):
+        """
+        Retrieve the main profile information of a LinkedIn profile.
+        
+        Args:
+            public_identifier (str): LinkedIn profile ID to get profile details for
+            fields (frozenset, optional): Keys to return (default: every key)
+            profile (Profile, optional): Profile to fill in (default: a new one)
+            
+        Returns:
+            Profile: Profile details for the requested profile
+            
+        Raises:
+            RequestFailedException: If a request fails after its retry budget is spent
+        """
+        api_profile_url = f"{settings.LINKEDIN_BASE_URL}/voyager/api/identity/profiles/{public_identifier}/profileView"
 
         # Sending the Voyager API requests to get the profile details
         headers = deepcopy(get_headers(header_type="profile_page"))
         headers["csrf-token"] = self.cookies.get("JSESSIONID", "").replace('"', "").strip()
         
-        response = await self.fetch(
-            url=api_profile_url,
-            headers=headers,
-            cookies=self.cookies
-        )
+        with timed_stage("profile_view"):
+            response = await self.fetch(
+                url=api_profile_url,
+                headers=headers,
+                cookies=self.cookies
+            )
 
         # Extracting necessary Data
-        parser = DataParser(response)
-        profile_data = parser.get_profile_data()
-        contact_details = await self._get_contact_details(public_identifier)
-        profile_data.update(contact_details)
-        return profile_data
+        with timed_stage("parse"):
+            parser = DataParser(response)
+            return parser.parse_profile(fields, profile)
 
-    @retry(stop=stop_after_attempt(10))
-    async def _get_contact_details(self, public_identifier):
+    async def _get_contact_details(self, public_identifier, fields=None, profile=None):
         """
         Retrieve contact information for a LinkedIn profile.
         
@@ -112,28 +360,32 @@ class LinkedinProfileData:
         
         Args:
             public_identifier (str): LinkedIn profile ID to get contact details for
+            fields (frozenset, optional): Keys to return (default: every key)
+            profile (Profile, optional): Profile to fill in (default: a new one)
             
         Returns:
-            dict: Contact details for the requested profile
+            Profile: Contact details for the requested profile
             
         Raises:
-            Exception: If all retry attempts fail
+            RequestFailedException: If a request fails after its retry budget is spent
         """
         api_profile_url = (
-            "https://www.linkedin.com/voyager/api/identity"
+            f"{settings.LINKEDIN_BASE_URL}/voyager/api/identity"
             f"/profiles/{public_identifier}/profileContactInfo"
         )
         headers = deepcopy(get_headers(header_type="profile_page"))
         headers["csrf-token"] = self.cookies.get("JSESSIONID", "").replace('"', "").strip()
         
-        response = await self.fetch(
-            url=api_profile_url,
-            headers=headers,
-            cookies=self.cookies
-        )
+        with timed_stage("contact_info"):
+            response = await self.fetch(
+                url=api_profile_url,
+                headers=headers,
+                cookies=self.cookies
+            )
         
-        parser = DataParser(response)
-        contact_details = parser.get_contact_details()
+        with timed_stage("parse"):
+            parser = DataParser(response)
+            contact_details = parser.parse_contact_details(fields, profile)
         return contact_details
 
     async def _get_public_identifier(self):
@@ -149,7 +401,7 @@ class LinkedinProfileData:
         Raises:
             Exception: If the public identifier cannot be extracted
         """
-        homepage_url = "https://www.linkedin.com"
+        homepage_url = settings.LINKEDIN_BASE_URL
         headers = deepcopy(get_headers(header_type="homepage"))
         
         response = await self.fetch(
@@ -0,0 +1,497 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from traceback import format_exc
+
+import settings
+from metrics import registry
+from scraping.models import CONTACT_FIELDS, PROFILE_FIELDS, Education, Experience, Profile
+
+profile_store_writes = registry.counter(
+    "profile_store_writes_total",
+    "Profiles written to the profile store, labelled by result (inserted/updated/unchanged/error)",
+)
+profile_store_reads = registry.counter(
+    "profile_store_reads_total",
+    "Profile store lookups on a profile cache miss, labelled by result (hit/miss)",
+)
+
+# Profile fields stored as columns of the `profiles` table
+SCALAR_FIELDS = tuple(field for field in PROFILE_FIELDS if field not in ("skills", "experience", "education"))
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS profiles (
+    public_id TEXT PRIMARY KEY,
+    {", ".join(f"{field} TEXT" for field in SCALAR_FIELDS if field != "public_id")},
+    fields TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    scraped_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profile_accounts (
+    account TEXT NOT NULL,
+    public_id TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    {", ".join(f"{field} TEXT" for field in CONTACT_FIELDS)},
+    contact_fields TEXT NOT NULL DEFAULT '',
+    contact_scraped_at REAL,
+    PRIMARY KEY (account, public_id)
+);
+CREATE INDEX IF NOT EXISTS profile_accounts_public_id ON profile_accounts (public_id);
+CREATE TABLE IF NOT EXISTS profile_experience (
+    public_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    job_title TEXT,
+    company_name TEXT,
+    location TEXT,
+    period TEXT,
+    description TEXT,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (public_id, position)
+);
+CREATE INDEX IF NOT EXISTS profile_experience_company ON profile_experience (company_name);
+CREATE TABLE IF NOT EXISTS profile_education (
+    public_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    school_name TEXT,
+    degree TEXT,
+    period TEXT,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (public_id, position)
+);
+CREATE TABLE IF NOT EXISTS profile_skills (
+    public_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (public_id, position)
+);
+CREATE INDEX IF NOT EXISTS profile_skills_name ON profile_skills (name);
+"""
+
+
+def content_hash(values):
+    """
+    Hash the content of a row, independent of key order.
+
+    Args:
+        values: JSON serializable row content
+
+    Returns:
+        str: Hex encoded SHA-256 of the canonical JSON of `values`
+    """
+    encoded = json.dumps(values, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class AbstractProfileStore(ABC):
+    """
+    Abstract base class for persistent storage of scraped profiles.
+
+    Profiles are keyed by public identifier and linked to every account that
+    scraped them. Contact details are the ones visible to the scraping account
+    and are stored per account; an account is only ever given its own. A
+    profile scraped with a field projection only updates the fields it carries.
+    """
+
+    @abstractmethod
+    def upsert_profiles(self, records):
+        """
+        Insert or update a batch of scraped profiles in one transaction.
+
+        Args:
+            records (list): List of (account, public_id, Profile) tuples
+
+        Returns:
+            dict: Number of profiles by result ("inserted", "updated", "unchanged")
+
+        Raises:
+            NotImplementedError: If the method is not implemented in a subclass.
+        """
+        raise NotImplementedError("`upsert_profiles` Not implemented")
+
+    @abstractmethod
+    def get_profile(self, account, public_id, max_age=None, fields=None):
+        """
+        Load a stored profile, with the contact details an account scraped.
+
+        Args:
+            account (str): Opaque key of the requesting account
+            public_id (str): LinkedIn public identifier
+            max_age (float, optional): Only return a profile scraped at most this
+                                       many seconds ago. Defaults to None (any age).
+            fields (frozenset, optional): Fields the profile must have been scraped
+                                          with. Defaults to None (every field).
+
+        Returns:
+            Profile: The stored profile, or None if it is missing, too old or
+                     lacks some of `fields`, contact fields counting only if
+                     `account` scraped them
+
+        Raises:
+            NotImplementedError: If the method is not implemented in a subclass.
+        """
+        raise NotImplementedError("`get_profile` Not implemented")
+
+    @abstractmethod
+    def account_profiles(self, account, offset=0, limit=100):
+        """
+        Load the profiles an account scraped, most recently seen first.
+
+        Args:
+            account (str): Opaque account key
+            offset (int, optional): Number of profiles to skip. Defaults to 0.
+            limit (int, optional): Maximum number of profiles. Defaults to 100.
+
+        Returns:
+            list: List of Profile objects
+
+        Raises:
+            NotImplementedError: If the method is not implemented in a subclass.
+        """
+        raise NotImplementedError("`account_profiles` Not implemented")
+
+
+class SQLiteProfileStore(AbstractProfileStore):
+    """
+    Profile store in a SQLite database in WAL mode, shared by the processes of a host.
+
+    Profiles are normalized into `profiles` (one row per member), `profile_experience`,
+    `profile_education` and `profile_skills` (one row per entry), and
+    `profile_accounts` (which account scraped which profile, with the contact
+    details visible to that account). Every profile row carries a content hash, so a profile scraped again unchanged is not rewritten and
+    `updated_at` tells when its content last changed.
+
+    Attributes:
+        db_path (str): Path of the SQLite database file
+    """
+
+    _sections = {
+        "experience": ("profile_experience", Experience._fields),
+        "education": ("profile_education", Education._fields),
+        "skills": ("profile_skills", ("name",)),
+    }
+
+    # Columns of `profile_accounts` read with a profile
+    _contact_columns = ", ".join(
+        f"profile_accounts.{column}" for column in (*CONTACT_FIELDS, "contact_fields", "contact_scraped_at")
+    )
+
+    def __init__(self, db_path=settings.PROFILE_STORE_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Safe against corruption in WAL mode; a power loss may drop the last batches
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def upsert_profiles(self, records):
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for account, public_id, profile in records:
+                counts[self._upsert(connection, public_id, profile, now)] += 1
+                self._upsert_account(connection, account, public_id, profile, now)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return counts
+
+    def _upsert(self, connection, public_id, profile, now):
+        data = profile.to_dict()
+        data["public_id"] = public_id
+        row = connection.execute("SELECT * FROM profiles WHERE public_id = ?", (public_id,)).fetchone()
+
+        values = {field: row[field] for field in SCALAR_FIELDS} if row else {"public_id": public_id}
+        values.update((field, data[field]) for field in SCALAR_FIELDS if field in data)
+        fields = set(row["fields"].split(",")) if row else set()
+        fields.update(field for field in data if field not in CONTACT_FIELDS)
+        row_hash = content_hash(values)
+
+        changed = False
+        for section, (table, names) in self._sections.items():
+            if section in data:
+                changed |= self._replace_section(connection, table, names, public_id, data[section] or [])
+
+        if row is None:
+            columns = (*values, "fields", "content_hash", "scraped_at", "updated_at")
+            connection.execute(
+                f"INSERT INTO profiles ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                (*values.values(), ",".join(sorted(fields)), row_hash, now, now),
+            )
+            return "inserted"
+        changed |= row_hash != row["content_hash"] or ",".join(sorted(fields)) != row["fields"]
+        if not changed:
+            connection.execute("UPDATE profiles SET scraped_at = ? WHERE public_id = ?", (now, public_id))
+            return "unchanged"
+        assignments = ", ".join(f"{field} = ?" for field in SCALAR_FIELDS if field != "public_id")
+        connection.execute(
+            f"UPDATE profiles SET {assignments}, fields = ?, content_hash = ?, scraped_at = ?,"
+            " updated_at = ? WHERE public_id = ?",
+            (
+                *(values[field] for field in SCALAR_FIELDS if field != "public_id"),
+                ",".join(sorted(fields)), row_hash, now, now, public_id,
+            ),
+        )
+        return "updated"
+
+    def _upsert_account(self, connection, account, public_id, profile, now):
+        """
+        Link a profile to the account that scraped it, with the contact details
+        the account scraped.
+        """
+        contact = {field: getattr(profile, field) for field in CONTACT_FIELDS if hasattr(profile, field)}
+        row = connection.execute(
+            "SELECT contact_fields FROM profile_accounts WHERE account = ? AND public_id = ?",
+            (account, public_id),
+        ).fetchone()
+        if row is None:
+            connection.execute(
+                "INSERT INTO profile_accounts (account, public_id, seen_at) VALUES (?, ?, ?)",
+                (account, public_id, now),
+            )
+        else:
+            connection.execute(
+                "UPDATE profile_accounts SET seen_at = ? WHERE account = ? AND public_id = ?",
+                (now, account, public_id),
+            )
+        if not contact:
+            return
+        contact_fields = set(filter(None, row["contact_fields"].split(","))) if row else set()
+        contact_fields.update(contact)
+        assignments = ", ".join(f"{field} = ?" for field in contact)
+        connection.execute(
+            f"UPDATE profile_accounts SET {assignments}, contact_fields = ?, contact_scraped_at = ?"
+            " WHERE account = ? AND public_id = ?",
+            (*contact.values(), ",".join(sorted(contact_fields)), now, account, public_id),
+        )
+
+    def _replace_section(self, connection, table, names, public_id, entries):
+        """
+        Replace the entries of a profile section if their content changed.
+
+        Returns:
+            bool: Whether the section was rewritten
+        """
+        rows = []
+        for position, entry in enumerate(entries):
+            entry = entry if isinstance(entry, dict) else {"name": entry}
+            values = [entry.get(name) for name in names]
+            rows.append((
+                public_id, position,
+                *(json.dumps(value) if isinstance(value, dict) else value for value in values),
+                content_hash(values),
+            ))
+        stored = [
+            stored_row["content_hash"]
+            for stored_row in connection.execute(
+                f"SELECT content_hash FROM {table} WHERE public_id = ? ORDER BY position", (public_id,)
+            )
+        ]
+        if stored == [row[-1] for row in rows]:
+            return False
+        connection.execute(f"DELETE FROM {table} WHERE public_id = ?", (public_id,))
+        connection.executemany(
+            f"INSERT INTO {table} (public_id, position, {', '.join(names)},"
+            f" content_hash) VALUES ({', '.join('?' * (len(names) + 3))})",
+            rows,
+        )
+        return True
+
+    def get_profile(self, account, public_id, max_age=None, fields=None):
+        connection = self._connection()
+        row = connection.execute(
+            f"SELECT profiles.*, {self._contact_columns} FROM profiles LEFT JOIN profile_accounts"
+            " ON profile_accounts.public_id = profiles.public_id AND profile_accounts.account = ?"
+            " WHERE profiles.public_id = ?",
+            (account, public_id),
+        ).fetchone()
+        if row is None:
+            return None
+        fields = set(fields if fields is not None else PROFILE_FIELDS + CONTACT_FIELDS)
+        now = time.time()
+        if fields.difference(CONTACT_FIELDS):
+            if max_age is not None and now - row["scraped_at"] > max_age:
+                return None
+            if not set(row["fields"].split(",")).issuperset(fields.difference(CONTACT_FIELDS)):
+                return None
+        if fields.intersection(CONTACT_FIELDS):
+            if row["contact_scraped_at"] is None:
+                return None
+            if max_age is not None and now - row["contact_scraped_at"] > max_age:
+                return None
+            if not set(row["contact_fields"].split(",")).issuperset(fields.intersection(CONTACT_FIELDS)):
+                return None
+        return self._load(connection, row)
+
+    def account_profiles(self, account, offset=0, limit=100):
+        connection = self._connection()
+        rows = connection.execute(
+            f"SELECT profiles.*, {self._contact_columns} FROM profile_accounts JOIN profiles USING (public_id)"
+            " WHERE profile_accounts.account = ? ORDER BY profile_accounts.seen_at DESC, public_id"
+            " LIMIT ? OFFSET ?",
+            (account, limit, offset),
+        ).fetchall()
+        return [self._load(connection, row) for row in rows]
+
+    def _load(self, connection, row):
+        stored_fields = set(row["fields"].split(","))
+        data = {field: row[field] for field in SCALAR_FIELDS if field in stored_fields}
+        contact_fields = set((row["contact_fields"] or "").split(","))
+        data.update((field, row[field]) for field in CONTACT_FIELDS if field in contact_fields)
+        data["public_id"] = row["public_id"]
+        for section, (table, names) in self._sections.items():
+            if section not in stored_fields:
+                continue
+            entries = []
+            for entry in connection.execute(
+                    f"SELECT * FROM {table} WHERE public_id = ? ORDER BY position", (row["public_id"],)
+            ):
+                values = {name: entry[name] for name in names}
+                if values.get("period") is not None:
+                    values["period"] = json.loads(values["period"])
+                entries.append(values["name"] if section == "skills" else values)
+            data[section] = entries
+        return Profile.from_dict(data)
+
+
+BACKENDS = {
+    "sqlite": SQLiteProfileStore,
+}
+
+
+class ProfileStore:
+    """
+    Batched write-through front of the configured profile store backend.
+
+    Scrapers `add` every profile they scrape; profiles are buffered and written
+    off the event loop in one transaction per batch, when `batch_size` profiles
+    are waiting or `flush_interval` seconds after the first one. On a profile
+    cache miss, `load` serves profiles scraped less than `max_age` seconds ago
+    from the store instead of LinkedIn.
+
+    Attributes:
+        batch_size (int): Buffered profiles that trigger a write
+        flush_interval (float): Longest a profile stays buffered, in seconds
+        max_age (float): Age up to which stored profiles answer lookups (0 disables)
+    """
+
+    def __init__(
+            self,
+            backend=None,
+            batch_size=settings.PROFILE_STORE_BATCH_SIZE,
+            flush_interval=settings.PROFILE_STORE_FLUSH_INTERVAL,
+            max_age=settings.PROFILE_STORE_MAX_AGE,
+    ):
+        self._backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_age = max_age
+        self._pending = []
+        self._lock = threading.Lock()
+        # Event loop a flush is scheduled on
+        self._timer_loop = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = BACKENDS[settings.PROFILE_STORE_BACKEND]()
+        return self._backend
+
+    @property
+    def enabled(self):
+        return self._backend is not None or settings.PROFILE_STORE_BACKEND != "none"
+
+    def add(self, account, public_id, profile):
+        """
+        Queue a scraped profile for the next batch. Must be called on an event loop.
+
+        Args:
+            account (str): Opaque key of the account that scraped the profile
+            public_id (str): LinkedIn public identifier
+            profile (Profile): Scraped profile
+        """
+        if not self.enabled:
+            return
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._pending.append((account, public_id, profile))
+            if len(self._pending) >= self.batch_size:
+                loop.run_in_executor(None, self.flush)
+            elif self._timer_loop is not loop:
+                self._timer_loop = loop
+                loop.call_later(self.flush_interval, self._flush_later, loop)
+
+    def _flush_later(self, loop):
+        with self._lock:
+            if self._timer_loop is loop:
+                self._timer_loop = None
+        loop.run_in_executor(None, self.flush)
+
+    def flush(self):
+        """
+        Write the buffered profiles. Blocks; call it off the event loop.
+
+        Returns:
+            int: Number of profiles written
+        """
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        try:
+            counts = self.backend.upsert_profiles(batch)
+        except Exception:
+            # The store is a by-product of scraping: a failed batch is logged, not retried
+            print(format_exc())
+            profile_store_writes.inc(len(batch), result="error")
+            return 0
+        for result, count in counts.items():
+            if count:
+                profile_store_writes.inc(count, result=result)
+        return len(batch)
+
+    async def load(self, account, public_id, fields=None):
+        """
+        Look up a recently stored profile, with the contact details the account scraped.
+
+        Args:
+            account (str): Opaque key of the requesting account
+            public_id (str): LinkedIn public identifier
+            fields (frozenset, optional): Fields the profile must carry (default: every field)
+
+        Returns:
+            Profile: The stored profile, or None
+        """
+        if not self.enabled or self.max_age <= 0:
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            profile = await loop.run_in_executor(
+                None, lambda: self.backend.get_profile(account, public_id, max_age=self.max_age, fields=fields)
+            )
+        except Exception:
+            print(format_exc())
+            return None
+        profile_store_reads.inc(result="hit" if profile is not None else "miss")
+        return profile
+
+
+profile_store = ProfileStore()
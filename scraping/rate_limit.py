@@ -0,0 +1,276 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import settings
+from metrics import observe_stage, registry
+from request_exceptions import DeadlineExceededException
+from scraping.deadline import time_left
+
+rate_limit_wait = registry.histogram(
+    "rate_limit_wait_seconds",
+    "Time upstream requests waited for a rate limit token",
+)
+
+
+class AbstractRateLimitBackend(ABC):
+    """
+    Abstract base class for token bucket storage.
+
+    Backends keep one bucket per key and must take tokens atomically, so that
+    every process sharing the backend observes the same bucket.
+    """
+
+    @abstractmethod
+    def take(self, key: str, rate: float, capacity: float) -> float:
+        """
+        Take one token from a bucket, reserving a future one if it is empty.
+
+        Args:
+            key (str): Bucket key
+            rate (float): Tokens added per second
+            capacity (float): Maximum number of tokens in the bucket
+
+        Returns:
+            float: Seconds the caller must wait before using its token (0 if one
+                   was available)
+
+        Raises:
+            NotImplementedError: If the method is not implemented in a subclass.
+        """
+        raise NotImplementedError("`take` Not implemented")
+
+    @abstractmethod
+    def refund(self, key: str, rate: float, capacity: float) -> None:
+        """
+        Put back a token taken by `take` that was never used.
+
+        Args:
+            key (str): Bucket key
+            rate (float): Tokens added per second
+            capacity (float): Maximum number of tokens in the bucket
+
+        Raises:
+            NotImplementedError: If the method is not implemented in a subclass.
+        """
+        raise NotImplementedError("`refund` Not implemented")
+
+
+class MemoryRateLimitBackend(AbstractRateLimitBackend):
+    """
+    Token buckets held in process memory. Only limits a single worker.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity):
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate) - 1
+            self._buckets[key] = (tokens, now)
+        return max(0.0, -tokens / rate)
+
+    def refund(self, key, rate, capacity):
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            self._buckets[key] = (min(capacity, tokens + (now - updated) * rate + 1), now)
+
+
+class SQLiteRateLimitBackend(AbstractRateLimitBackend):
+    """
+    Token buckets in a SQLite database shared by the worker processes of a host.
+
+    Attributes:
+        db_path (str): Path of the SQLite database file
+    """
+
+    def __init__(self, db_path=settings.RATE_LIMIT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets"
+                " (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, rate, capacity):
+        tokens = self._add(key, rate, capacity, -1)
+        return max(0.0, -tokens / rate)
+
+    def refund(self, key, rate, capacity):
+        self._add(key, rate, capacity, 1)
+
+    def _add(self, key, rate, capacity, amount):
+        """
+        Refill a bucket and add `amount` tokens to it in one transaction.
+
+        Returns:
+            float: Tokens left in the bucket, negative when tokens are reserved
+        """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = connection.execute(
+                "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            tokens = min(capacity, tokens + amount)
+            connection.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return tokens
+
+
+class RedisRateLimitBackend(AbstractRateLimitBackend):
+    """
+    Token buckets in Redis (or any server speaking its protocol and Lua), for
+    limits shared across hosts. Requires the optional `redis` package.
+
+    Attributes:
+        url (str): Redis connection URL
+    """
+
+    SCRIPT = """
+        local now = redis.call('TIME')
+        now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+        local rate = tonumber(ARGV[1])
+        local capacity = tonumber(ARGV[2])
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(bucket[1]) or capacity
+        local updated = tonumber(bucket[2]) or now
+        tokens = math.min(capacity, tokens + (now - updated) * rate) - 1
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+        return tostring(math.max(0, -tokens / rate))
+    """
+
+    REFUND_SCRIPT = """
+        local now = redis.call('TIME')
+        now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+        local rate = tonumber(ARGV[1])
+        local capacity = tonumber(ARGV[2])
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(bucket[1]) or capacity
+        local updated = tonumber(bucket[2]) or now
+        tokens = math.min(capacity, tokens + (now - updated) * rate + 1)
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+    """
+
+    def __init__(self, url=settings.RATE_LIMIT_REDIS_URL):
+        try:
+            import redis
+        except ImportError as error:
+            raise ImportError(
+                "The redis rate limit backend requires the `redis` package"
+            ) from error
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+        self._refund_script = self._client.register_script(self.REFUND_SCRIPT)
+
+    def take(self, key, rate, capacity):
+        wait = self._script(keys=[f"linkedin_api:ratelimit:{key}"], args=[rate, capacity])
+        return float(wait)
+
+    def refund(self, key, rate, capacity):
+        self._refund_script(keys=[f"linkedin_api:ratelimit:{key}"], args=[rate, capacity])
+
+
+BACKENDS = {
+    "memory": MemoryRateLimitBackend,
+    "sqlite": SQLiteRateLimitBackend,
+    "redis": RedisRateLimitBackend,
+}
+
+
+class RateLimiter:
+    """
+    Per-account token bucket limiting the request rate against LinkedIn.
+
+    Callers wait for their token instead of failing; the bucket state lives in
+    a pluggable backend so all workers (and, with Redis, all hosts) share it.
+
+    Attributes:
+        rate (float): Requests per second allowed per account
+        capacity (float): Burst size per account
+    """
+
+    def __init__(
+            self,
+            backend=None,
+            rate=settings.RATE_LIMIT_PER_SECOND,
+            capacity=settings.RATE_LIMIT_BURST,
+    ):
+        self._backend = backend
+        self.rate = rate
+        self.capacity = capacity
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = BACKENDS[settings.RATE_LIMIT_BACKEND]()
+        return self._backend
+
+    @property
+    def enabled(self):
+        return self.rate > 0 and settings.RATE_LIMIT_BACKEND != "none"
+
+    async def acquire(self, account):
+        """
+        Wait until the account may send another request.
+
+        A token that cannot be used before the deadline of the API call
+        (`scraping.deadline`), or whose wait is cancelled, is put back.
+
+        Args:
+            account (str): Opaque account key
+
+        Raises:
+            DeadlineExceededException: If the token is only available after the deadline
+        """
+        if not self.enabled:
+            return
+        loop = asyncio.get_running_loop()
+        wait = await loop.run_in_executor(
+            None, self.backend.take, account, self.rate, self.capacity
+        )
+        rate_limit_wait.observe(wait)
+        if wait <= 0:
+            return
+        left = time_left()
+        if left is not None and wait > left:
+            await loop.run_in_executor(None, self.backend.refund, account, self.rate, self.capacity)
+            raise DeadlineExceededException(f"Deadline exceeded waiting {wait:.2f}s for a rate limit token")
+        observe_stage("rate_limit_wait", wait)
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            # Not awaited, so the cancellation is not held up
+            loop.run_in_executor(None, self.backend.refund, account, self.rate, self.capacity)
+            raise
+
+
+rate_limiter = RateLimiter()
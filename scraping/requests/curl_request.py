@@ -1,8 +1,41 @@
-from curl_cffi.requests import AsyncSession
+import asyncio
+
 from curl_cffi.requests.errors import CurlError, RequestsError
-from request_exceptions import RequestFailedException, InvalidResponseException
+
+import settings
+from metrics import observe_stage, registry
+from request_exceptions import (DeadlineExceededException, RequestFailedException,
+                                RateLimitedException, SessionExpiredException)
+from scraping.concurrency import report_rate_limited
+from scraping.deadline import time_left
+from scraping.rate_limit import rate_limiter
+from scraping.requests.response import Response
+from scraping.requests.retry import (RETRYABLE_STATUS_CODES, SESSION_EXPIRED_STATUS_CODES,
+                                     RetryPolicy, parse_retry_after)
+from scraping.requests.session_pool import session_pool
+
+upstream_responses = registry.counter(
+    "upstream_responses_total",
+    "Upstream request attempts, labelled by status code (\"network_error\" without a response)",
+)
 
 class Request:
+    def __init__(self, proxy=settings.REQUEST_PROXY, account=None, retry_policy=None):
+        """
+        Initializes the Request.
+
+        Args:
+            proxy (str, optional): Proxy URL for outgoing requests. Defaults to the
+                                   `REQUEST_PROXY` setting.
+            account (str, optional): Account key whose rate limit the requests count
+                                     against. Defaults to None (not rate limited).
+            retry_policy (RetryPolicy, optional): Retry budget and backoff of each request.
+                                                  Defaults to the `RETRY_*` settings.
+        """
+        self.proxy = proxy
+        self.account = account
+        self.retry_policy = retry_policy or RetryPolicy()
+
     async def fetch(
             self,
             method="GET",
@@ -15,6 +48,12 @@ class Request:
         """
         Sends an asynchronous HTTP request and handles errors consistently.
         
+        Network errors, throttling (429/999) and server errors are retried within
+        the retry policy's budget, with exponential backoff, jitter and `Retry-After`
+        support. Other client errors are raised immediately. Under a deadline
+        (`scraping.deadline`) every attempt is cut off when the deadline passes,
+        and no retry is started that could not finish before it.
+        
         Args:
             method (str): HTTP method (e.g., "GET", "POST"). Defaults to "GET".
             url (str): The target URL.
@@ -24,10 +63,14 @@ class Request:
             cookies (dict, optional): Cookies for authentication. Defaults to None.
         
         Returns:
-            ResponseWrapper: A custom response object containing status_code, headers, text, content, URL, and cookies.
+            Response: A response object containing status_code, headers, text, content, URL, and cookies.
         
         Raises:
-            RequestFailedException: If the request fails after multiple attempts.
+            RequestFailedException: If the request fails with a non-retryable status or
+                                    after its retry budget is spent.
+            SessionExpiredException: If LinkedIn rejects the session cookies (401/403).
+            RateLimitedException: If LinkedIn keeps throttling the request (429/999).
+            DeadlineExceededException: If the deadline of the API call passes first.
         """
         from scraping.requests.utils import get_request_data
         
@@ -38,73 +81,75 @@ class Request:
         random_request_data = get_request_data()
         headers["user-agent"] = random_request_data["useragent"]
         
-        async with AsyncSession() as session:
-            for attempt in range(3):
-                try:
-                    response = await session.request(
-                        method=method,
-                        url=url,
-                        data=data,
-                        params=params,
-                        cookies=cookies,
-                        headers=headers,
-                        impersonate=random_request_data["impersonate"],
-                        max_redirects=5
+        # Long-lived session shared by every request with the same fingerprint
+        session = session_pool.get_session(
+            impersonate=random_request_data["impersonate"],
+            proxy=self.proxy
+        )
+        retry_state = self.retry_policy.start()
+        while True:
+            if self.account:
+                # Every attempt waits for a token of the account's shared bucket
+                await rate_limiter.acquire(self.account)
+            retry_after = None
+            options = {}
+            left = time_left()
+            if left is not None:
+                if left <= 0:
+                    raise DeadlineExceededException(
+                        f"Deadline exceeded before attempt {retry_state.attempt + 1}"
                     )
-                    
-                    # Check if the response is valid
-                    if response.status_code >= 400:
-                        error_message = f"Request failed with status code: {response.status_code}"
-                        raise RequestFailedException(error_message)
-                    
-                    # Create compatible response object
-                    class ResponseWrapper:
-                        """
-                        Wrapper class for HTTP responses to provide structured access.
-                        """
-                        def __init__(self, http_response):
-                            """
-                            Initializes the ResponseWrapper.
-                            
-                            Args:
-                                http_response: The original HTTP response object.
-                            """
-                            self.status_code = http_response.status_code
-                            self.headers = http_response.headers
-                            self.text = http_response.text
-                            self._content = http_response.content
-                            self.url = http_response.url
-                            self.cookies = http_response.cookies
-                            
-                        def json(self):
-                            """
-                            Parses the response body as JSON.
-                            
-                            Returns:
-                                dict: The parsed JSON data.
-                            
-                            Raises:
-                                InvalidResponseException: If the response is not valid JSON.
-                            """
-                            try:
-                                import json
-                                return json.loads(self.text)
-                            except json.JSONDecodeError:
-                                raise InvalidResponseException("Failed to parse JSON response")
-                                
-                        @property
-                        def content(self):
-                            """
-                            Returns the raw content of the response.
-                            
-                            Returns:
-                                bytes: The response content.
-                            """
-                            return self._content
-                    
-                    return ResponseWrapper(response)
-                    
-                except (CurlError, RequestsError) as error:
-                    error_message = f"Curl-CFFI request failed (attempt {attempt+1}/3): {error}"
-                    if attempt == 2:  # Last attempt
-                        raise RequestFailedException(error_message)
+                # Never wait for a response past the deadline
+                default_timeout = session.timeout if isinstance(session.timeout, (int, float)) else None
+                options["timeout"] = min(left, default_timeout) if default_timeout else left
+            try:
+                response = await session.request(
+                    method=method,
+                    url=url,
+                    data=data,
+                    params=params,
+                    cookies=cookies,
+                    headers=headers,
+                    impersonate=random_request_data["impersonate"],
+                    max_redirects=5,
+                    **options
+                )
+            except (CurlError, RequestsError) as error:
+                upstream_responses.inc(status="network_error")
+                reason = "network"
+                failure, error_message = RequestFailedException, f"Curl-CFFI request failed: {error}"
+            else:
+                session_pool.record_response(response)
+                status_code = response.status_code
+                upstream_responses.inc(status=str(status_code))
+
+                # Check if the response is valid
+                if status_code < 400:
+                    break
+                if status_code in SESSION_EXPIRED_STATUS_CODES:
+                    # Fatal: retrying with the same cookies cannot succeed
+                    error_message = f"Session rejected with status code: {status_code}"
+                    raise SessionExpiredException(error_message)
+                if status_code not in RETRYABLE_STATUS_CODES:
+                    error_message = f"Request failed with status code: {status_code}"
+                    raise RequestFailedException(error_message)
+
+                reason = str(status_code)
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if status_code in (429, 999):
+                    # LinkedIn throttles with 429 and its own 999 status
+                    report_rate_limited()
+                    failure, error_message = RateLimitedException, f"Request throttled with status code: {status_code}"
+                else:
+                    failure, error_message = RequestFailedException, f"Request failed with status code: {status_code}"
+
+            delay = retry_state.next_delay(reason, retry_after)
+            if delay is None:
+                left = time_left()
+                if left is not None and left <= 0:
+                    raise DeadlineExceededException(f"Deadline exceeded: {error_message}")
+                raise failure(f"{error_message} (after {retry_state.attempt} attempts)")
+            observe_stage("retry_wait", delay)
+            await asyncio.sleep(delay)
+
+        return Response(response)
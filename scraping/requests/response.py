@@ -0,0 +1,65 @@
+import serialization
+from request_exceptions import InvalidResponseException
+
+
+class Response:
+    """
+    HTTP response returned by `Request.fetch`.
+
+    Holds the body once, as bytes. The decoded text is only built when `text`
+    is read, and `json` parses the bytes directly.
+
+    Attributes:
+        status_code (int): HTTP status code
+        headers (Headers): Response headers
+        content (bytes): Raw response body
+        url (str): Final URL of the request
+        cookies (Cookies): Cookies set by the response
+        encoding (str): Encoding used to decode the body
+    """
+
+    __slots__ = ("status_code", "headers", "content", "url", "cookies", "encoding", "_text")
+
+    def __init__(self, http_response):
+        """
+        Initializes the Response.
+
+        Args:
+            http_response: The original curl_cffi response object.
+        """
+        self.status_code = http_response.status_code
+        self.headers = http_response.headers
+        self.content = http_response.content
+        self.url = http_response.url
+        self.cookies = http_response.cookies
+        self.encoding = http_response.charset_encoding or "utf-8"
+        self._text = None
+
+    @property
+    def text(self):
+        """
+        Returns the response body decoded to a string.
+
+        Returns:
+            str: The response text.
+        """
+        if self._text is None:
+            self._text = self.content.decode(self.encoding, errors="replace")
+        return self._text
+
+    def json(self):
+        """
+        Parses the response body as JSON.
+
+        Returns:
+            dict: The parsed JSON data.
+
+        Raises:
+            InvalidResponseException: If the response is not valid JSON.
+        """
+        # JSON parsers read UTF-8 bytes natively; other charsets are decoded first
+        is_utf8 = self.encoding.lower().replace("_", "-") in ("utf-8", "utf8", "ascii", "us-ascii")
+        try:
+            return serialization.loads(self.content if is_utf8 else self.text)
+        except ValueError:
+            raise InvalidResponseException("Failed to parse JSON response")
@@ -0,0 +1,133 @@
+import time
+from email.utils import parsedate_to_datetime
+from random import uniform
+
+import settings
+from metrics import registry
+from scraping.deadline import time_left
+
+upstream_retries = registry.counter(
+    "upstream_retries_total",
+    "Upstream request retries, labelled by reason",
+)
+upstream_retries_exhausted = registry.counter(
+    "upstream_retries_exhausted_total",
+    "Upstream requests that failed after using up their retry budget",
+)
+
+# Status codes worth retrying: timeouts, throttling and server errors
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504, 999})
+# Status codes meaning the session cookies are no longer accepted
+SESSION_EXPIRED_STATUS_CODES = frozenset({401, 403})
+
+
+class RetryPolicy:
+    """
+    Retry budget and backoff schedule for a single upstream request.
+
+    A request is attempted at most `max_attempts` times and never retried once
+    the next attempt would start more than `budget` seconds after the first one,
+    or after the deadline of the API call it serves.
+    Delays grow exponentially with full jitter, and a server supplied
+    `Retry-After` is honoured as a lower bound.
+
+    Attributes:
+        max_attempts (int): Maximum number of attempts, including the first one
+        budget (float): Seconds after which no further attempt is started
+        backoff_base (float): Delay cap of the first retry, in seconds
+        backoff_cap (float): Maximum delay cap of any retry, in seconds
+    """
+
+    def __init__(
+            self,
+            max_attempts=settings.RETRY_MAX_ATTEMPTS,
+            budget=settings.RETRY_BUDGET_SECONDS,
+            backoff_base=settings.RETRY_BACKOFF_BASE,
+            backoff_cap=settings.RETRY_BACKOFF_CAP,
+    ):
+        self.max_attempts = max_attempts
+        self.budget = budget
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+    def start(self):
+        """
+        Begin tracking the budget of one request.
+
+        Returns:
+            RetryState: State to consult after every failed attempt
+        """
+        return RetryState(self)
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Return the delay before the next attempt.
+
+        Args:
+            attempt (int): Number of the attempt that just failed, starting at 1
+            retry_after (float, optional): Delay requested by the server
+
+        Returns:
+            float: Delay in seconds
+        """
+        delay = uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class RetryState:
+    """
+    Attempts made and time spent on one request under a `RetryPolicy`.
+    """
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.attempt = 0
+        self.started_at = time.monotonic()
+
+    def next_delay(self, reason, retry_after=None):
+        """
+        Account for a failed attempt and decide whether to retry.
+
+        Args:
+            reason (str): Short failure reason used as metrics label
+            retry_after (float, optional): Delay requested by the server
+
+        Returns:
+            float: Seconds to wait before retrying, or None if the budget is spent
+        """
+        self.attempt += 1
+        if self.attempt >= self.policy.max_attempts:
+            upstream_retries_exhausted.inc()
+            return None
+        delay = self.policy.backoff(self.attempt, retry_after)
+        elapsed = time.monotonic() - self.started_at
+        left = time_left()
+        if elapsed + delay > self.policy.budget or (left is not None and delay >= left):
+            upstream_retries_exhausted.inc()
+            return None
+        upstream_retries.inc(reason=reason)
+        return delay
+
+
+def parse_retry_after(value):
+    """
+    Parse a `Retry-After` header value.
+
+    Args:
+        value (str): Header value, either delta seconds or an HTTP date
+
+    Returns:
+        float: Delay in seconds, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
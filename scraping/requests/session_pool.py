@@ -0,0 +1,189 @@
+import asyncio
+import threading
+import time
+
+from curl_cffi import CurlInfo, CurlMOpt, CurlOpt
+from curl_cffi.aio import AsyncCurl
+from curl_cffi.requests import AsyncSession
+
+import settings
+from metrics import registry
+
+connections_reused = registry.counter(
+    "upstream_connections_reused_total",
+    "Upstream requests served over an already open connection",
+)
+connections_opened = registry.counter(
+    "upstream_connections_opened_total",
+    "New upstream connections opened",
+)
+
+
+class _PooledSession:
+    """
+    A long-lived AsyncSession together with the multi handle it runs on.
+    """
+
+    def __init__(self, session, async_curl):
+        self.session = session
+        self.async_curl = async_curl
+        self.last_used = time.monotonic()
+
+    async def close(self):
+        await self.session.close()
+        await self.async_curl.close()
+
+
+class SessionPool:
+    """
+    Process-wide pool of keep-alive curl_cffi sessions.
+
+    One AsyncSession is kept per (event loop, impersonation target, proxy). All
+    requests sharing a session also share its curl multi handle, so TCP connections,
+    HTTP/2 streams, TLS sessions and DNS lookups are reused across requests instead
+    of being re-established for every call.
+
+    Sessions are bound to the event loop they were created on. Sessions of loops
+    that have since been closed are dropped, and sessions that have not been used
+    for `idle_timeout` seconds are closed on the next lookup.
+
+    Attributes:
+        max_clients (int): Maximum concurrent transfers per session
+        max_host_connections (int): Maximum open connections per host per session
+        idle_timeout (int): Seconds after which an unused session is closed
+        dns_cache_timeout (int): Seconds to keep resolved host names
+    """
+
+    def __init__(
+            self,
+            max_clients=settings.SESSION_POOL_MAX_CLIENTS,
+            max_host_connections=settings.SESSION_POOL_MAX_HOST_CONNECTIONS,
+            idle_timeout=settings.SESSION_POOL_IDLE_TIMEOUT,
+            dns_cache_timeout=settings.SESSION_POOL_DNS_CACHE_TIMEOUT,
+    ):
+        self.max_clients = max_clients
+        self.max_host_connections = max_host_connections
+        self.idle_timeout = idle_timeout
+        self.dns_cache_timeout = dns_cache_timeout
+        # id(loop) -> (loop, {(impersonate, proxy): _PooledSession})
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get_session(self, impersonate, proxy=None):
+        """
+        Return the pooled session for an impersonation target and proxy.
+
+        Must be called from inside a running event loop.
+
+        Args:
+            impersonate (str): curl_cffi impersonation target (e.g. "chrome110")
+            proxy (str, optional): Proxy URL the session should use. Defaults to None.
+
+        Returns:
+            AsyncSession: A keep-alive session bound to the running event loop
+        """
+        loop = asyncio.get_running_loop()
+        key = (impersonate, proxy)
+        with self._lock:
+            self._drop_closed_loops()
+            _, sessions = self._sessions.setdefault(id(loop), (loop, {}))
+            self._evict_idle(loop, sessions, exclude=key)
+
+            pooled = sessions.get(key)
+            if pooled is None:
+                pooled = self._create_session(loop, impersonate, proxy)
+                sessions[key] = pooled
+            pooled.last_used = time.monotonic()
+            return pooled.session
+
+    def _create_session(self, loop, impersonate, proxy):
+        async_curl = AsyncCurl(loop=loop)
+        async_curl.setopt(CurlMOpt.MAX_HOST_CONNECTIONS, self.max_host_connections)
+        session = AsyncSession(
+            loop=loop,
+            async_curl=async_curl,
+            max_clients=self.max_clients,
+            impersonate=impersonate,
+            proxy=proxy,
+            curl_options={
+                CurlOpt.TCP_KEEPALIVE: 1,
+                CurlOpt.DNS_CACHE_TIMEOUT: self.dns_cache_timeout,
+                CurlOpt.MAXAGE_CONN: self.idle_timeout,
+            },
+            curl_infos=[CurlInfo.NUM_CONNECTS],
+        )
+        return _PooledSession(session, async_curl)
+
+    def _drop_closed_loops(self):
+        for loop_id, (loop, _) in list(self._sessions.items()):
+            if loop.is_closed():
+                # Sessions cannot be awaited on a closed loop; let the
+                # curl handles be released with the objects.
+                del self._sessions[loop_id]
+
+    def _evict_idle(self, loop, sessions, exclude=None):
+        now = time.monotonic()
+        for key, pooled in list(sessions.items()):
+            if key != exclude and now - pooled.last_used > self.idle_timeout:
+                del sessions[key]
+                loop.create_task(pooled.close())
+
+    def record_response(self, response):
+        """
+        Count whether a response was served over a new or a reused connection.
+
+        Args:
+            response: curl_cffi response returned by a pooled session
+        """
+        new_connections = response.infos.get(CurlInfo.NUM_CONNECTS)
+        if new_connections is None:
+            return
+        if new_connections:
+            connections_opened.inc(new_connections)
+        else:
+            connections_reused.inc()
+
+    def stats(self):
+        """
+        Return connection reuse counters and the number of open sessions.
+
+        Returns:
+            dict: Dictionary containing `sessions`, `connections_reused` and
+                  `connections_opened`
+        """
+        with self._lock:
+            open_sessions = sum(len(sessions) for _, sessions in self._sessions.values())
+        return {
+            "sessions": open_sessions,
+            "connections_reused": connections_reused.value(),
+            "connections_opened": connections_opened.value(),
+        }
+
+    async def close(self):
+        """
+        Close every session bound to the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            _, sessions = self._sessions.pop(id(loop), (loop, {}))
+        for pooled in sessions.values():
+            await pooled.close()
+
+    def shutdown(self):
+        """
+        Close every pooled session in the process.
+
+        Intended for worker shutdown hooks. Sessions of loops that are still open
+        but not running are closed on their own loop; everything else is dropped.
+        """
+        with self._lock:
+            entries = list(self._sessions.values())
+            self._sessions.clear()
+        for loop, sessions in entries:
+            if loop.is_closed() or loop.is_running():
+                continue
+            for pooled in sessions.values():
+                loop.run_until_complete(pooled.close())
+
+
+session_pool = SessionPool()
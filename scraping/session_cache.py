@@ -0,0 +1,321 @@
+import fcntl
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from base64 import b64encode
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import settings
+from metrics import registry
+from scraping.storage import read_json, write_json_atomic
+from scraping.validation import validate_session
+
+cookie_cache_lookups = registry.counter(
+    "cookie_cache_lookups_total",
+    "Login cookie cache lookups, labelled by the tier that answered",
+)
+
+
+class CookieCache:
+    """
+    Two-tier cache for LinkedIn login cookies.
+
+    Lookups go to an in-process LRU first and fall back to one JSON file per
+    account on disk. Entries expire after `ttl` seconds in both tiers and are
+    dropped as soon as `validate_session` rejects them. Files are named by a
+    salted HMAC of the credentials and written atomically, so concurrent workers
+    never observe a half-written file.
+
+    A failed login is also recorded on disk for `failure_ttl` seconds, so the
+    callers that waited on it fail with its error instead of each logging in.
+
+    Attributes:
+        cache_dir (str): Directory holding the disk tier
+        ttl (int): Seconds a cookie set is considered fresh
+        max_entries (int): Maximum number of accounts held in memory
+        failure_ttl (int): Seconds a failed login is reported to other callers
+    """
+
+    def __init__(
+            self,
+            cache_dir=settings.COOKIE_CACHE_DIR,
+            ttl=settings.COOKIE_CACHE_TTL,
+            max_entries=settings.COOKIE_CACHE_MAX_ENTRIES,
+            salt=settings.COOKIE_CACHE_SALT,
+            failure_ttl=settings.LOGIN_FAILURE_TTL,
+    ):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.failure_ttl = failure_ttl
+        self._salt = salt.encode("utf-8") if salt else None
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # key -> [threading.Lock, number of threads holding or waiting on it]
+        self._login_locks = {}
+
+    def key(self, email, password):
+        """
+        Derive the cache key for a set of credentials.
+
+        Args:
+            email (str): LinkedIn account email address
+            password (str): LinkedIn account password
+
+        Returns:
+            str: Hex encoded HMAC-SHA256 of the credentials
+        """
+        credentials = f"{email}|{password}".encode("utf-8")
+        return hmac.new(self._get_salt(), credentials, hashlib.sha256).hexdigest()
+
+    def derive_key(self, purpose):
+        """
+        Derive a secret key from the cache salt, e.g. to encrypt data at rest.
+
+        Every process sharing the cache directory (or `COOKIE_CACHE_SALT`)
+        derives the same key.
+
+        Args:
+            purpose (str): Use of the key; every purpose gets a different key
+
+        Returns:
+            bytes: 32 byte key
+        """
+        return hmac.new(self._get_salt(), f"key|{purpose}".encode("utf-8"), hashlib.sha256).digest()
+
+    def get(self, email, password):
+        """
+        Return cached cookies for the credentials, if fresh and valid.
+
+        Args:
+            email (str): LinkedIn account email address
+            password (str): LinkedIn account password
+
+        Returns:
+            dict: Cookie name-value pairs, or None on a cache miss
+        """
+        cookies = self.get_memory(email, password)
+        if cookies is not None:
+            return cookies
+
+        key = self.key(email, password)
+        now = time.time()
+        entry = self._read_file(key) or self._migrate_legacy_file(email, password, key)
+        if entry is not None:
+            stored_at, cookies = entry
+            if now - stored_at < self.ttl and validate_session(cookies):
+                self._remember(key, stored_at, cookies)
+                cookie_cache_lookups.inc(tier="disk")
+                return cookies
+            self._remove_file(key)
+
+        cookie_cache_lookups.inc(tier="miss")
+        return None
+
+    def get_memory(self, email, password):
+        """
+        Return cookies for the credentials from the in-process tier only.
+
+        Never touches the disk, so it is cheap enough to call on the event loop.
+
+        Args:
+            email (str): LinkedIn account email address
+            password (str): LinkedIn account password
+
+        Returns:
+            dict: Cookie name-value pairs, or None if the memory tier has none
+        """
+        key = self.key(email, password)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            stored_at, cookies = entry
+            if time.time() - stored_at >= self.ttl:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+        cookie_cache_lookups.inc(tier="memory")
+        return cookies
+
+    def set(self, email, password, cookies):
+        """
+        Store cookies for the credentials in both tiers.
+
+        Args:
+            email (str): LinkedIn account email address
+            password (str): LinkedIn account password
+            cookies (dict): Cookie name-value pairs to cache
+        """
+        key = self.key(email, password)
+        stored_at = time.time()
+        self._remember(key, stored_at, cookies)
+        self._write_file(key, {"stored_at": stored_at, "cookies": cookies})
+        self._remove_file(f"{key}.failed")
+
+    def set_login_failure(self, email, password, message):
+        """
+        Record that a login with the credentials failed.
+
+        Args:
+            email (str): LinkedIn account email address
+            password (str): LinkedIn account password
+            message (str): Error of the failed login
+        """
+        if self.failure_ttl > 0:
+            key = self.key(email, password)
+            self._write_file(f"{key}.failed", {"failed_at": time.time(), "error": message})
+
+    def get_login_failure(self, email, password):
+        """
+        Return the error of a recent failed login with the credentials.
+
+        Args:
+            email (str): LinkedIn account email address
+            password (str): LinkedIn account password
+
+        Returns:
+            str: Error of a login that failed less than `failure_ttl` seconds ago,
+                 or None
+        """
+        data = read_json(self._path(f"{self.key(email, password)}.failed"))
+        if not isinstance(data, dict) or time.time() - data.get("failed_at", 0) >= self.failure_ttl:
+            return None
+        return data.get("error")
+
+    def invalidate(self, email, password, cookies=None):
+        """
+        Drop the cookies cached for the credentials from both tiers.
+
+        The memory tier is always dropped. The disk tier is checked under the
+        login lock, so a login in progress in another thread or worker process
+        finishes first and the fresh cookies it wrote are kept.
+
+        Args:
+            email (str): LinkedIn account email address
+            password (str): LinkedIn account password
+            cookies (dict, optional): Only drop the disk entry if it still holds
+                                      these cookies, so a session that another
+                                      caller already renewed is kept. Defaults to None.
+        """
+        key = self.key(email, password)
+        with self._lock:
+            self._memory.pop(key, None)
+        with self.login_lock(email, password):
+            if cookies is not None:
+                entry = self._read_file(key)
+                if entry is not None and entry[1] != cookies:
+                    return
+            self._remove_file(key)
+
+    @contextmanager
+    def login_lock(self, email, password):
+        """
+        Hold the exclusive right to log in with the credentials.
+
+        Serializes logins for one account across the threads of this process
+        (with a per-key lock) and across worker processes (with `flock` on a lock
+        file next to the cached cookies). Callers should look the cookies up again
+        once they hold the lock, since the previous holder has usually just
+        cached them.
+
+        Args:
+            email (str): LinkedIn account email address
+            password (str): LinkedIn account password
+        """
+        key = self.key(email, password)
+        with self._lock:
+            entry = self._login_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(os.path.join(self.cache_dir, f"{key}.lock"), "a") as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._login_locks[key]
+
+    def _remember(self, key, stored_at, cookies):
+        with self._lock:
+            self._memory[key] = (stored_at, cookies)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_file(self, key):
+        data = read_json(self._path(key))
+        try:
+            return data["stored_at"], data["cookies"]
+        except (KeyError, TypeError):
+            return None
+
+    def _write_file(self, key, data):
+        write_json_atomic(self._path(key), data)
+
+    def _remove_file(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _migrate_legacy_file(self, email, password, key):
+        """
+        Move a cookie file cached under the old base64 credential name.
+        """
+        credentials = f"{email}|{password}".encode("utf-8")
+        legacy_name = b64encode(credentials).decode("utf-8")
+        legacy_path = os.path.join(self.cache_dir, f"{legacy_name}.json")
+        try:
+            stored_at = os.path.getmtime(legacy_path)
+            with open(legacy_path, "r") as file:
+                cookies = json.load(file)
+        except (OSError, ValueError):
+            return None
+        self._write_file(key, {"stored_at": stored_at, "cookies": cookies})
+        os.remove(legacy_path)
+        return stored_at, cookies
+
+    def _get_salt(self):
+        """
+        Return the key salt, creating a random one on first use.
+
+        The salt is shared between worker processes through a file in the cache
+        directory unless `COOKIE_CACHE_SALT` is configured.
+        """
+        if self._salt:
+            return self._salt
+        os.makedirs(self.cache_dir, exist_ok=True)
+        salt_path = os.path.join(self.cache_dir, ".salt")
+        try:
+            descriptor = os.open(salt_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            with open(salt_path, "rb") as file:
+                salt = file.read()
+            if not salt:
+                # Another process is still writing the salt
+                time.sleep(0.05)
+                return self._get_salt()
+        else:
+            salt = secrets.token_hex(32).encode("utf-8")
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(salt)
+        self._salt = salt
+        return salt
+
+
+cookie_cache = CookieCache()
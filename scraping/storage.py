@@ -0,0 +1,44 @@
+import json
+import os
+import tempfile
+
+
+def write_json_atomic(path, data):
+    """
+    Write JSON to a file so that readers never see a partial document.
+
+    The data is written to a temporary file in the same directory and then
+    renamed over `path`, which is atomic on POSIX file systems.
+
+    Args:
+        path (str): Destination file path
+        data: JSON serializable data
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "w") as file:
+            json.dump(data, file, indent=4)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_json(path):
+    """
+    Read a JSON file, treating missing or corrupt files as absent.
+
+    Args:
+        path (str): File path
+
+    Returns:
+        The parsed JSON data, or None if the file cannot be read
+    """
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
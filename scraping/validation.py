@@ -1,2 +1,20 @@
-def validate_session(cookies: dict):
-    return True
\ No newline at end of file
+REQUIRED_SESSION_COOKIES = ("li_at", "JSESSIONID")
+
+
+def validate_session(cookies: dict) -> bool:
+    """
+    Cheaply check that a cookie set can authenticate Voyager API calls.
+
+    This does not contact LinkedIn. It only rejects cookie sets that are
+    certainly unusable, e.g. the ones saved after a login that stopped at a
+    checkpoint page, which never receive an `li_at` cookie.
+
+    Args:
+        cookies (dict): Cookie name-value pairs
+
+    Returns:
+        bool: `True` if every required session cookie is present and non-empty
+    """
+    if not isinstance(cookies, dict):
+        return False
+    return all(cookies.get(name) for name in REQUIRED_SESSION_COOKIES)
@@ -0,0 +1,45 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    """
+    Parse a JSON document.
+
+    Uses orjson when it is installed, which parses UTF-8 bytes directly without
+    decoding them to a str first, and the standard library otherwise.
+
+    Args:
+        data (bytes or str): JSON document
+
+    Returns:
+        The parsed document
+
+    Raises:
+        ValueError: If the document is not valid JSON
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj):
+    """
+    Serialize an object to compact JSON.
+
+    Args:
+        obj: JSON serializable object
+
+    Returns:
+        bytes: UTF-8 encoded JSON document
+
+    Raises:
+        TypeError: If the object is not JSON serializable
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
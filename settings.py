@@ -0,0 +1,130 @@
+import os
+
+# LinkedIn origin the scrapers talk to (a local mock in load tests)
+LINKEDIN_BASE_URL = os.environ.get("LINKEDIN_BASE_URL", "https://www.linkedin.com").rstrip("/")
+
+# Outgoing HTTP connection pool (scraping.requests.session_pool)
+REQUEST_PROXY = os.environ.get("REQUEST_PROXY") or None
+SESSION_POOL_MAX_CLIENTS = int(os.environ.get("SESSION_POOL_MAX_CLIENTS", 20))
+SESSION_POOL_MAX_HOST_CONNECTIONS = int(os.environ.get("SESSION_POOL_MAX_HOST_CONNECTIONS", 10))
+SESSION_POOL_IDLE_TIMEOUT = int(os.environ.get("SESSION_POOL_IDLE_TIMEOUT", 300))
+SESSION_POOL_DNS_CACHE_TIMEOUT = int(os.environ.get("SESSION_POOL_DNS_CACHE_TIMEOUT", 600))
+
+# Login cookie cache (scraping.session_cache)
+COOKIE_CACHE_DIR = os.environ.get(
+    "COOKIE_CACHE_DIR", os.path.join(os.path.dirname(__file__), "scraping", ".user")
+)
+COOKIE_CACHE_TTL = int(os.environ.get("COOKIE_CACHE_TTL", 7 * 24 * 60 * 60))
+COOKIE_CACHE_MAX_ENTRIES = int(os.environ.get("COOKIE_CACHE_MAX_ENTRIES", 256))
+COOKIE_CACHE_SALT = os.environ.get("COOKIE_CACHE_SALT") or None
+# Seconds a failed login is reported to other callers instead of being retried
+LOGIN_FAILURE_TTL = int(os.environ.get("LOGIN_FAILURE_TTL", 60))
+
+# Headless browser pool used for logins (scraping.browser_pool)
+CHROME_BINARY = os.environ.get("CHROME_BINARY", "/usr/bin/google-chrome")
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", 1))
+BROWSER_POOL_WARM = os.environ.get("BROWSER_POOL_WARM", "false").lower() == "true"
+BROWSER_MAX_LOGINS = int(os.environ.get("BROWSER_MAX_LOGINS", 20))
+BROWSER_MAX_MEMORY_MB = int(os.environ.get("BROWSER_MAX_MEMORY_MB", 400))
+BROWSER_ACQUIRE_TIMEOUT = int(os.environ.get("BROWSER_ACQUIRE_TIMEOUT", 300))
+# Threads loading cookies and logging in off the event loop (scraping.login_page);
+# logins beyond BROWSER_POOL_SIZE wait there for a browser
+LOGIN_EXECUTOR_WORKERS = int(os.environ.get("LOGIN_EXECUTOR_WORKERS", 4))
+
+# Scraped profile cache (scraping.profile_cache)
+PROFILE_CACHE_TTL = int(os.environ.get("PROFILE_CACHE_TTL", 60 * 60))
+PROFILE_CACHE_MAX_ENTRIES = int(os.environ.get("PROFILE_CACHE_MAX_ENTRIES", 10000))
+PROFILE_CACHE_DIR = os.environ.get("PROFILE_CACHE_DIR") or None
+
+# Persistent profile store (scraping.profile_store): "sqlite" or "none"
+PROFILE_STORE_BACKEND = os.environ.get("PROFILE_STORE_BACKEND", "sqlite")
+PROFILE_STORE_DB_PATH = os.environ.get(
+    "PROFILE_STORE_DB_PATH", os.path.join(os.path.dirname(__file__), "scraping", ".store", "profiles.sqlite3")
+)
+PROFILE_STORE_BATCH_SIZE = int(os.environ.get("PROFILE_STORE_BATCH_SIZE", 100))
+PROFILE_STORE_FLUSH_INTERVAL = float(os.environ.get("PROFILE_STORE_FLUSH_INTERVAL", 2))
+# Stored profiles younger than this answer profile cache misses (0 always scrapes)
+PROFILE_STORE_MAX_AGE = int(os.environ.get("PROFILE_STORE_MAX_AGE", 0))
+
+# Full-network crawl jobs (scraping.crawl_jobs)
+CRAWL_DB_PATH = os.environ.get(
+    "CRAWL_DB_PATH", os.path.join(os.path.dirname(__file__), "scraping", ".crawl", "jobs.sqlite3")
+)
+CRAWL_STALE_AFTER = int(os.environ.get("CRAWL_STALE_AFTER", 300))
+CRAWL_HEARTBEAT_INTERVAL = int(os.environ.get("CRAWL_HEARTBEAT_INTERVAL", 30))
+CRAWL_PAGE_ATTEMPTS = int(os.environ.get("CRAWL_PAGE_ATTEMPTS", 3))
+
+# Scrape job queue (scraping.job_queue) and its worker processes (scrape_worker.py).
+# Enabled, /profile and /connections enqueue a job and answer with its ID.
+JOB_QUEUE_ENABLED = os.environ.get("JOB_QUEUE_ENABLED", "false").lower() == "true"
+JOB_QUEUE_DB_PATH = os.environ.get(
+    "JOB_QUEUE_DB_PATH", os.path.join(os.path.dirname(__file__), "scraping", ".queue", "jobs.sqlite3")
+)
+JOB_WORKER_PROCESSES = int(os.environ.get("JOB_WORKER_PROCESSES", 2))
+JOB_WORKER_CONCURRENCY = int(os.environ.get("JOB_WORKER_CONCURRENCY", 4))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 1))
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get("JOB_HEARTBEAT_INTERVAL", 15))
+JOB_STALE_AFTER = int(os.environ.get("JOB_STALE_AFTER", 120))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+JOB_RESULT_TTL = int(os.environ.get("JOB_RESULT_TTL", 24 * 60 * 60))
+
+# Connections listing pipeline (scraping.connection_page); the depth is capped at 4
+LISTING_PIPELINE_DEPTH = int(os.environ.get("LISTING_PIPELINE_DEPTH", 1))
+LISTING_PREFETCH_TIMEOUT = int(os.environ.get("LISTING_PREFETCH_TIMEOUT", 30))
+LISTING_CACHE_TTL = int(os.environ.get("LISTING_CACHE_TTL", 5 * 60))
+LISTING_CACHE_MAX_ENTRIES = int(os.environ.get("LISTING_CACHE_MAX_ENTRIES", 1000))
+# Listing bodies of at least this many bytes are scanned with ijson, if installed,
+# instead of parsed whole: slower, but memory stays flat on very large pages
+LISTING_STREAM_MIN_BYTES = int(os.environ.get("LISTING_STREAM_MIN_BYTES", 1024 * 1024))
+# Calls following a page's resume cursor in which a profile may fail before the
+# page is left behind without it (crawl jobs: scrapes of a profile per page)
+PROFILE_RETRY_ATTEMPTS = int(os.environ.get("PROFILE_RETRY_ATTEMPTS", 3))
+
+# Adaptive profile scraping concurrency (scraping.concurrency)
+CONCURRENCY_INITIAL = int(os.environ.get("CONCURRENCY_INITIAL", 6))
+CONCURRENCY_MIN = int(os.environ.get("CONCURRENCY_MIN", 1))
+CONCURRENCY_MAX = int(os.environ.get("CONCURRENCY_MAX", 16))
+CONCURRENCY_PROCESS_MAX = int(os.environ.get("CONCURRENCY_PROCESS_MAX", 32))
+CONCURRENCY_BACKOFF_FACTOR = float(os.environ.get("CONCURRENCY_BACKOFF_FACTOR", 0.5))
+CONCURRENCY_LATENCY_TOLERANCE = float(os.environ.get("CONCURRENCY_LATENCY_TOLERANCE", 2.0))
+
+# Cross-worker per-account rate limit (scraping.rate_limit)
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "sqlite")
+RATE_LIMIT_PER_SECOND = float(os.environ.get("RATE_LIMIT_PER_SECOND", 2))
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST", 10))
+RATE_LIMIT_DB_PATH = os.environ.get(
+    "RATE_LIMIT_DB_PATH", os.path.join(os.path.dirname(__file__), "scraping", ".ratelimit", "buckets.sqlite3")
+)
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+
+# Upstream retries (scraping.requests.retry)
+RETRY_MAX_ATTEMPTS = int(os.environ.get("RETRY_MAX_ATTEMPTS", 4))
+RETRY_BUDGET_SECONDS = float(os.environ.get("RETRY_BUDGET_SECONDS", 60))
+RETRY_BACKOFF_BASE = float(os.environ.get("RETRY_BACKOFF_BASE", 0.5))
+RETRY_BACKOFF_CAP = float(os.environ.get("RETRY_BACKOFF_CAP", 20))
+
+# Batch profile scraping (POST /profiles/batch)
+PROFILE_BATCH_MAX_SIZE = int(os.environ.get("PROFILE_BATCH_MAX_SIZE", 500))
+
+# ASGI server (app, gunicorn_config)
+RESPONSE_TIMEOUT = int(os.environ.get("RESPONSE_TIMEOUT", 600))
+
+# API call deadlines (scraping.deadline, "deadline" request field)
+# Seconds /profile, /connections and /profiles/batch get when the client sends
+# no deadline (0 for none), and the longest deadline a client may ask for
+REQUEST_DEADLINE = float(os.environ.get("REQUEST_DEADLINE", 300))
+REQUEST_DEADLINE_MAX = float(os.environ.get("REQUEST_DEADLINE_MAX", 600))
+
+# Prometheus metrics (GET /metrics)
+# Directory the API workers and scrape workers of a host share their metrics through;
+# gunicorn_config empties it when the server starts. Empty, /metrics only reports
+# its own process.
+METRICS_DIR = os.environ.get(
+    "METRICS_DIR", os.path.join(os.path.dirname(__file__), "scraping", ".metrics")
+) or None
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))
+
+# Request timing and profiling (Server-Timing header, "profiling" request flag)
+# API calls slower than this log their stage timings and slowest profiles
+SLOW_REQUEST_THRESHOLD = float(os.environ.get("SLOW_REQUEST_THRESHOLD", 30))
+PROFILING_DIR = os.environ.get("PROFILING_DIR", os.path.join(os.path.dirname(__file__), ".profiles"))